@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import atexit
+import threading
+
+import pandas as pd
+
+from quiz_core import FileLock, atomic_write
+
+# Append-only answer history. Events are buffered in memory and written in batches, one
+# Parquet file (= one row group) per batch, when BATCH_SIZE events are buffered or, from a
+# timer thread, once the oldest is FLUSH_SECONDS old:
+#
+#   answer_log/part-<unix ms>-<pid>-<seq>.parquet
+#   answer_log/day-<YYYYMMDD>-<unix ms>.parquet    the parts written on one (UTC) day, merged
+#
+# Parts are never rewritten, so readers can scan them while the app keeps appending. Quiet
+# hours still produce small parts, so once a day the timer merges the previous days' parts
+# into one file per day with large row groups (compact_log); its metadata lists the parts it
+# holds, so AnswerStats doesn't count them twice.
+# Without pyarrow the batches are written as CSV parts with the same columns (never merged).
+
+LOG_DIR = os.environ.get("B2_ANSWER_LOG_DIR", 'answer_log')
+BATCH_SIZE = 256      # Events per part file
+FLUSH_SECONDS = 30    # A partial batch is written once it is this old
+COMPACT_ROW_GROUP = 1 << 17 # Rows per row group in merged day files
+SOURCES_KEY = b'b2_sources' # Day file metadata: JSON [[part name, rows], ...] in file order
+
+COLUMNS = ['ts', 'user', 'unique_id', 'lektion', 'word', 'chosen', 'correct', 'response_ms', 'deck_version', 'mode']
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    SCHEMA = pa.schema([
+        ('ts', pa.timestamp('ms', tz='UTC')),
+        ('user', pa.string()),
+        ('unique_id', pa.string()),
+        ('lektion', pa.string()),
+        ('word', pa.string()),
+        ('chosen', pa.string()),
+        ('correct', pa.bool_()),
+        ('response_ms', pa.float64()),
+        ('deck_version', pa.string()),
+        ('mode', pa.string()),
+    ])
+except ImportError: # pyarrow ships with Streamlit, but the API can run without it
+    pa = pq = SCHEMA = None
+
+
+class AnswerLogWriter:
+    """
+    Buffers answer events and appends them to LOG_DIR in batches. Thread-safe. A daemon thread,
+    started with the first event, writes batches that reach flush_seconds and compacts the
+    previous days' parts.
+    """
+    def __init__(self, log_dir=LOG_DIR, batch_size=BATCH_SIZE, flush_seconds=FLUSH_SECONDS):
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._buffer = {column: [] for column in COLUMNS}
+        self._oldest = None
+        self._seq = 0
+        self._timer = None
+        self._stop = threading.Event()
+        atexit.register(self.close)
+
+    def __len__(self):
+        return len(self._buffer['ts'])
+
+    def log(self, user, unique_id, lektion, word, chosen, correct, response_ms=None, deck_version=None, mode='quiz'):
+        """Record one answer. Writes a part file when the batch is full or old enough."""
+        event = {
+            'ts': int(time.time() * 1000),
+            'user': user,
+            'unique_id': unique_id,
+            'lektion': None if lektion is None else str(lektion),
+            'word': word,
+            'chosen': chosen,
+            'correct': bool(correct),
+            'response_ms': None if response_ms is None else float(response_ms),
+            'deck_version': deck_version,
+            'mode': mode,
+        }
+        with self._lock:
+            for column in COLUMNS:
+                self._buffer[column].append(event[column])
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if len(self) >= self.batch_size or time.monotonic() - self._oldest >= self.flush_seconds:
+                self._write_locked()
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._run_timer, name="answer-log-flush", daemon=True)
+                self._timer.start()
+
+    def _run_timer(self):
+        compacted_day = None
+        wait = 0
+        while not self._stop.wait(wait):
+            with self._lock:
+                age = time.monotonic() - self._oldest if self._oldest is not None else 0
+                if age >= self.flush_seconds:
+                    self._write_locked()
+                    age = 0
+            wait = self.flush_seconds - age
+            if _utc_day(time.time()) != compacted_day:
+                compacted_day = _utc_day(time.time()) # Tried once a day; a failed merge waits for the next
+                try:
+                    compact_log(self.log_dir)
+                except Exception as e:
+                    print(f"Answer log compaction failed: {e}")
+
+    def close(self):
+        """Stop the timer and write whatever is buffered."""
+        self._stop.set()
+        self.flush()
+
+    def pending(self):
+        """Events not yet written to a part file, as a DataFrame."""
+        with self._lock:
+            frame = pd.DataFrame({column: list(values) for column, values in self._buffer.items()}, columns=COLUMNS)
+        frame['ts'] = pd.to_datetime(frame['ts'], unit='ms', utc=True)
+        return frame
+
+    def flush(self):
+        """Write whatever is buffered."""
+        with self._lock:
+            self._write_locked()
+
+    def _write_locked(self):
+        if not len(self):
+            return
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._seq += 1
+        name = f"part-{int(time.time() * 1000)}-{os.getpid()}-{self._seq:06d}"
+        # Written atomically: readers never see half-written parts
+        if pa is not None:
+            table = pa.table({column: self._buffer[column] for column in COLUMNS}, schema=SCHEMA)
+            atomic_write(os.path.join(self.log_dir, f"{name}.parquet"),
+                         lambda tmp_path: pq.write_table(table, tmp_path, row_group_size=len(self)))
+        else:
+            frame = pd.DataFrame(self._buffer, columns=COLUMNS)
+            atomic_write(os.path.join(self.log_dir, f"{name}.csv"), lambda tmp_path: frame.to_csv(tmp_path, index=False))
+        self._buffer = {column: [] for column in COLUMNS}
+        self._oldest = None
+
+
+def _utc_day(seconds):
+    return time.strftime('%Y%m%d', time.gmtime(seconds))
+
+def is_day_file(path):
+    return os.path.basename(path).startswith('day-')
+
+def list_parts(log_dir=LOG_DIR):
+    """Finished part and day files, oldest first (day files sort before the parts)."""
+    if not os.path.isdir(log_dir):
+        return []
+    return sorted(
+        os.path.join(log_dir, name) for name in os.listdir(log_dir)
+        if name.startswith(('part-', 'day-')) and name.endswith(('.parquet', '.csv'))
+    )
+
+def part_sources(path):
+    """[(part name, rows)] a day file was merged from, in row order; [(name, None)] for a part."""
+    if not is_day_file(path):
+        return [(os.path.basename(path), None)]
+    return [tuple(source) for source in json.loads(pq.read_schema(path).metadata[SOURCES_KEY])]
+
+def compact_log(log_dir=LOG_DIR):
+    """
+    Merges the Parquet parts written before today (UTC) into one day file per day, with
+    COMPACT_ROW_GROUP-row row groups (a day file already there is merged in too), and deletes
+    them. One process at a time (compact.lock). Returns how many files were merged.
+    """
+    if pq is None or not os.path.isdir(log_dir):
+        return 0
+    today = _utc_day(time.time())
+    merged = 0
+    with FileLock(os.path.join(log_dir, 'compact.lock')):
+        by_day = {}
+        for path in list_parts(log_dir):
+            name = os.path.basename(path)
+            if not name.endswith('.parquet'):
+                continue
+            day = name.split('-')[1] if is_day_file(path) else _utc_day(int(name.split('-')[1]) / 1000)
+            if day < today:
+                by_day.setdefault(day, []).append(path)
+        for day, paths in sorted(by_day.items()):
+            if len(paths) < 2:
+                continue
+            sources, tables = [], []
+            for path in paths:
+                table = pq.read_table(path)
+                sources += part_sources(path) if is_day_file(path) else [(os.path.basename(path), table.num_rows)]
+                tables.append(table.replace_schema_metadata(None))
+            table = pa.concat_tables(tables).replace_schema_metadata({SOURCES_KEY: json.dumps(sources)})
+            atomic_write(os.path.join(log_dir, f"day-{day}-{int(time.time() * 1000)}.parquet"),
+                         lambda tmp_path: pq.write_table(table, tmp_path, row_group_size=COMPACT_ROW_GROUP))
+            for path in paths: # Readers that listed them before this point still find them
+                os.remove(path)
+            merged += len(paths)
+    return merged
+
+def read_parts(paths, columns=None):
+    """Read part files into one DataFrame (only the requested columns)."""
+    frames = []
+    for path in paths:
+        if path.endswith('.parquet'):
+            frames.append(pd.read_parquet(path, columns=columns))
+        else:
+            frame = pd.read_csv(path, usecols=columns)
+            if 'ts' in frame:
+                frame['ts'] = pd.to_datetime(frame['ts'], unit='ms', utc=True)
+            frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=columns or COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def read_events(log_dir=LOG_DIR, columns=None):
+    """The whole answer history as a DataFrame."""
+    while True:
+        paths = list_parts(log_dir)
+        merged = {name for path in paths if is_day_file(path) for name, _ in part_sources(path)}
+        try: # Parts listed while a merge wrote their day file are read from the day file only
+            return read_parts([path for path in paths if os.path.basename(path) not in merged], columns)
+        except FileNotFoundError: # Merged and deleted since they were listed
+            continue
@@ -0,0 +1,148 @@
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+
+from answer_log import LOG_DIR, list_parts, part_sources, read_parts
+from quiz_core import atomic_write
+
+# Learner statistics over the answer log (answer_log.py), kept as pre-aggregated tables:
+#   lektion    (user, lektion)       -> answers, correct
+#   daily      (user, day)           -> answers, correct
+#   confusions (user, word, chosen)  -> count of wrong answers
+# AnswerStats remembers which part files it has already folded in and only reads new ones,
+# so refreshing never rescans the whole history. A day file (answer_log.compact_log) counts
+# as the parts it was merged from: only rows of parts not folded in yet are read from it.
+# The tables are saved next to the log.
+
+STATS_FILE = '_stats.pkl'
+DAY_TZ = os.environ.get("B2_STATS_TZ", "UTC") # Timezone that decides which day an answer counts for
+EVENT_COLUMNS = ['ts', 'user', 'lektion', 'word', 'chosen', 'correct']
+
+
+def aggregate(events):
+    """Aggregate tables for a batch of events."""
+    events = events.assign(
+        day=events['ts'].dt.tz_convert(DAY_TZ).dt.date,
+        correct=events['correct'].astype(int),
+    )
+    lektion = events.groupby(['user', 'lektion'], dropna=False)['correct'].agg(answers='size', correct='sum')
+    daily = events.groupby(['user', 'day'])['correct'].agg(answers='size', correct='sum')
+    wrong = events[events['correct'] == 0]
+    confusions = wrong.groupby(['user', 'word', 'chosen']).size().to_frame('count')
+    return {'lektion': lektion, 'daily': daily, 'confusions': confusions}
+
+def combine(old, new):
+    """Add two sets of aggregate tables key by key."""
+    if old is None:
+        return new
+    if new is None:
+        return old
+    combined = {}
+    for name, table in old.items():
+        merged = pd.concat([table, new[name]])
+        combined[name] = merged.groupby(level=list(range(merged.index.nlevels)), dropna=False).sum()
+    return combined
+
+def streaks(days, today=None):
+    """(current streak, best streak) in days from a collection of dates with at least one answer."""
+    if len(days) == 0:
+        return 0, 0
+    ordinals = np.unique([day.toordinal() for day in days])
+    breaks = np.flatnonzero(np.diff(ordinals) != 1)
+    run_starts = np.concatenate([[0], breaks + 1])
+    run_ends = np.concatenate([breaks, [len(ordinals) - 1]])
+    best = int((run_ends - run_starts + 1).max())
+    today = (today or pd.Timestamp.now(tz=DAY_TZ).date()).toordinal()
+    current = int(run_ends[-1] - run_starts[-1] + 1) if ordinals[-1] >= today - 1 else 0
+    return current, best
+
+
+class AnswerStats:
+    """Incrementally maintained aggregates over one answer log directory. Thread-safe."""
+    def __init__(self, log_dir=LOG_DIR):
+        self.log_dir = log_dir
+        self._lock = threading.Lock()
+        self._consumed = set()
+        self._tables = None
+        self._load()
+
+    def _stats_path(self):
+        return os.path.join(self.log_dir, STATS_FILE)
+
+    def _load(self):
+        try:
+            with open(self._stats_path(), 'rb') as f:
+                saved = pickle.load(f)
+            self._consumed, self._tables = set(saved['consumed']), saved['tables']
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+            self._consumed, self._tables = set(), None
+
+    def _save(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'consumed': sorted(self._consumed), 'tables': self._tables}, f)
+        atomic_write(self._stats_path(), write)
+
+    def refresh(self):
+        """Fold part files written since the last refresh into the tables. Returns how many were read."""
+        with self._lock:
+            read, consumed = 0, len(self._consumed)
+            for path in list_parts(self.log_dir):
+                if os.path.basename(path) in self._consumed:
+                    continue
+                try:
+                    sources = part_sources(path)
+                    new = [name not in self._consumed for name, _ in sources]
+                    events = read_parts([path], columns=EVENT_COLUMNS) if any(new) else None
+                except FileNotFoundError: # Merged into a day file since it was listed; next refresh reads that
+                    continue
+                if events is not None and not all(new): # A day file holding parts already folded in
+                    events = events[np.repeat(new, [rows for _, rows in sources])]
+                if events is not None and len(events):
+                    self._tables = combine(self._tables, aggregate(events))
+                self._consumed.update(name for name, _ in sources)
+                self._consumed.add(os.path.basename(path))
+                read += events is not None
+            if len(self._consumed) != consumed:
+                self._save()
+            return read
+
+    def user_stats(self, user, pending=None):
+        """
+        Stats for one user: per-Lektion accuracy, most confused pairs, daily learning curve
+        and streaks. pending is an optional DataFrame of events not yet written to a part file.
+        """
+        tables = self._tables
+        if pending is not None and len(pending):
+            tables = combine(tables, aggregate(pending[pending['user'] == user]))
+        if tables is None:
+            return None
+
+        def for_user(table):
+            if user not in table.index.get_level_values('user'):
+                return table.iloc[0:0].droplevel('user')
+            return table.xs(user, level='user')
+
+        lektion = for_user(tables['lektion']).copy()
+        lektion['accuracy'] = lektion['correct'] / lektion['answers']
+
+        daily = for_user(tables['daily']).sort_index().copy()
+        daily['accuracy'] = daily['correct'] / daily['answers']
+        daily['cumulative accuracy'] = daily['correct'].cumsum() / daily['answers'].cumsum()
+
+        confusions = for_user(tables['confusions']).sort_values('count', ascending=False)
+        current_streak, best_streak = streaks(daily.index)
+
+        return {
+            'answers': int(daily['answers'].sum()),
+            'correct': int(daily['correct'].sum()),
+            'lektion': lektion.sort_index(),
+            'daily': daily,
+            'confusions': confusions,
+            'current_streak': current_streak,
+            'best_streak': best_streak,
+        }
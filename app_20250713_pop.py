@@ -1,175 +1,289 @@
 import streamlit as st
-import pandas as pd
 import random
-import os
 import json
+import time
+import uuid
+import threading
+
+from metrics import (
+    ACTIVE_SESSIONS, ANSWERS, PROGRESS_READ_SECONDS, PROGRESS_WRITE_SECONDS, FRAME_BUILD_SECONDS,
+    QUESTION_SELECT_SECONDS, start_metrics_server, watch_frame_memo,
+)
+
+# The engine modules (pandas, numpy, pyarrow) are imported after the login screen is drawn,
+# see "Engine imports" below; a background thread imports them and loads the deck meanwhile.
+ENGINE_MODULES = ('quiz_core', 'deck_validation', 'deck_snapshots', 'answer_log', 'answer_stats',
+                  'confusion_tracker', 'word_index', 'search_index', 'progress_reconcile', 'shuffle_bag',
+                  'frame_memo', 'progress_store', 'deck_ingest')
+
+@st.cache_resource
+def get_progress_store():
+    """Process-wide progress backend of the persistent users (B2_PROGRESS_STORE, user_data.json by default)."""
+    from progress_store import open_progress_store
+    return open_progress_store()
+
+def check_progress_store(store):
+    if isinstance(getattr(store, 'last_error', None), json.JSONDecodeError):
+        st.error("Error decoding user_data.json. Starting with empty data.")
+
+@st.cache_resource
+def get_deck_source(url):
+    """
+    Process-wide deck source: newest local snapshot first, sheet re-fetched in the background every DECK_TTL
+    seconds (10 minutes by default). All sessions share it, so no user action ever clears or re-downloads the deck for everyone.
+    Each new sheet version first carries progress of renamed rows over and drops orphaned entries.
+    With B2_DECK_INGEST=stream, large sheets are parsed while they download and a cold start
+    quizzes from the rows loaded so far.
+    """
+    from quiz_core import read_deck # Also called from the warm-up thread, before the engine imports below ran
+    from deck_snapshots import DeckSource, DECK_TTL
+    from deck_ingest import DECK_INGEST, read_deck_streaming
+    from progress_reconcile import reconcile_store
+    store = get_progress_store()
+    streaming = DECK_INGEST == 'stream'
+    return DeckSource(url, read_deck_streaming if streaming else read_deck, ttl=DECK_TTL, partial_decks=streaming,
+                      reconcile=lambda df, previous_df: reconcile_store(store, df, previous_df))
+
+def warm_up_engine():
+    """Background part of a cold start: engine imports and the first deck load."""
+    import importlib
+    for module in ENGINE_MODULES:
+        importlib.import_module(module)
+    from quiz_core import SHEET_URL
+    get_deck_source(SHEET_URL).current()
+
+@st.cache_resource
+def start_warm_up():
+    """Starts warm_up_engine once per process, so the login screen doesn't wait for pandas or the sheet."""
+    thread = threading.Thread(target=warm_up_engine, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource
+def start_metrics():
+    """Process-wide sidecar serving Prometheus metrics on B2_METRICS_PORT (None if unset)."""
+    return start_metrics_server()
+
+def touch_session():
+    """Marks this session active for b2_active_sessions (also from fragment reruns)."""
+    ACTIVE_SESSIONS.touch('app', st.session_state.setdefault('metrics_session_id', uuid.uuid4().hex))
+
+@st.cache_resource
+def get_answer_log():
+    """Process-wide answer event log (batched Parquet parts in answer_log/)."""
+    return AnswerLogWriter()
+
+@st.cache_resource
+def get_frame_memo():
+    """Process-wide LRU memo of the merged deck + progress frames, shared by all sessions."""
+    memo = FrameMemo()
+    watch_frame_memo(memo)
+    return memo
+
+@st.cache_resource
+def get_answer_stats():
+    """Process-wide stats aggregates over the answer log, refreshed incrementally."""
+    return AnswerStats()
+
+@st.cache_resource(max_entries=2)
+def get_word_index(_df_base, deck_ver):
+    """Typed-answer index for one deck version, built once and shared by all sessions."""
+    return WordIndex(_df_base['Word'].tolist())
+
+@st.cache_resource(max_entries=2)
+def get_lektion_partition(_df_base, deck_ver):
+    """Row positions per Lektion and the sorted Lektion list for one deck version, shared by all sessions."""
+    return LektionPartition(_df_base)
+
+@st.cache_resource(max_entries=2)
+def get_search_index(_df_base, deck_ver):
+    """Full-text search index for one deck version, built once and shared by all sessions."""
+    return SearchIndex(_df_base)
+
+@st.cache_data(max_entries=512)
+def get_word_detail(_df_base, unique_id, deck_ver):
+    """Field / value table for one item, formatted once per item and deck version (None if the item is gone)."""
+    row = _df_base[_df_base['Unique_ID'] == unique_id]
+    if row.empty:
+        return None
+    row = row.iloc[0]
+    return pd.DataFrame({'Field': row.index.astype(str), 'Value': [str(value) for value in row.tolist()]})
 
-# URL ของ Google Sheet ของคุณ
-SHEET_URL = "https://docs.google.com/spreadsheets/d/1nvX2mTrJO49VykgzNtpdpcTmtbIrXmYOjoFD7ro1T54/export?format=csv"
-
-# ไฟล์สำหรับเก็บสถานะผู้ใช้และคำถาม (จะถูกสร้างในโฟลเดอร์เดียวกับสคริปต์นี้)
-USER_DATA_FILE = 'user_data.json'
-
-def load_user_data():
-    """Load user-specific quiz data from JSON file."""
-    if os.path.exists(USER_DATA_FILE):
-        with open(USER_DATA_FILE, 'r', encoding='utf-8') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                st.error("Error decoding user_data.json. Starting with empty data.")
-                return {}
-    return {}
-
-def save_user_data(data):
-    """Save user-specific quiz data to JSON file."""
-    with open(USER_DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-
-@st.cache_data(ttl=600) # Cache data for 10 minutes
 def load_data(url):
-    """Function to load data from a Google Sheet."""
-    try:
-        df = pd.read_csv(url)
-        df.dropna(subset=['Quiz', 'Word', 'Answer', 'Lektion'], inplace=True)
-        df['Unique_ID'] = df['Quiz'] + "::" + df['Word']
-        df['Status'] = 'not started yet'
-        df['Richtig Count'] = 0
-        df['False Count'] = 0
-        return df
-    except Exception as e:
-        st.error(f"Cannot load Google Sheets URL: {e}. Please ensure the URL is correct and accessible.")
-        return None
+    """Function to load data from a Google Sheet (or the newest local snapshot while the sheet is loading)."""
+    deck_source = get_deck_source(url)
+    df = deck_source.current()
+    if df is None:
+        st.error(f"Cannot load Google Sheets URL: {deck_source.last_error}. Please ensure the URL is correct and accessible.")
+    return df
+
+def load_user_frame(df_base, username):
+    """(merged frame, progress dict) for a persistent user; stores defaults for new items, if any."""
+    store = get_progress_store()
+    with PROGRESS_READ_SECONDS.labels(store.backend).time():
+        if store.ensure(username, df_base['Unique_ID'].tolist()):
+            get_frame_memo().acknowledge(username, store.signature())
+        user_progress = store.get_many(username)
+    check_progress_store(store)
+    with FRAME_BUILD_SECONDS.labels('app').time():
+        return merge_progress(df_base, user_progress), user_progress
 
 def initialize_quiz_data(df_base, username):
     """
     Initializes or loads quiz data for the current user, merging with the loaded Google Sheet data.
     If username is 'Guest', it always returns a fresh DataFrame without saving.
+    The merged frame is memoized per (user, deck version, progress version) and must not be modified.
     """
     if df_base is None or df_base.empty: 
         return pd.DataFrame() 
 
-    df_copy = df_base.copy()
-
-    df_copy['Richtig Count'] = pd.to_numeric(df_copy['Richtig Count'], errors='coerce').fillna(0).astype(int)
-    df_copy['False Count'] = pd.to_numeric(df_copy['False Count'], errors='coerce').fillna(0).astype(int)
-
-    if username == "Faeng": # Only Faeng's data is persistent
-        user_data = load_user_data()
-        if username not in user_data:
-            user_data[username] = {}
-
-        for index, row in df_copy.iterrows():
-            unique_id = row['Unique_ID']
-            if unique_id not in user_data[username]:
-                user_data[username][unique_id] = {
-                    'Status': 'not started yet',
-                    'Richtig Count': 0,
-                    'False Count': 0
-                }
-            
-            quiz_progress = user_data[username][unique_id]
-            
-            df_copy.loc[index, 'Status'] = quiz_progress.get('Status', 'not started yet')
-            df_copy.loc[index, 'Richtig Count'] = int(quiz_progress.get('Richtig Count', 0))
-            df_copy.loc[index, 'False Count'] = int(quiz_progress.get('False Count', 0))
-
-        save_user_data(user_data)
-        st.session_state.user_quiz_data[username] = user_data[username]
+    memo = get_frame_memo()
+    if is_persistent_user(username): # Only Faeng's data is persistent
+        key = (username, deck_version(df_base), memo.progress_version(username, get_progress_store().signature()))
+        df_with_progress, user_progress = memo.get(key, lambda: load_user_frame(df_base, username))
+        st.session_state.user_quiz_data[username] = user_progress
+        return df_with_progress
     else: # Guest or any other user - data is not loaded/saved persistently
-        for index, row in df_copy.iterrows():
-            df_copy.loc[index, 'Status'] = 'not started yet'
-            df_copy.loc[index, 'Richtig Count'] = 0
-            df_copy.loc[index, 'False Count'] = 0
         st.session_state.user_quiz_data[username] = {}
-        
-    return df_copy
+        return memo.get((username, deck_version(df_base), 0), lambda: build_guest_frame(df_base))
+
+def build_guest_frame(df_base):
+    with FRAME_BUILD_SECONDS.labels('app').time():
+        return merge_progress(df_base, {})
 
 def update_quiz_progress(unique_id, is_correct, username):
     """
     Updates the progress for a specific quiz item for the current user and saves it.
     Guest's progress is only stored in session state, not to file.
     """
-    if username == "Faeng":
-        user_data = load_user_data()
-        
-        if username not in user_data:
-            user_data[username] = {}
-        if unique_id not in user_data[username]:
-            user_data[username][unique_id] = {'Status': 'not started yet', 'Richtig Count': 0, 'False Count': 0}
-
-        current_progress = user_data[username][unique_id]
-
-        if is_correct:
-            current_progress['Richtig Count'] = int(current_progress.get('Richtig Count', 0)) + 1
-        else:
-            current_progress['False Count'] = int(current_progress.get('False Count', 0)) + 1
-        
-        current_progress['Status'] = 'done' 
-
-        user_data[username][unique_id] = current_progress
-        save_user_data(user_data)
+    ANSWERS.labels('app', is_correct).inc()
+    if is_persistent_user(username):
+        store = get_progress_store()
+        with PROGRESS_WRITE_SECONDS.labels(store.backend).time():
+            current_progress = store.increment(username, unique_id, is_correct)
+        get_frame_memo().bump(username)
         st.session_state.user_quiz_data[username][unique_id] = current_progress
     else: # Guest's progress - update only in session state
         if username not in st.session_state.user_quiz_data:
             st.session_state.user_quiz_data[username] = {}
         if unique_id not in st.session_state.user_quiz_data[username]:
-            st.session_state.user_quiz_data[username][unique_id] = {'Status': 'not started yet', 'Richtig Count': 0, 'False Count': 0}
+            st.session_state.user_quiz_data[username][unique_id] = new_progress()
         
-        current_progress = st.session_state.user_quiz_data[username][unique_id]
-        if is_correct:
-            current_progress['Richtig Count'] += 1
-        else:
-            current_progress['False Count'] += 1
-        current_progress['Status'] = 'done'
+        apply_answer(st.session_state.user_quiz_data[username][unique_id], is_correct)
 
+    record_selection_answers(username, [(unique_id, is_correct)])
 
-def get_filtered_sorted_questions(df_with_progress, sort_option, lektion_filter):
+def record_selection_answers(username, results):
     """
-    Filters and sorts the DataFrame based on user's selected options.
-    Receives df_with_progress which already includes user-specific counts and status.
+    Keep the weighted samplers' counts and the shuffle bags' tiers in step with (unique_id,
+    is_correct) answers (O(log n) / O(1) each, no DataFrame work).
     """
-    if df_with_progress.empty:
-        return pd.DataFrame()
+    for (sampler_user, *_), (sampler, _) in st.session_state.get('weighted_samplers', {}).items():
+        if sampler_user == username:
+            for unique_id, is_correct in results:
+                sampler.record_answer(unique_id, is_correct)
+    progress = st.session_state.user_quiz_data.get(username, {})
+    for (bag_user, sort_option, *_), (bag, labels) in st.session_state.get('shuffle_bags', {}).items():
+        if bag_user == username:
+            for unique_id, _ in results:
+                if unique_id in labels:
+                    bag.update(labels[unique_id], question_tier(progress.get(unique_id), sort_option))
+
+def log_answer_event(chosen, is_correct, deck_ver, mode='quiz'):
+    """Append the current question's answer to the event log, with the time since it was shown."""
+    shown_at = st.session_state.get('question_shown_at')
+    get_answer_log().log(
+        st.session_state.username, st.session_state.current_quiz_id, st.session_state.get('current_lektion'),
+        st.session_state.correct_answer_word, chosen, is_correct,
+        response_ms=(time.time() - shown_at) * 1000 if shown_at else None, deck_version=deck_ver, mode=mode,
+    )
 
-    filtered_df = df_with_progress.copy()
+def get_confusion_tracker(username):
+    """This user's confusion tracker: loaded from CONFUSION_FILE for persistent users, session-only otherwise."""
+    trackers = st.session_state.setdefault('confusion_trackers', {})
+    if username not in trackers:
+        trackers[username] = load_confusions(username) if is_persistent_user(username) else ConfusionTracker()
+    return trackers[username]
+
+def record_confusions(username, pairs):
+    """Count (correct word, chosen wrong word) pairs and save once for persistent users."""
+    tracker = get_confusion_tracker(username)
+    for correct_word, chosen_word in pairs:
+        tracker.record(correct_word, chosen_word)
+    if pairs and is_persistent_user(username):
+        save_confusions(username, tracker)
+
+def update_quiz_progress_batch(results, username):
+    """
+    Like update_quiz_progress for a list of (unique_id, is_correct) answers,
+    with a single batch write to the progress store.
+    """
+    for _, is_correct in results:
+        ANSWERS.labels('app', is_correct).inc()
+    if is_persistent_user(username):
+        store = get_progress_store()
+        with PROGRESS_WRITE_SECONDS.labels(store.backend).time():
+            updated = store.increment_many(username, results)
+        get_frame_memo().bump(username)
+        st.session_state.user_quiz_data.setdefault(username, {}).update(updated)
+    else: # Guest's progress - update only in session state
+        apply_answers(st.session_state.user_quiz_data.setdefault(username, {}), results)
 
-    if lektion_filter and lektion_filter != "All":
-        filtered_df = filtered_df[filtered_df['Lektion'] == lektion_filter]
+    record_selection_answers(username, results)
 
-    filtered_df['False Count'] = pd.to_numeric(filtered_df['False Count'], errors='coerce').fillna(0).astype(int)
-    filtered_df['Richtig Count'] = pd.to_numeric(filtered_df['Richtig Count'], errors='coerce').fillna(0).astype(int)
 
-    if sort_option == "Not Started Yet":
-        not_started = filtered_df[filtered_df['Status'] == 'not started yet']
-        if not not_started.empty:
-            filtered_df = not_started
-        else:
-            questions_to_review = filtered_df[filtered_df['False Count'] > 0]
-            if not questions_to_review.empty:
-                filtered_df = questions_to_review.sort_values(by='False Count', ascending=False)
-            
-    elif sort_option == "False Count > 0":
-        questions_to_review_specific = filtered_df[(filtered_df['False Count'] > 0) & (filtered_df['Richtig Count'] == 0)]
-        
-        if not questions_to_review_specific.empty:
-            filtered_df = questions_to_review_specific.sort_values(by='False Count', ascending=False)
-        else:
-            questions_with_any_false = filtered_df[filtered_df['False Count'] > 0]
-            if not questions_with_any_false.empty:
-                filtered_df = questions_with_any_false.sort_values(by='False Count', ascending=False)
-            else:
-                fallback_df = df_with_progress.copy() 
-                if lektion_filter and lektion_filter != "All":
-                    fallback_df = fallback_df[fallback_df['Lektion'] == lektion_filter]
-                filtered_df = fallback_df
-                st.info(f"No questions with 'False Count > 0' (and Richtig Count = 0) found for Lektion '{lektion_filter if lektion_filter != 'All' else 'All'}'. Displaying random questions from this filter.")
-
-    elif sort_option == "By Lektion":
-        filtered_df = filtered_df.sort_values(by='Lektion')
+def get_lektion_candidates(df_with_progress, lektion_filter):
+    """
+    Rows of df_with_progress in the selected Lektion (a lookup in the deck's LektionPartition).
+    While a search drill is active only its matching items are candidates.
+    """
+    partition = get_lektion_partition(df_with_progress, deck_version(df_with_progress))
+    candidates = partition.take(df_with_progress, lektion_filter)
+    drill_ids = st.session_state.get('drill_ids')
+    if drill_ids:
+        candidates = candidates[candidates['Unique_ID'].isin(drill_ids)]
+    return candidates
 
+def get_filtered_sorted_questions(df_with_progress, sort_option, lektion_filter):
+    """
+    Filters and sorts the DataFrame based on user's selected options.
+    Receives df_with_progress which already includes user-specific counts and status.
+    """
+    candidates = get_lektion_candidates(df_with_progress, lektion_filter)
+    filtered_df, used_fallback = select_questions(candidates, sort_option, "All") # Lektion already applied
+    if used_fallback:
+        st.info(f"No questions with 'False Count > 0' (and Richtig Count = 0) found for Lektion '{lektion_filter if lektion_filter != 'All' else 'All'}'. Displaying random questions from this filter.")
     return filtered_df
 
+def get_weighted_sampler(df_base_original, username, lektion_filter):
+    """
+    Error-weighted sampler for this user, Lektion and deck version. Built from the user's
+    progress once and then kept in session state; only the latest filter is kept.
+    """
+    key = (username, lektion_filter, deck_version(df_base_original), st.session_state.get('drill_query'))
+    samplers = st.session_state.setdefault('weighted_samplers', {})
+    if key not in samplers:
+        df_with_progress = initialize_quiz_data(df_base_original, username)
+        samplers.clear()
+        samplers[key] = build_weighted_sampler(get_lektion_candidates(df_with_progress, lektion_filter), "All")
+    return samplers[key]
+
+def get_shuffle_bag(df_base_original, username, sort_option, lektion_filter):
+    """
+    Shuffle bag that orders the questions of the non-weighted modes for this user, filter and
+    deck version, so every candidate comes up once before any repeats. Built from the user's
+    progress once (the filter's candidates and their tiers), then kept in step by
+    record_selection_answers; only the latest filter is kept. Returns (bag, {Unique_ID: index label}).
+    """
+    key = (username, sort_option, lektion_filter, deck_version(df_base_original), st.session_state.get('drill_query'))
+    bags = st.session_state.setdefault('shuffle_bags', {})
+    if key not in bags:
+        candidates = get_lektion_candidates(initialize_quiz_data(df_base_original, username), lektion_filter)
+        bags.clear()
+        bags[key] = (ShuffleBag(dict(zip(candidates.index, question_tiers(candidates, sort_option).tolist())), rng=random),
+                     dict(zip(candidates['Unique_ID'], candidates.index)))
+    return bags[key]
+
 def setup_question(df_base_original, username, sort_option, lektion_filter):
     """
     Sets up a new question and choices based on filters and sort option.
@@ -184,11 +298,22 @@ def setup_question(df_base_original, username, sort_option, lektion_filter):
         st.session_state.current_quiz_id = ""
         return
 
-    df_with_progress_for_selection = initialize_quiz_data(df_base_original, username)
-
-    filtered_sorted_df = get_filtered_sorted_questions(df_with_progress_for_selection, sort_option, lektion_filter)
-
-    if filtered_sorted_df.empty:
+    question_row = None
+    with QUESTION_SELECT_SECONDS.labels('app', sort_option).time():
+        if sort_option == WEIGHTED_MODE:
+            sampler, labels = get_weighted_sampler(df_base_original, username, lektion_filter)
+            unique_id = sampler.sample(random)
+            if unique_id is not None:
+                question_row = df_base_original.loc[labels[unique_id]]
+        else:
+            bag, _ = get_shuffle_bag(df_base_original, username, sort_option, lektion_filter)
+            label = bag.next()
+            if label is not None:
+                question_row = df_base_original.loc[label]
+                if sort_option == "False Count > 0" and bag.tier() == FALLBACK_TIER:
+                    st.info(f"No questions with 'False Count > 0' (and Richtig Count = 0) found for Lektion '{lektion_filter}'. Displaying random questions from this filter.")
+
+    if question_row is None:
         st.session_state.question = "No questions match your current filters. Try different options."
         st.session_state.choices = []
         st.session_state.answered = None
@@ -197,40 +322,199 @@ def setup_question(df_base_original, username, sort_option, lektion_filter):
         st.session_state.current_quiz_id = ""
         return
 
-    question_row = filtered_sorted_df.sample(n=1).iloc[0]
-
     st.session_state.question = question_row['Quiz']
     st.session_state.correct_answer_word = question_row['Word']
     st.session_state.full_answer = question_row['Answer']
     st.session_state.current_quiz_id = question_row['Unique_ID']
+    st.session_state.current_lektion = question_row['Lektion']
     
-    correct_answer = st.session_state.correct_answer_word
+    confused = get_confusion_tracker(username).top(st.session_state.correct_answer_word, 3)
+    st.session_state.choices = pick_choices(df_base_original, st.session_state.correct_answer_word, random, confused)
+    st.session_state.answered = None
+    st.session_state.typed_feedback = None
+    st.session_state.question_shown_at = time.time()
+
+def render_stats(username):
+    """Stats view for one user, from the pre-aggregated answer history plus not-yet-written answers."""
+    answer_stats = get_answer_stats()
+    answer_stats.refresh()
+    stats = answer_stats.user_stats(username, get_answer_log().pending())
+
+    st.subheader(f"📊 Stats for {username}")
+    if not stats or not stats['answers']:
+        st.info("No answers recorded yet. Play a few questions first!")
+        return
+
+    col_answers, col_accuracy, col_streak, col_best = st.columns(4)
+    col_answers.metric("Answers", stats['answers'])
+    col_accuracy.metric("Accuracy", f"{stats['correct'] / stats['answers']:.0%}")
+    col_streak.metric("Day streak", stats['current_streak'])
+    col_best.metric("Best streak", stats['best_streak'])
+
+    st.markdown("**Accuracy per Lektion**")
+    st.bar_chart(stats['lektion']['accuracy'])
+    st.markdown("**Learning curve**")
+    st.line_chart(stats['daily'][['accuracy', 'cumulative accuracy']])
+    st.markdown("**Most confused words**")
+    confused = stats['confusions'].head(15).reset_index()
+    st.dataframe(confused.rename(columns={'word': 'Word', 'chosen': 'Picked instead', 'count': 'Times'}), hide_index=True)
+
+def start_exam(df_base_original, username, sort_option, lektion_filter, n_questions):
+    """Draws the whole exam (questions + distractors) once and keeps it in session state."""
+    df_with_progress = initialize_quiz_data(df_base_original, username)
+    candidates = get_filtered_sorted_questions(df_with_progress, sort_option, lektion_filter)
+    st.session_state.exam = draw_exam(candidates, df_base_original, n_questions, np.random.default_rng())
+    st.session_state.exam_started_at = time.time()
+    st.session_state.exam_results = None
+
+def finish_exam(username, deck_ver):
+    """Scores all exam answers in bulk and saves them with one progress write."""
+    exam = st.session_state.exam
+    responses = [st.session_state.get(f"exam_answer_{i}") for i in range(len(exam))]
+    correct = score_exam(exam, responses)
+    answered = [(question['Unique_ID'], bool(is_correct))
+                for question, response, is_correct in zip(exam, responses, correct) if response is not None]
+    update_quiz_progress_batch(answered, username)
+    record_confusions(username, [(question['Word'], response)
+                                 for question, response, is_correct in zip(exam, responses, correct)
+                                 if response is not None and not is_correct])
+    answer_log = get_answer_log()
+    for question, response, is_correct in zip(exam, responses, correct):
+        if response is not None:
+            answer_log.log(username, question['Unique_ID'], question['Lektion'], question['Word'], response,
+                           is_correct, deck_version=deck_ver, mode='exam')
+    st.session_state.exam_results = {
+        'responses': responses,
+        'correct': correct.tolist(),
+        'seconds': time.time() - st.session_state.exam_started_at,
+    }
+
+def close_exam():
+    """Leaves exam mode and clears its answers from session state."""
+    for i in range(len(st.session_state.get('exam', []))):
+        st.session_state.pop(f"exam_answer_{i}", None)
+    st.session_state.exam = None
+    st.session_state.exam_results = None
+
+def answer_choice(choice, deck_ver):
+    """on_click of a choice button: records the answer before the fragment reruns."""
+    if st.session_state.answered is not None:
+        return
+    if choice == st.session_state.correct_answer_word:
+        st.session_state.answered = "correct"
+        update_quiz_progress(st.session_state.current_quiz_id, True, st.session_state.username)
+    else:
+        st.session_state.answered = "incorrect"
+        update_quiz_progress(st.session_state.current_quiz_id, False, st.session_state.username)
+        record_confusions(st.session_state.username, [(st.session_state.correct_answer_word, choice)])
+    log_answer_event(choice, st.session_state.answered == "correct", deck_ver)
+
+def answer_typed(word_index, deck_ver):
+    """on_click of the typed form's Check button: checks the typed word and records the answer."""
+    typed_answer = st.session_state.get('typed_answer', '')
+    if not typed_answer.strip() or st.session_state.answered is not None:
+        return
+    verdict, hint = word_index.check(typed_answer, st.session_state.correct_answer_word)
+    is_correct = verdict != 'wrong'
+    st.session_state.answered = "correct" if is_correct else "incorrect"
+    st.session_state.typed_feedback = (typed_answer, verdict, hint)
+    update_quiz_progress(st.session_state.current_quiz_id, is_correct, st.session_state.username)
+    if hint:
+        record_confusions(st.session_state.username, [(st.session_state.correct_answer_word, hint)])
+    log_answer_event(typed_answer, is_correct, deck_ver, mode='typed')
+
+@st.fragment
+def question_card(data_base, answer_mode, sort_option, lektion_filter):
+    """
+    Question, choices, feedback and Next as one fragment: an answer click reruns only this
+    function, not the deck load, progress merge and sidebar above it. Answers are recorded in
+    on_click callbacks, which run before the fragment, so one fragment run shows the feedback.
+    """
+    touch_session()
+    # --- Display Current Question ---
+    current_lektion_display = 'N/A'
+    if st.session_state.current_quiz_id: # Set by setup_question, no deck lookup on every fragment run
+        current_lektion_display = st.session_state.get('current_lektion', 'N/A')
     
-    incorrect_words_pool = df_base_original[df_base_original['Word'] != correct_answer]['Word'].unique().tolist()
+    st.subheader(f"Lektion: {current_lektion_display}")
     
-    if correct_answer in incorrect_words_pool: 
-        incorrect_words_pool.remove(correct_answer)
+    st.markdown(f"### {st.session_state.question}")
+    st.write("---")
 
-    if len(incorrect_words_pool) >= 3:
-        choices = random.sample(incorrect_words_pool, 3) + [correct_answer]
+    if not st.session_state.choices:
+        st.info("No choices available for this question, or no questions match your current filters. Try adjusting your filter/sort options.")
+    elif answer_mode == "Typing the word":
+        with st.form("typed_answer_form", clear_on_submit=True):
+            st.text_input("Type the missing word", key='typed_answer', disabled=(st.session_state.answered is not None))
+            st.form_submit_button("Check", disabled=(st.session_state.answered is not None), on_click=answer_typed,
+                                  args=(get_word_index(data_base, deck_version(data_base)), deck_version(data_base)))
     else:
-        choices = incorrect_words_pool + [correct_answer]
+        st.write(":") 
+        cols = st.columns(2) 
+        for i, choice in enumerate(st.session_state.choices):
+            with cols[i % 2]: 
+                st.button(choice, key=f"choice_{i}", use_container_width=True, disabled=(st.session_state.answered is not None),
+                          on_click=answer_choice, args=(choice, deck_version(data_base)))
+
+    st.write("---")
 
-    random.shuffle(choices)
-    st.session_state.choices = choices
-    st.session_state.answered = None
+
+    # --- Feedback and Answer Display ---
+    if st.session_state.answered == "correct":
+        st.success(f"Yeah! 🎉 '{st.session_state.correct_answer_word}' ")
+        st.info(f"**เฉลย**\n\n{st.session_state.full_answer}")
+        
+    elif st.session_state.answered == "incorrect":
+        st.error("Failed :(")
+        st.info(f"**เฉลย:**\n\n{st.session_state.full_answer}")
+
+    if st.session_state.answered is not None and st.session_state.get('typed_feedback'):
+        typed_answer, verdict, hint = st.session_state.typed_feedback
+        if verdict == 'close':
+            st.caption(f"Almost! You typed '{typed_answer}', the spelling is '{st.session_state.correct_answer_word}'.")
+        elif hint:
+            st.caption(f"'{typed_answer}' looks like '{hint}', another word from the deck.")
+
+    # --- Pop-up for Word Detail ---
+    # The popover tracks its open state, so the detail is only looked up and sent while it is open
+    if st.session_state.get('current_quiz_id') and data_base is not None and not data_base.empty:
+        detail_popover = st.popover("See word detail", on_change="rerun", key='word_detail_open')
+        if detail_popover.open:
+            current_word_detail = get_word_detail(data_base, st.session_state.current_quiz_id, deck_version(data_base))
+            if current_word_detail is not None:
+                detail_popover.markdown(f"**Word Details for: `{st.session_state.correct_answer_word}`**")
+                detail_popover.dataframe(current_word_detail, hide_index=True, use_container_width=True)
+            else:
+                detail_popover.warning("Word details not found for this question in the base data.")
+
+    # Display current question's Richtig/False Counts if answered
+    if st.session_state.answered is not None and st.session_state.current_quiz_id:
+        current_quiz_data = st.session_state.user_quiz_data[st.session_state.username].get(st.session_state.current_quiz_id, {})
+        st.write(f"**Richtig Count:** {current_quiz_data.get('Richtig Count', 0)} | **False Count:** {current_quiz_data.get('False Count', 0)}")
+
+
+    # --- Next Question Button ---
+    if st.session_state.answered is not None or not st.session_state.choices: 
+        if st.button("Next! ➡️", use_container_width=True):
+            fresh_data_from_sheet = load_data(SHEET_URL) # Revalidated in the background once older than DECK_TTL
+            if fresh_data_from_sheet is not None and not fresh_data_from_sheet.empty:
+                # data_base is this fragment's argument; the full rerun below passes in the fresh one
+                data_base = fresh_data_from_sheet
+                
+                processed_data_for_quiz_logic = initialize_quiz_data(data_base, st.session_state.username)
+                
+                setup_question(processed_data_for_quiz_logic, st.session_state.username, sort_option, lektion_filter)
+            else:
+                st.error("Could not load data for the next question. Please check the Google Sheet URL or ensure it's not empty.")
+            st.rerun() # Full rerun, so the sidebar summary picks up this question's answer
 
 # --- Streamlit UI ---
 
 st.set_page_config(layout="centered", page_title="B2 Goethe Quiz")
 st.title("B2 Goethe Quiz 🇩🇪")
-
-# Initialize 'data_base' as the base data from Google Sheet, which will be the source for details
-data_base = load_data(SHEET_URL) 
-
-if data_base is None or data_base.empty:
-    st.warning("Could not load quiz data. Please check the Google Sheet URL and ensure it contains data.")
-    st.stop() 
+warm_up = start_warm_up()
+start_metrics()
+touch_session()
 
 # --- Login Section ---
 if 'logged_in' not in st.session_state:
@@ -256,6 +540,35 @@ if not st.session_state.logged_in:
             st.success("Logged in as Guest! Viel Erfolg beim Lernen! 📚")
             st.rerun()
 else: # If logged in, show current user and logout option
+    if warm_up.is_alive():
+        with st.spinner("Loading the deck..."):
+            warm_up.join()
+
+    # --- Engine imports (after the first paint; usually already done by the warm-up thread) ---
+    import pandas as pd
+    import numpy as np
+
+    from quiz_core import (
+        SHEET_URL, SORT_OPTIONS, WEIGHTED_MODE, FALLBACK_TIER, is_persistent_user, deck_version, build_weighted_sampler,
+        new_progress, apply_answer, apply_answers, merge_progress, select_questions, question_tier, question_tiers,
+        pick_choices, draw_exam, score_exam, LektionPartition,
+    )
+    from deck_validation import issue_count
+    from answer_log import AnswerLogWriter
+    from answer_stats import AnswerStats
+    from confusion_tracker import ConfusionTracker, load_confusions, save_confusions
+    from word_index import WordIndex
+    from search_index import SearchIndex
+    from shuffle_bag import ShuffleBag
+    from frame_memo import FrameMemo
+
+    # Initialize 'data_base' as the base data from Google Sheet, which will be the source for details
+    data_base = load_data(SHEET_URL) 
+
+    if data_base is None or data_base.empty:
+        st.warning("Could not load quiz data. Please check the Google Sheet URL and ensure it contains data.")
+        st.stop() 
+
     st.sidebar.success(f"Logged in as: **{st.session_state.username}**")
     if st.sidebar.button("Logout"):
         st.session_state.logged_in = False
@@ -264,28 +577,52 @@ else: # If logged in, show current user and logout option
         st.rerun()
 
     # --- Quiz Application ---
-    # 'data_for_quiz_logic' will be the DataFrame with user progress, initialized once per session/user
+    # The user's progress is loaded once per user and deck version; answers keep
+    # st.session_state.user_quiz_data up to date in between, so reruns don't reload it
     if 'user_quiz_data' not in st.session_state or \
        st.session_state.get('user_quiz_data_loaded_for_user') != st.session_state.username:
         
         st.session_state.user_quiz_data = {} 
         # Pass the base data to initialize_quiz_data
-        data_for_quiz_logic = initialize_quiz_data(data_base, st.session_state.username) 
+        initialize_quiz_data(data_base, st.session_state.username) 
         st.session_state.user_quiz_data_loaded_for_user = st.session_state.username
-    else:
-        # If already initialized, ensure 'data_for_quiz_logic' is the one with current user progress
-        data_for_quiz_logic = initialize_quiz_data(data_base, st.session_state.username)
+        st.session_state.user_quiz_data_loaded_for_deck = deck_version(data_base)
+    elif st.session_state.get('user_quiz_data_loaded_for_deck') != deck_version(data_base):
+        # New deck version: new items get their default progress entries
+        initialize_quiz_data(data_base, st.session_state.username)
+        st.session_state.user_quiz_data_loaded_for_deck = deck_version(data_base)
 
 
     # --- Filter and Sort Options in Sidebar ---
     st.sidebar.subheader("Filter & Sort Options")
-    all_lektions = ["All"] + sorted(data_base['Lektion'].unique().tolist()) # Use data_base for overall lektions
+    all_lektions = ["All"] + get_lektion_partition(data_base, deck_version(data_base)).lektions # Use data_base for overall lektions
     lektion_filter = st.sidebar.selectbox("Filter by Lektion", all_lektions, key='lektion_filter')
     sort_option = st.sidebar.selectbox(
         "Sort Questions By",
-        ("Random", "Not Started Yet", "False Count > 0", "By Lektion"),
+        SORT_OPTIONS,
         key='sort_option'
     )
+    answer_mode = st.sidebar.radio("Answer by", ("Multiple choice", "Typing the word"), key='answer_mode')
+
+    # --- Search in Sidebar (index built once per deck version, a query is a few dict lookups) ---
+    search_query = st.sidebar.text_input("Search Quiz / Word / Answer", key='search_query').strip()
+    if search_query:
+        search_index = get_search_index(data_base, deck_version(data_base))
+        matches = search_index.match_positions(search_query)
+        st.sidebar.caption(f"{len(matches)} matches")
+        for position in matches[:10]:
+            row = data_base.iloc[position]
+            st.sidebar.caption(f"**{row['Word']}** ({row['Lektion']}) {row['Quiz']}")
+        if matches and st.sidebar.button(f"Drill these {len(matches)}", use_container_width=True):
+            st.session_state.drill_ids = frozenset(data_base['Unique_ID'].iloc[matches].tolist())
+            st.session_state.drill_query = search_query
+            st.rerun()
+    if st.session_state.get('drill_ids'):
+        st.sidebar.info(f"Drilling {len(st.session_state.drill_ids)} items matching '{st.session_state.drill_query}'")
+        if st.sidebar.button("Stop drill", use_container_width=True):
+            st.session_state.drill_ids = None
+            st.session_state.drill_query = None
+            st.rerun()
     
     # --- Display Quiz Progress Summary in Sidebar ---
     st.sidebar.subheader("Quiz Progress Summary")
@@ -310,6 +647,90 @@ else: # If logged in, show current user and logout option
     st.sidebar.write(f"Remaining: **{total_quizzes_in_sheet - done_quizzes}**")
     st.sidebar.write(f"Total Correct Answers: **{total_richtig}**")
     st.sidebar.write(f"Total False Answers: **{total_false}**")
+    show_stats = st.sidebar.toggle("📊 Show my stats", key='show_stats')
+
+    deck_source = get_deck_source(SHEET_URL)
+    if deck_source.from_snapshot:
+        st.sidebar.caption(f"Deck version `{deck_source.version()}` (saved snapshot"
+                           f"{', sheet unreachable' if deck_source.last_error else ', checking for updates'})")
+    if data_base.attrs.get('partial'):
+        st.sidebar.info(f"Deck still loading: {len(data_base)} questions so far")
+
+    # --- Deck Validation Report in Sidebar (computed once per sheet version in load_data) ---
+    validation = data_base.attrs.get('validation')
+    load_metrics = data_base.attrs.get('load_metrics', {})
+    if validation:
+        with st.sidebar.expander(f"Deck Check ({issue_count(validation)} issues)"):
+            st.write(f"Rows: **{validation['rows_kept']}** of {validation['rows_read']} kept")
+            st.write(f"Blank cells: **{validation['blank_count']}** rows dropped")
+            st.write(f"Duplicate Quiz::Word: **{validation['duplicate_count']}** rows dropped")
+            st.write(f"Word not in Quiz: **{validation['word_not_in_quiz_count']}**")
+            st.write(f"Lektion typos: **{len(validation['lektion_typos'])}**")
+            for issue in validation['duplicates'][:10]:
+                st.caption(f"Row {issue['row']} duplicates row {issue['first_row']}")
+            for issue in validation['word_not_in_quiz'][:10]:
+                st.caption(f"Row {issue['row']}: '{issue['Word']}' not found in Quiz")
+            for typo in validation['lektion_typos']:
+                st.caption(f"'{typo['value']}' ({typo['count']}x) looks like '{typo['suggestion']}'")
+            if load_metrics:
+                st.caption(f"Load: fetch {load_metrics['fetch_seconds'] * 1000:.0f} ms, "
+                           f"validation {load_metrics['validation_seconds'] * 1000:.0f} ms"
+                           f"{' (cached)' if load_metrics['validation_cached'] else ''}, "
+                           f"processing {load_metrics['process_seconds'] * 1000:.0f} ms")
+            memo_stats = get_frame_memo().stats()
+            st.caption(f"Progress frames: {memo_stats['entries']} cached, {memo_stats['bytes'] / 2**20:.1f} MB, "
+                       f"hit rate {memo_stats['hit_rate']:.0%} ({memo_stats['evictions']} evicted)")
+            reconcile = deck_source.last_reconcile
+            if reconcile and (reconcile['renamed'] or reconcile['removed'] or reconcile['kept_orphans']):
+                kept = ""
+                if reconcile['kept_orphans']:
+                    reason = "many rows disappeared" if reconcile['gc_skipped'] else "until gone from two versions"
+                    kept = f", {reconcile['kept_orphans']} answered kept ({reason})"
+                st.caption(f"Progress: {len(reconcile['renamed'])} renamed rows carried over, "
+                           f"{reconcile['removed']} stale entries removed{kept}")
+
+    # --- Exam Mode in Sidebar ---
+    st.sidebar.subheader("Exam Mode")
+    exam_size = st.sidebar.number_input("Exam questions", min_value=1, max_value=200, value=30, step=5, key='exam_size')
+    if st.sidebar.button("Start exam", use_container_width=True):
+        close_exam()
+        start_exam(data_base, st.session_state.username, sort_option, lektion_filter, exam_size)
+        st.rerun()
+
+    # --- Stats View (replaces the quiz card while the toggle is on) ---
+    if show_stats:
+        render_stats(st.session_state.username)
+        st.stop()
+
+    # --- Exam (served from session state until it is closed) ---
+    if st.session_state.get('exam'):
+        exam = st.session_state.exam
+        results = st.session_state.get('exam_results')
+        st.subheader(f"Exam: {len(exam)} questions")
+
+        if results is None:
+            st.caption(f"Started {int(time.time() - st.session_state.exam_started_at) // 60} min ago")
+            with st.form("exam_form"):
+                for i, question in enumerate(exam):
+                    st.markdown(f"**{i + 1}.** {question['Quiz']}")
+                    st.radio("Answer", question['choices'], index=None, key=f"exam_answer_{i}", label_visibility="collapsed")
+                submitted = st.form_submit_button("Submit exam", use_container_width=True)
+            if submitted:
+                finish_exam(st.session_state.username, deck_version(data_base))
+                st.rerun()
+        else:
+            n_correct = sum(results['correct'])
+            minutes, seconds = divmod(int(results['seconds']), 60)
+            st.success(f"Score: **{n_correct} / {len(exam)}** ({n_correct / len(exam):.0%}) in {minutes}:{seconds:02d}")
+            for i, (question, response, is_correct) in enumerate(zip(exam, results['responses'], results['correct'])):
+                mark = "✅" if is_correct else "❌"
+                st.markdown(f"{mark} **{i + 1}.** {question['Answer']}  \n"
+                            f"Your answer: `{response if response is not None else '-'}` | Word: `{question['Word']}`")
+
+        if st.button("Close exam", use_container_width=True):
+            close_exam()
+            st.rerun()
+        st.stop()
 
 
     # --- Setup Question Logic ---
@@ -317,85 +738,16 @@ else: # If logged in, show current user and logout option
         if 'question' not in st.session_state or \
            st.session_state.get('current_user_for_question_setup') != st.session_state.username or \
            st.session_state.get('current_sort_option') != sort_option or \
-           st.session_state.get('current_lektion_filter') != lektion_filter:
+           st.session_state.get('current_lektion_filter') != lektion_filter or \
+           st.session_state.get('current_drill_query') != st.session_state.get('drill_query'):
             
             # Use data_for_quiz_logic (which has user progress) for question selection
             setup_question(data_base, st.session_state.username, sort_option, lektion_filter) 
             st.session_state.current_user_for_question_setup = st.session_state.username
             st.session_state.current_sort_option = sort_option
             st.session_state.current_lektion_filter = lektion_filter
+            st.session_state.current_drill_query = st.session_state.get('drill_query')
     else:
         st.error("Quiz data not available. Please check the Google Sheet link.")
 
-    # --- Display Current Question ---
-    current_lektion_display = 'N/A'
-    if st.session_state.current_quiz_id and not data_base.empty and not data_base[data_base['Unique_ID'] == st.session_state.current_quiz_id].empty:
-        current_lektion_display = data_base[data_base['Unique_ID'] == st.session_state.current_quiz_id]['Lektion'].iloc[0]
-    
-    st.subheader(f"Lektion: {current_lektion_display}")
-    
-    st.markdown(f"### {st.session_state.question}")
-    st.write("---")
-
-    st.write(":") 
-    cols = st.columns(2) 
-
-    if st.session_state.choices: 
-        for i, choice in enumerate(st.session_state.choices):
-            with cols[i % 2]: 
-                if st.button(choice, key=f"choice_{i}", use_container_width=True, disabled=(st.session_state.answered is not None)):
-                    if choice == st.session_state.correct_answer_word:
-                        st.session_state.answered = "correct"
-                        update_quiz_progress(st.session_state.current_quiz_id, True, st.session_state.username)
-                    else:
-                        st.session_state.answered = "incorrect"
-                        update_quiz_progress(st.session_state.current_quiz_id, False, st.session_state.username)
-                    st.rerun() 
-    else:
-        st.info("No choices available for this question, or no questions match your current filters. Try adjusting your filter/sort options.")
-
-    st.write("---")
-
-
-    # --- Feedback and Answer Display ---
-    if st.session_state.answered == "correct":
-        st.success(f"Yeah! 🎉 '{st.session_state.correct_answer_word}' ")
-        st.info(f"**เฉลย**\n\n{st.session_state.full_answer}")
-        
-    elif st.session_state.answered == "incorrect":
-        st.error("Failed :(")
-        st.info(f"**เฉลย:**\n\n{st.session_state.full_answer}")
-
-    # --- Pop-up for Word Detail ---
-    if st.session_state.get('current_quiz_id') and data_base is not None and not data_base.empty:
-        current_word_detail = data_base[data_base['Unique_ID'] == st.session_state.current_quiz_id]
-        
-        if not current_word_detail.empty:
-            with st.popover("See word detail"):
-                st.markdown(f"**Word Details for: `{st.session_state.correct_answer_word}`**")
-                st.dataframe(current_word_detail.transpose(), use_container_width=True)
-        else:
-            st.warning("Word details not found for this question in the base data.")
-
-    # Display current question's Richtig/False Counts if answered
-    if st.session_state.answered is not None and st.session_state.current_quiz_id:
-        current_quiz_data = st.session_state.user_quiz_data[st.session_state.username].get(st.session_state.current_quiz_id, {})
-        st.write(f"**Richtig Count:** {current_quiz_data.get('Richtig Count', 0)} | **False Count:** {current_quiz_data.get('False Count', 0)}")
-
-
-# --- Next Question Button ---
-    if st.session_state.answered is not None or not st.session_state.choices: 
-        if st.button("Next! ➡️", use_container_width=True):
-            load_data.clear() 
-            fresh_data_from_sheet = load_data(SHEET_URL)
-            if fresh_data_from_sheet is not None and not fresh_data_from_sheet.empty:
-                # No 'global data_base' needed here. data_base is already a module-level global.
-                # We are simply re-assigning the module-level 'data_base' variable.
-                data_base = fresh_data_from_sheet # This will now re-assign the global data_base directly
-                
-                processed_data_for_quiz_logic = initialize_quiz_data(data_base, st.session_state.username)
-                
-                setup_question(processed_data_for_quiz_logic, st.session_state.username, sort_option, lektion_filter)
-            else:
-                st.error("Could not load data for the next question. Please check the Google Sheet URL or ensure it's not empty.")
-            st.rerun()
+    question_card(data_base, answer_mode, sort_option, lektion_filter)
@@ -0,0 +1,123 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench_utils import write_sample_deck, bench_env, summarize, Timer
+
+# Local load test: requests/second and p99 latency of the HTTP API (quiz_api.py) versus the
+# Streamlit path (app_20250713_pop.py driven through streamlit.testing's AppTest).
+#
+# Run with: python bench_api.py --clients 32 --seconds 10
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for_server(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("Quiz API did not start")
+
+def api_client(port, user, deadline, latencies, errors):
+    """One virtual learner: GET /next then POST /answer until the deadline, on one keep-alive connection."""
+    rng = random.Random(user)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    while time.monotonic() < deadline:
+        with Timer(latencies):
+            conn.request('GET', f'/next?user={user}&mode=Random')
+            response = conn.getresponse()
+            question = json.loads(response.read())
+        if response.status != 200:
+            errors.append(response.status)
+            continue
+        body = json.dumps({'user': user, 'id': question['id'], 'choice': rng.choice(question['choices'])})
+        with Timer(latencies):
+            conn.request('POST', '/answer', body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+        if response.status != 200:
+            errors.append(response.status)
+    conn.close()
+
+def bench_api(deck_path, user_data_path, clients, seconds):
+    port = free_port()
+    env = dict(os.environ, **bench_env(deck_path, user_data_path))
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, 'quiz_api.py'), '--port', str(port)],
+                              env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_server(port)
+        latencies, errors = [], []
+        deadline = time.monotonic() + seconds
+        threads = [threading.Thread(target=api_client, args=(port, f"guest{i}", deadline, latencies, errors))
+                   for i in range(clients)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+    print(summarize(f"HTTP API ({clients} clients)", latencies, elapsed))
+    if errors:
+        print(f"  {len(errors)} non-200 responses")
+
+def bench_streamlit(deck_path, user_data_path, seconds):
+    """Each click in the Streamlit app is one full script rerun; time answer + Next reruns for one learner."""
+    os.environ.update(bench_env(deck_path, user_data_path))
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print("Streamlit path: skipped (streamlit is not installed)")
+        return
+
+    at = AppTest.from_file(os.path.join(HERE, 'app_20250713_pop.py'), default_timeout=60)
+    at.run()
+    next(b for b in at.button if b.label == "Guest").click().run()
+
+    latencies = []
+    deadline = time.monotonic() + seconds
+    start = time.perf_counter()
+    while time.monotonic() < deadline:
+        with Timer(latencies):
+            at.button(key="choice_0").click().run()
+        with Timer(latencies):
+            next(b for b in at.button if b.label.startswith("Next!")).click().run()
+    elapsed = time.perf_counter() - start
+    print(summarize("Streamlit reruns (1 session)", latencies, elapsed))
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests/second and p99 latency of the HTTP API versus the Streamlit path.")
+    parser.add_argument('--items', type=int, default=2000, help="Rows in the synthetic deck")
+    parser.add_argument('--clients', type=int, default=32, help="Concurrent API clients")
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck_path = write_sample_deck(os.path.join(tmp, 'deck.csv'), n_items=args.items)
+        user_data_path = os.path.join(tmp, 'user_data.json')
+        bench_api(deck_path, user_data_path, args.clients, args.seconds)
+        bench_streamlit(deck_path, user_data_path, args.seconds)
+
+if __name__ == "__main__":
+    main()
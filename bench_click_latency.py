@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import write_sample_deck, bench_env, summarize, Timer
+from bench_api import free_port
+
+# End-to-end click latency of the Streamlit app, measured like a browser sees it: a real
+# `streamlit run` server and a websocket client speaking Streamlit's protocol. Each click is
+# timed from sending the BackMsg until the server reports the (full or fragment) run finished.
+# AppTest can't be used here because it always reruns the whole script.
+#
+# Run with: python bench_click_latency.py --rounds 50 [--script other_app.py]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TERMINAL_STATUSES = ('FINISHED_SUCCESSFULLY', 'FINISHED_FRAGMENT_RUN_SUCCESSFULLY', 'FINISHED_WITH_COMPILE_ERROR')
+
+
+def wait_for_streamlit(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/_stcore/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Streamlit server did not start")
+
+def start_streamlit(script, env, cwd):
+    """`streamlit run script` on a free port, headless; returns (process, port)."""
+    env = dict(env, PYTHONPATH=os.pathsep.join(filter(None, [HERE, env.get('PYTHONPATH')])))
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', script, '--server.port', str(port),
+         '--server.headless', 'true', '--server.enableXsrfProtection', 'false',
+         '--browser.gatherUsageStats', 'false'],
+        env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return server, port
+
+
+class BrowserSession:
+    """Minimal browser stand-in: reruns the script over the websocket and clicks buttons by label or key."""
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.buttons = {} # widget id -> (label, fragment id)
+        self.first_delta_at = None # time.perf_counter() of the first element the last run sent
+
+    async def rerun(self, widget_states=(), fragment_id=""):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.widget_states.widgets.extend(widget_states)
+        if fragment_id:
+            message.rerun_script.fragment_id = fragment_id
+        else:
+            self.buttons.clear()
+        self.first_delta_at = None
+        await self.websocket.send(message.SerializeToString())
+
+        status_names = ForwardMsg.ScriptFinishedStatus.Name
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.websocket.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and self.first_delta_at is None:
+                self.first_delta_at = time.perf_counter()
+            if kind == 'delta' and forward.delta.new_element.WhichOneof('type') == 'button':
+                button = forward.delta.new_element.button
+                self.buttons[button.id] = (button.label, forward.delta.fragment_id)
+            elif kind == 'script_finished' and status_names(forward.script_finished) in TERMINAL_STATUSES:
+                return status_names(forward.script_finished)
+
+    def find(self, label=None, key=None):
+        for widget_id, (button_label, fragment_id) in self.buttons.items():
+            if (key and widget_id.endswith(f"-{key}")) or (label and button_label.startswith(label)):
+                return widget_id, fragment_id
+        raise LookupError(f"No button {label or key!r} in the last run")
+
+    async def click(self, label=None, key=None):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget_id, fragment_id = self.find(label, key)
+        return await self.rerun([WidgetState(id=widget_id, trigger_value=True)], fragment_id)
+
+async def drive(port, user, rounds):
+    import websockets
+
+    answer_latencies, next_latencies, fragment_runs = [], [], 0
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                                  max_size=None) as websocket:
+        session = BrowserSession(websocket)
+        await session.rerun()
+        await session.click(label=user)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            with Timer(answer_latencies):
+                status = await session.click(key="choice_0")
+            fragment_runs += status == 'FINISHED_FRAGMENT_RUN_SUCCESSFULLY'
+            with Timer(next_latencies):
+                await session.click(label="Next!")
+        elapsed = time.perf_counter() - start
+    return answer_latencies, next_latencies, fragment_runs, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end click latency of the Streamlit app over its websocket protocol.")
+    parser.add_argument('--items', type=int, default=2000, help="Rows in the synthetic deck")
+    parser.add_argument('--rounds', type=int, default=50, help="Answer + Next clicks to time")
+    parser.add_argument('--user', default="Guest", help="Login button to press (Faeng writes user data)")
+    parser.add_argument('--script', default=os.path.join(HERE, 'app_20250713_pop.py'), help="App to run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck_path = write_sample_deck(os.path.join(tmp, 'deck.csv'), n_items=args.items)
+        env = dict(os.environ, **bench_env(deck_path, os.path.join(tmp, 'user_data.json')))
+        server, port = start_streamlit(args.script, env, tmp)
+        try:
+            wait_for_streamlit(port)
+            answers, nexts, fragment_runs, elapsed = asyncio.run(drive(port, args.user, args.rounds))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(summarize("Answer click", answers, elapsed))
+    print(summarize("Next click", nexts, elapsed))
+    print(f"  {fragment_runs} of {len(answers)} answer clicks ran only the question fragment")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import write_sample_deck, SheetServer
+
+# Whole-sheet vs streaming deck ingestion (deck_ingest.py) on a large synthetic deck served by
+# the local sheet stand-in, optionally throttled to --rate MB/s like a slow link. Each mode
+# loads the deck in a fresh interpreter, so its peak RSS is its own:
+#   whole           quiz_core.read_deck (pd.read_csv of the whole response, then validation)
+#   stream-pyarrow  deck_ingest.read_deck_streaming, pyarrow's CSV reader block by block
+#   stream-pandas   the same with pandas' read_csv(chunksize=...), as without pyarrow
+# Reports total load time, time until the first partial deck could be served (the whole deck
+# for "whole"), peak RSS, and checks that every mode yields the same Unique_IDs, column
+# types, deck version and validation counts.
+#
+# Run with: python bench_ingest.py [--items 300000] [--rate 20] [--runs 3]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODES = ('whole', 'stream-pyarrow', 'stream-pandas')
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def load_once(mode, url):
+    """Runs in the child: loads the deck one way and prints its measurements as JSON."""
+    import pandas as pd
+    import quiz_core
+    import deck_ingest
+    baseline_mb = peak_rss_mb() # After the imports, so only the load itself is compared
+    first = []
+    started = time.perf_counter()
+    if mode == 'whole':
+        df = quiz_core.read_deck(url)
+    else:
+        engine = mode.split('-', 1)[1]
+        df = deck_ingest.read_deck_streaming(url, engine=engine,
+                                             on_partial=lambda partial: first or first.append(time.perf_counter()))
+    finished = time.perf_counter()
+    validation = df.attrs['validation']
+    print(json.dumps({
+        'seconds': finished - started,
+        'first_deck_seconds': (first[0] if first else finished) - started,
+        'peak_mb': peak_rss_mb(),
+        'load_mb': peak_rss_mb() - baseline_mb,
+        'rows': len(df),
+        'deck_version': df.attrs['deck_version'],
+        'ids_hash': int(pd.util.hash_pandas_object(df['Unique_ID'], index=False).sum()) & 0xFFFFFFFFFFFFFFFF,
+        'dtypes': {column: str(dtype) for column, dtype in df.dtypes.items()},
+        'counts': [validation['blank_count'], validation['duplicate_count'], validation['word_not_in_quiz_count']],
+        'chunks': df.attrs['load_metrics'].get('chunks', 1),
+    }))
+
+def measure(mode, url):
+    result = subprocess.run([sys.executable, __file__, '--child', mode, '--url', url],
+                            cwd=HERE, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole-sheet vs streaming deck ingestion on a large synthetic deck.")
+    parser.add_argument('--items', type=int, default=300000, help="Rows in the synthetic deck")
+    parser.add_argument('--rate', type=float, default=20.0, help="Sheet download speed in MB/s (0: unthrottled)")
+    parser.add_argument('--runs', type=int, default=3, help="Loads per mode (the median is reported)")
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return load_once(args.child, args.url)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck_path = write_sample_deck(os.path.join(tmp, 'deck.csv'), n_items=args.items)
+        size_mb = os.path.getsize(deck_path) / (1024 * 1024)
+        with SheetServer(deck_path, rate=args.rate * 1024 * 1024 if args.rate else None) as sheet:
+            results = {}
+            for mode in MODES:
+                runs = sorted((measure(mode, sheet.url) for _ in range(args.runs)), key=lambda run: run['seconds'])
+                results[mode] = runs[len(runs) // 2]
+
+    rate = f"{args.rate:g} MB/s" if args.rate else "unthrottled"
+    print(f"{args.items} rows ({size_mb:.1f} MB CSV, {rate}), median of {args.runs} loads:")
+    print(f"  {'mode':<16} {'total s':>8} {'first deck s':>13} {'peak MB':>8} {'load MB':>8} {'chunks':>7}")
+    for mode, run in results.items():
+        print(f"  {mode:<16} {run['seconds']:>8.2f} {run['first_deck_seconds']:>13.2f} {run['peak_mb']:>8.0f}"
+              f" {run['load_mb']:>8.0f} {run['chunks']:>7}")
+
+    whole = results['whole']
+    mismatches = [mode for mode, run in results.items()
+                  if (run['rows'], run['deck_version'], run['ids_hash'], run['dtypes'], run['counts'])
+                  != (whole['rows'], whole['deck_version'], whole['ids_hash'], whole['dtypes'], whole['counts'])]
+    print(f"  same rows, Unique_IDs, column types, deck version and validation counts: {'no: ' + ', '.join(mismatches) if mismatches else 'yes'}")
+    if mismatches:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench_utils import write_sample_deck, bench_env, percentile
+
+# Simulated load: --learners virtual learners driven through app_20250713_pop.py with
+# Streamlit's AppTest, all in this process so they share the app's process-wide caches like
+# sessions on one server. Learners take turns (round robin), so every session stays open for
+# the whole run; each turn is one interaction:
+#   open    first run of the script (login screen)
+#   login   click Faeng (--persistent of the learners, progress in user_data.json) or Guest
+#   filter  pick another Lektion or sort option (with probability --filter-rate per question)
+#   answer  click one of the choices
+#   next    click "Next!"
+# Reports latency percentiles per interaction, and every --sample-every seconds the process
+# RSS and the size of user_data.json. As a regression gate, --save writes the results as
+# JSON and --baseline compares a run against saved results, exiting non-zero when a p95 or
+# the peak RSS got worse by more than --tolerance (or above --max-p95-ms / --max-rss-mb).
+#
+# Run with: python bench_load.py [--learners 200] [--questions 5] [--save base.json | --baseline base.json]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INTERACTIONS = ('open', 'login', 'filter', 'answer', 'next')
+
+
+def memory_mb():
+    """(current RSS, peak RSS) of this process in MB."""
+    current = peak = None
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024
+    except OSError: # Not Linux: peak only
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return current, peak
+
+
+class Learner:
+    """One virtual learner: an AppTest session and the generator of its interactions."""
+    def __init__(self, script, user, questions, filter_rate, rng, timeout):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(script, default_timeout=timeout)
+        self.user = user
+        self.questions = questions
+        self.filter_rate = filter_rate
+        self.rng = rng
+
+    def steps(self):
+        """Yields (interaction name, callable that runs it)."""
+        at = self.at
+        yield 'open', at.run
+        yield 'login', next(b for b in at.button if b.label == self.user).click().run
+        for _ in range(self.questions):
+            if self.rng.random() < self.filter_rate:
+                if self.rng.random() < 0.5:
+                    box = at.selectbox(key='lektion_filter')
+                else:
+                    box = at.selectbox(key='sort_option')
+                yield 'filter', box.set_value(self.rng.choice(box.options)).run
+            choices = [b for b in at.button if (b.key or "").startswith("choice_") and not b.disabled]
+            if not choices: # No question matches the filter
+                box = at.selectbox(key='lektion_filter')
+                yield 'filter', box.set_value(box.options[0]).run
+                continue
+            yield 'answer', self.rng.choice(choices).click().run
+            yield 'next', next(b for b in at.button if b.label.startswith("Next!")).click().run
+
+
+def run_load(args, user_data_path):
+    rng = random.Random(args.seed)
+    learners = []
+    for i in range(args.learners):
+        user = "Faeng" if rng.random() < args.persistent else "Guest"
+        learner = Learner(args.script, user, args.questions, args.filter_rate, random.Random(rng.random()), args.timeout)
+        learners.append(learner.steps())
+
+    latencies = {name: [] for name in INTERACTIONS}
+    timeline = []
+    errors = 0
+    start = next_sample = time.perf_counter()
+    active = list(learners)
+    while active:
+        still_active = []
+        for steps in active:
+            try:
+                name, interaction = next(steps)
+            except StopIteration:
+                continue
+            except Exception: # The element to click wasn't there (e.g. the last run failed)
+                errors += 1
+                continue
+            began = time.perf_counter()
+            at = interaction()
+            latencies[name].append(time.perf_counter() - began)
+            if at.exception:
+                errors += 1
+                continue
+            still_active.append(steps)
+            if time.perf_counter() >= next_sample:
+                timeline.append(sample(start, latencies, user_data_path))
+                next_sample = time.perf_counter() + args.sample_every
+        active = still_active
+    timeline.append(sample(start, latencies, user_data_path))
+    return latencies, timeline, errors, time.perf_counter() - start
+
+def sample(start, latencies, user_data_path):
+    current, peak = memory_mb()
+    size = os.path.getsize(user_data_path) if os.path.exists(user_data_path) else 0
+    return {'seconds': time.perf_counter() - start, 'interactions': sum(len(values) for values in latencies.values()),
+            'rss_mb': current, 'peak_rss_mb': peak, 'user_data_kb': size / 1024}
+
+def results_of(latencies, timeline, errors, elapsed):
+    return {
+        'elapsed_seconds': elapsed,
+        'errors': errors,
+        'peak_rss_mb': max((row['peak_rss_mb'] or 0) for row in timeline),
+        'user_data_kb': timeline[-1]['user_data_kb'],
+        'interactions': {name: {'count': len(values), 'p50_ms': percentile(values, 50) * 1000,
+                                'p95_ms': percentile(values, 95) * 1000, 'p99_ms': percentile(values, 99) * 1000}
+                         for name, values in latencies.items() if values},
+        'timeline': timeline,
+    }
+
+def regressions(results, args):
+    """Failed gate checks, as messages."""
+    failed = []
+    if results['errors']:
+        failed.append(f"{results['errors']} interactions failed")
+    for name, stats in results['interactions'].items():
+        if args.max_p95_ms and stats['p95_ms'] > args.max_p95_ms:
+            failed.append(f"{name} p95 {stats['p95_ms']:.1f} ms > {args.max_p95_ms:.1f} ms")
+    if args.max_rss_mb and results['peak_rss_mb'] > args.max_rss_mb:
+        failed.append(f"peak RSS {results['peak_rss_mb']:.0f} MB > {args.max_rss_mb:.0f} MB")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        limit = 1 + args.tolerance
+        for name, stats in results['interactions'].items():
+            before = baseline['interactions'].get(name)
+            if before and stats['p95_ms'] > before['p95_ms'] * limit:
+                failed.append(f"{name} p95 {stats['p95_ms']:.1f} ms vs baseline {before['p95_ms']:.1f} ms")
+        if results['peak_rss_mb'] > baseline['peak_rss_mb'] * limit:
+            failed.append(f"peak RSS {results['peak_rss_mb']:.0f} MB vs baseline {baseline['peak_rss_mb']:.0f} MB")
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated load: many virtual learners driven through the Streamlit app with AppTest.")
+    parser.add_argument('--learners', type=int, default=200, help="Virtual learners, all kept open until the end")
+    parser.add_argument('--questions', type=int, default=5, help="Questions each learner answers")
+    parser.add_argument('--persistent', type=float, default=0.5, help="Share of learners logging in as Faeng")
+    parser.add_argument('--filter-rate', type=float, default=0.2, help="Chance of a filter change before a question")
+    parser.add_argument('--items', type=int, default=2000, help="Rows in the synthetic deck")
+    parser.add_argument('--sample-every', type=float, default=5.0, help="Seconds between memory / file size samples")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=60.0, help="Seconds one script run may take")
+    parser.add_argument('--script', default=os.path.join(HERE, 'app_20250713_pop.py'), help="App to load")
+    parser.add_argument('--save', help="Write the results as JSON to this file")
+    parser.add_argument('--baseline', help="Results JSON of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown / growth against --baseline")
+    parser.add_argument('--max-p95-ms', type=float, help="Fail if any interaction's p95 is above this")
+    parser.add_argument('--max-rss-mb', type=float, help="Fail if the peak RSS is above this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Before the app's modules are imported: they read their paths from the environment
+        user_data_path = os.path.join(tmp, 'user_data.json')
+        os.environ.update(bench_env(write_sample_deck(os.path.join(tmp, 'deck.csv'), n_items=args.items), user_data_path))
+        os.environ['B2_CONFUSION_FILE'] = os.path.join(tmp, 'confusion_data.json')
+        sys.path.insert(0, HERE)
+        os.chdir(tmp)
+        import streamlit.logger
+        streamlit.logger.set_log_level(logging.ERROR) # "missing ScriptRunContext" on every bare run
+        latencies, timeline, errors, elapsed = run_load(args, user_data_path)
+        os.chdir(HERE)
+    results = results_of(latencies, timeline, errors, elapsed)
+
+    print(f"{args.learners} learners x {args.questions} questions on {args.items} items, {elapsed:.1f} s:")
+    print(f"  {'interaction':<12} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, values in latencies.items():
+        if values:
+            print(f"  {name:<12} {len(values):>7} {percentile(values, 50) * 1000:>9.1f} {percentile(values, 95) * 1000:>9.1f}"
+                  f" {percentile(values, 99) * 1000:>9.1f} {max(values) * 1000:>9.1f}")
+    print(f"  errors {errors}")
+    print(f"{'seconds':>9} {'interactions':>13} {'RSS MB':>8} {'peak MB':>8} {'user_data KB':>13}")
+    for row in timeline:
+        print(f"{row['seconds']:>9.1f} {row['interactions']:>13} {row['rss_mb'] or 0:>8.0f} "
+              f"{row['peak_rss_mb'] or 0:>8.0f} {row['user_data_kb']:>13.0f}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    failed = regressions(results, args)
+    for message in failed:
+        print(f"REGRESSION: {message}")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
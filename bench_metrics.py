@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import os
+import re
+import tempfile
+import time
+import urllib.request
+
+from bench_utils import write_sample_deck, bench_env, SheetServer
+from bench_click_latency import BrowserSession, start_streamlit, wait_for_streamlit, free_port, HERE
+from metrics import Registry, Counter, Histogram
+
+# Cost and output of the operational metrics (metrics.py):
+#   1. hot path: nanoseconds per counter increment, histogram observation and timed block,
+#      against an empty loop, and how long a scrape of the populated registry takes
+#   2. end to end: a real `streamlit run` with B2_METRICS_PORT set; --sessions browser
+#      sessions log in and answer --rounds questions, then /metrics is scraped, every sample
+#      line is checked against the Prometheus text format and the quiz's series are printed
+#
+# Run with: python bench_metrics.py [--sessions 5] [--rounds 10] [--user Faeng]
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? '
+                         r'(-?[0-9.eE+-]+|\+Inf|-Inf|NaN)$')
+
+
+def per_op_ns(operation, n):
+    start = time.perf_counter_ns()
+    for i in range(n):
+        operation(i)
+    return (time.perf_counter_ns() - start) / n
+
+def hot_path(n):
+    """{operation: ns per call} and the scrape time in ms of a registry with those series."""
+    registry = Registry()
+    answers = registry.register(Counter('bench_answers_total', "Answers.", ('source', 'correct')))
+    writes = registry.register(Histogram('bench_write_seconds', "Writes.", ('backend',)))
+    def timed(i):
+        with writes.labels('json').time():
+            pass
+    baseline = per_op_ns(lambda i: None, n)
+    costs = {
+        'counter labels().inc()': per_op_ns(lambda i: answers.labels('app', i % 2 == 0).inc(), n),
+        'histogram labels().observe()': per_op_ns(lambda i: writes.labels('json').observe(i * 1e-6), n),
+        'histogram labels().time() block': per_op_ns(timed, n),
+    }
+    costs = {name: ns - baseline for name, ns in costs.items()}
+    start = time.perf_counter()
+    registry.render()
+    return costs, (time.perf_counter() - start) * 1000
+
+def check_exposition(text):
+    """Sample lines that don't follow the Prometheus text format."""
+    return [line for line in text.splitlines() if line and not line.startswith('#') and not SAMPLE_LINE.match(line)]
+
+async def learner(port, user, rounds):
+    import websockets
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                                  max_size=None, open_timeout=60) as websocket:
+        session = BrowserSession(websocket)
+        await session.rerun()
+        await session.click(label=user)
+        for _ in range(rounds):
+            await session.click(key="choice_0")
+            await session.click(label="Next!")
+
+def end_to_end(args, tmp):
+    deck_path = write_sample_deck(os.path.join(tmp, 'deck.csv'), n_items=args.items)
+    with SheetServer(deck_path, delay=args.sheet_delay) as sheet:
+        metrics_port = free_port()
+        env = dict(os.environ, B2_METRICS_PORT=str(metrics_port), **bench_env(sheet.url, os.path.join(tmp, 'user_data.json')))
+        server, port = start_streamlit(args.script, env, tmp)
+        try:
+            wait_for_streamlit(port)
+            async def run():
+                await asyncio.gather(*(learner(port, args.user, args.rounds) for _ in range(args.sessions)))
+            asyncio.run(run())
+            start = time.perf_counter()
+            with urllib.request.urlopen(f"http://127.0.0.1:{metrics_port}/metrics", timeout=10) as response:
+                content_type = response.headers['Content-Type']
+                text = response.read().decode('utf-8')
+            scrape_ms = (time.perf_counter() - start) * 1000
+        finally:
+            server.terminate()
+            server.wait()
+    return text, content_type, scrape_ms
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost and output of the operational metrics.")
+    parser.add_argument('--ops', type=int, default=200000, help="Calls per hot-path measurement")
+    parser.add_argument('--items', type=int, default=2000, help="Rows in the synthetic deck")
+    parser.add_argument('--sessions', type=int, default=5, help="Concurrent browser sessions")
+    parser.add_argument('--rounds', type=int, default=10, help="Answer + Next clicks per session")
+    parser.add_argument('--sheet-delay', type=float, default=0.2, help="Seconds the sheet stand-in waits before answering")
+    parser.add_argument('--user', default="Faeng")
+    parser.add_argument('--script', default=os.path.join(HERE, 'app_20250713_pop.py'), help="App to run end to end")
+    args = parser.parse_args()
+
+    costs, render_ms = hot_path(args.ops)
+    print(f"Hot path, {args.ops} calls each (empty loop subtracted):")
+    for name, ns in costs.items():
+        print(f"  {name:<34} {ns:>7.0f} ns")
+    print(f"  {'scrape of those series':<34} {render_ms:>7.2f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        text, content_type, scrape_ms = end_to_end(args, tmp)
+    invalid = check_exposition(text)
+    print(f"End to end, {args.sessions} sessions x {args.rounds} answers as {args.user}: "
+          f"/metrics {len(text) / 1024:.1f} KiB in {scrape_ms:.1f} ms ({content_type})")
+    print(f"  lines not in the Prometheus text format: {len(invalid)}")
+    for line in invalid[:5]:
+        print(f"    {line}")
+    for line in text.splitlines():
+        if line.startswith('b2_') and '_bucket' not in line:
+            print(f"  {line}")
+    if invalid:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
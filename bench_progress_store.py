@@ -0,0 +1,237 @@
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench_utils import summarize, Timer
+from progress_store import BACKENDS, open_progress_store
+
+# Conformance and throughput of the progress-store backends (progress_store.py):
+#   1. conformance: every backend runs the same checks of the interface semantics (missing
+#      items, increment counting, batches, status scans, ensure, load_all/replace_all, migrate,
+#      iter_all, merge, progress surviving a reopen, concurrent increments from several threads,
+#      signature changes)
+#   2. throughput: --users learners with --items items each, then timed single gets, batch
+#      gets of a whole user, single increments, batches of --batch increments and status scans
+#   3. replicas: --replicas processes answer the same items of one learner at the same time,
+#      each with its own store handle, as replicas behind a load balancer would; reports the
+#      answers per second and how many answers were lost
+# The kv backend runs against the kv_server.py stand-in in its own process.
+# Exits non-zero if any backend fails a check.
+#
+# Run with: python bench_progress_store.py [--backend kv] [--items 2000] [--ops 500] [--replicas 4]
+
+PERSISTENT = ('json', 'sqlite', 'kv')
+
+
+def start_kv_server():
+    """(process, "host:port") of a kv_server.py stand-in on a free port."""
+    server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kv_server.py'),
+                               '--port', '0'], stdout=subprocess.PIPE, text=True)
+    return server, server.stdout.readline().split()[-1]
+
+def store_spec(backend, tmp, kv_address, name):
+    """B2_PROGRESS_STORE spec of a fresh store called name."""
+    if backend == 'kv':
+        return f"kv:{kv_address}/{name}"
+    if backend == 'memory':
+        return "memory:"
+    return f"{backend}:{os.path.join(tmp, f'{name}_{backend}')}"
+
+def store_factory(spec):
+    """make() opening the same location every call, so a second make() is a reopen."""
+    if spec.startswith('memory:'):
+        shared = open_progress_store(spec)
+        return lambda: shared
+    return lambda: open_progress_store(spec)
+
+def check_conformance(backend, make):
+    """[failed check description] for one backend."""
+    failures = []
+    def check(name, condition):
+        if not condition:
+            failures.append(name)
+
+    store = make()
+    check("get of a missing item is None", store.get('Anna', 'x1') is None)
+    check("get_many of an unknown user is empty", store.get_many('Anna') == {})
+
+    signature = store.signature()
+    first = store.increment('Anna', 'x1', True)
+    check("increment returns the new progress",
+          first == {'Status': 'done', 'Richtig Count': 1, 'False Count': 0})
+    check("signature changes on increment", store.signature() != signature)
+    store.increment('Anna', 'x1', False)
+    check("increments add up", store.get('Anna', 'x1') == {'Status': 'done', 'Richtig Count': 1, 'False Count': 1})
+    check("progress is per user", store.get('Ben', 'x1') is None)
+
+    batch = store.increment_many('Anna', [('x2', True), ('x3', False), ('x2', True)])
+    check("increment_many returns every item once", sorted(batch) == ['x2', 'x3'])
+    check("increment_many counts repeats", batch['x2']['Richtig Count'] == 2 and store.get('Anna', 'x2')['Richtig Count'] == 2)
+    check("get_many with ids returns only known ids", sorted(store.get_many('Anna', ['x1', 'x3', 'nope'])) == ['x1', 'x3'])
+
+    check("ensure counts the items it added", store.ensure('Anna', ['x1', 'x4', 'x5']) == 2)
+    check("ensure adds default progress",
+          store.get('Anna', 'x4') == {'Status': 'not started yet', 'Richtig Count': 0, 'False Count': 0})
+    signature = store.signature()
+    check("ensure of known items adds nothing", store.ensure('Anna', ['x1', 'x4']) == 0)
+    check("signature is stable without writes", store.signature() == signature)
+    check("scan_status finds done items", sorted(store.scan_status('Anna', 'done')) == ['x1', 'x2', 'x3'])
+    check("scan_status finds not started items", sorted(store.scan_status('Anna', 'not started yet')) == ['x4', 'x5'])
+
+    everything = store.load_all()
+    check("load_all returns all users", sorted(everything) == ['Anna'] and len(everything['Anna']) == 5)
+    everything['Anna']['x1']['Richtig Count'] = 99
+    check("load_all returns a copy", store.get('Anna', 'x1')['Richtig Count'] == 1)
+    store.replace_all({'Ben': {'y1': {'Status': 'done', 'Richtig Count': 3, 'False Count': 2}}})
+    check("replace_all drops what it doesn't list", store.get_many('Anna') == {})
+    check("replace_all round-trips", store.load_all() == {'Ben': {'y1': {'Status': 'done', 'Richtig Count': 3, 'False Count': 2}}})
+
+    store.increment_many('Ben', [('y2', True), ('y3', False), ('y4', True)])
+    store.migrate({'Ben': {'y1': 'y2', 'y3': 'y5', 'y4': None, 'nope': 'y6'}})
+    moved = store.get_many('Ben')
+    check("migrate combines onto an existing item", moved.get('y2') == {'Status': 'done', 'Richtig Count': 4, 'False Count': 2})
+    check("migrate moves onto a new item", moved.get('y5') == {'Status': 'done', 'Richtig Count': 0, 'False Count': 1})
+    check("migrate deletes and ignores unknown items", sorted(moved) == ['y2', 'y5'])
+    check("iter_all yields every entry", sorted((user, unique_id) for user, unique_id, _ in store.iter_all())
+          == [('Ben', 'y2'), ('Ben', 'y5')])
+    store.merge([('Ben', 'y5', {'Status': 'done', 'Richtig Count': 2, 'False Count': 0}),
+                 ('Dana', 'w1', {'Status': 'not started yet', 'Richtig Count': 0, 'False Count': 0})])
+    check("merge sums counts", store.get('Ben', 'y5') == {'Status': 'done', 'Richtig Count': 2, 'False Count': 1})
+    check("merge adds new users", store.get('Dana', 'w1') == {'Status': 'not started yet', 'Richtig Count': 0, 'False Count': 0})
+    store.merge([('Ben', 'y5', {'Status': 'not started yet', 'Richtig Count': 0, 'False Count': 0})])
+    check("merge keeps the later status", store.get('Ben', 'y5')['Status'] == 'done')
+    store.replace_all({'Ben': {'y1': {'Status': 'done', 'Richtig Count': 3, 'False Count': 2}}})
+
+    if backend in PERSISTENT:
+        reopened = make()
+        check("progress survives a reopen", reopened.get('Ben', 'y1') == {'Status': 'done', 'Richtig Count': 3, 'False Count': 2})
+        signature = reopened.signature()
+        store.increment('Ben', 'y1', True)
+        check("another handle sees the write", reopened.get('Ben', 'y1')['Richtig Count'] == 4)
+        check("signature sees writes through another handle", reopened.signature() != signature)
+        if reopened is not store:
+            reopened.close()
+
+    n_threads, per_thread = 8, 25
+    def answer(i):
+        for _ in range(per_thread):
+            store.increment('Carla', 'z1', i % 2 == 0)
+    threads = [threading.Thread(target=answer, args=(i,)) for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = store.get('Carla', 'z1')
+    check("concurrent increments are not lost",
+          result['Richtig Count'] + result['False Count'] == n_threads * per_thread
+          and result['Richtig Count'] == n_threads // 2 * per_thread)
+    store.close()
+    return failures
+
+def throughput(store, n_users, n_items, n_ops, batch_size):
+    """{operation: (latencies, elapsed)} on a store filled with n_users x n_items items."""
+    users = [f"user{u}" for u in range(n_users)]
+    ids = [f"id{i}" for i in range(n_items)]
+    store.replace_all({user: {} for user in users})
+    for user in users:
+        store.ensure(user, ids)
+
+    results = {}
+    def timed(name, operation, count):
+        latencies = []
+        start = time.perf_counter()
+        for i in range(count):
+            with Timer(latencies):
+                operation(i)
+        results[name] = (latencies, time.perf_counter() - start)
+
+    timed("get", lambda i: store.get(users[i % n_users], ids[i * 7 % n_items]), n_ops)
+    timed("get_many (whole user)", lambda i: store.get_many(users[i % n_users]), max(1, n_ops // 20))
+    timed("increment", lambda i: store.increment(users[i % n_users], ids[i * 7 % n_items], i % 3 != 0), n_ops)
+    timed(f"increment_many x{batch_size}",
+          lambda i: store.increment_many(users[i % n_users], [(ids[(i * batch_size + j) % n_items], j % 2 == 0)
+                                                              for j in range(batch_size)]),
+          max(1, n_ops // batch_size))
+    timed("scan_status", lambda i: store.scan_status(users[i % n_users], 'done'), max(1, n_ops // 20))
+    return results
+
+def _replica(spec, n_answers, n_items, start):
+    store = open_progress_store(spec)
+    start.wait()
+    for i in range(n_answers):
+        store.increment('shared', f"id{i % n_items}", i % 2 == 0)
+    store.close()
+
+def replicas(spec, n_replicas, n_answers, n_items=50):
+    """(answers per second, answers lost) of n_replicas processes answering n_answers each."""
+    open_progress_store(spec).ensure('shared', [f"id{i}" for i in range(n_items)])
+    start = multiprocessing.Barrier(n_replicas + 1)
+    processes = [multiprocessing.Process(target=_replica, args=(spec, n_answers, n_items, start)) for _ in range(n_replicas)]
+    for process in processes:
+        process.start()
+    start.wait()
+    began = time.perf_counter()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - began
+    counted = sum(entry['Richtig Count'] + entry['False Count'] for entry in open_progress_store(spec).get_many('shared').values())
+    return n_replicas * n_answers / elapsed, n_replicas * n_answers - counted
+
+def run(args, backends, tmp, kv_address):
+    """Runs and prints the three parts; True if a conformance check failed."""
+    failed = False
+    print("Conformance:")
+    for backend in backends:
+        failures = check_conformance(backend, store_factory(store_spec(backend, tmp, kv_address, 'conformance')))
+        failed = failed or bool(failures)
+        print(f"  {backend:<8} {'ok' if not failures else 'FAILED'}")
+        for failure in failures:
+            print(f"    - {failure}")
+
+    print(f"Throughput, {args.users} learners x {args.items} items:")
+    for backend in backends:
+        store = open_progress_store(store_spec(backend, tmp, kv_address, 'throughput'))
+        results = throughput(store, args.users, args.items, args.ops, args.batch)
+        for name, (latencies, elapsed) in results.items():
+            print(f"  {summarize(f'{backend} {name}', latencies, elapsed)}")
+        if backend == 'json':
+            print(f"  {'':<28} user_data.json {os.path.getsize(store.path) / 1024:.0f} KiB")
+        store.close()
+
+    print(f"Replicas, {args.replicas} processes x {args.answers} answers on the same learner:")
+    for backend in backends:
+        if backend == 'memory':
+            continue # Not shared between processes
+        rate, lost = replicas(store_spec(backend, tmp, kv_address, 'replicas'), args.replicas, args.answers)
+        print(f"  {backend:<8} {rate:>9.1f} answers/s  lost {lost:>6}")
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Conformance and throughput of the progress-store backends.")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), action='append', help="Backend to run (default: all)")
+    parser.add_argument('--users', type=int, default=20, help="Learners in the throughput run")
+    parser.add_argument('--items', type=int, default=2000, help="Items per learner in the throughput run")
+    parser.add_argument('--ops', type=int, default=500, help="Single gets / increments timed per backend")
+    parser.add_argument('--batch', type=int, default=20, help="Increments per increment_many")
+    parser.add_argument('--replicas', type=int, default=4, help="Processes in the replicas run")
+    parser.add_argument('--answers', type=int, default=200, help="Answers per replica")
+    args = parser.parse_args()
+    backends = args.backend or sorted(BACKENDS)
+
+    kv_server, kv_address = start_kv_server() if 'kv' in backends else (None, None)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            failed = run(args, backends, tmp, kv_address)
+    finally:
+        if kv_server is not None:
+            kv_server.terminate()
+            kv_server.wait()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import os
+import tempfile
+
+from bench_utils import write_sample_deck, bench_env, SheetServer
+from bench_click_latency import BrowserSession, start_streamlit, wait_for_streamlit, HERE
+
+# Memory of several Streamlit workers serving the same deck, as behind a load balancer: starts
+# --workers `streamlit run` processes sharing one snapshot directory, logs one browser session
+# into each (so each has loaded the deck and built a progress frame), then reads every worker's
+# /proc/<pid>/smaps_rollup:
+#   RSS        resident memory, including pages of mapped files shared with other workers
+#   anonymous  memory private to the process (the pandas copy of a pickled deck lives here)
+#   PSS        RSS with every shared page divided by the number of processes mapping it
+# Run once per snapshot format: pickle (every worker unpickles its own copy) and arrow (every
+# worker memory-maps the same file). Linux only.
+#
+# Run with: python bench_shared_deck.py [--workers 8] [--items 200000]
+
+
+def memory_of(pid):
+    """{'rss', 'anonymous', 'pss'} of a process in bytes."""
+    fields = {'Rss': 'rss', 'Anonymous': 'anonymous', 'Pss': 'pss'}
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in fields:
+                memory[fields[name]] = int(value.split()[0]) * 1024
+    return memory
+
+async def log_in(port, user):
+    import websockets
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                                  max_size=None, open_timeout=120) as websocket:
+        session = BrowserSession(websocket)
+        await session.rerun()
+        await session.click(label=user)
+        await session.click(key="choice_0")
+
+async def log_in_everywhere(ports, user):
+    await asyncio.gather(*(log_in(port, user) for port in ports))
+
+def run_workers(fmt, n_workers, deck_path, sheet_delay, user, script):
+    """([memory_of(worker)], sheet requests) with snapshots in format fmt."""
+    with tempfile.TemporaryDirectory() as tmp:
+        with SheetServer(deck_path, delay=sheet_delay) as sheet:
+            env = dict(os.environ, B2_SNAPSHOT_FORMAT=fmt, **bench_env(sheet.url, os.path.join(tmp, 'user_data.json')))
+            workers = [start_streamlit(script, env, tmp) for _ in range(n_workers)]
+            try:
+                for _, port in workers:
+                    wait_for_streamlit(port)
+                asyncio.run(log_in_everywhere([port for _, port in workers], user))
+                return [memory_of(server.pid) for server, _ in workers], sheet.requests
+            finally:
+                for server, _ in workers:
+                    server.terminate()
+                for server, _ in workers:
+                    server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of several Streamlit workers serving the same deck.")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--items', type=int, default=200000, help="Rows in the synthetic deck")
+    parser.add_argument('--sheet-delay', type=float, default=0.5, help="Seconds the sheet stand-in waits before answering")
+    parser.add_argument('--user', default="Guest")
+    parser.add_argument('--script', default=os.path.join(HERE, 'app_20250713_pop.py'), help="App to run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck_path = write_sample_deck(os.path.join(tmp, 'deck.csv'), n_items=args.items)
+        print(f"{args.workers} workers, {args.items} rows ({os.path.getsize(deck_path) / 2**20:.1f} MB CSV), one session each:")
+        for fmt in ('pickle', 'arrow'):
+            memories, requests = run_workers(fmt, args.workers, deck_path, args.sheet_delay, args.user, args.script)
+            mb = lambda key: [memory[key] / 2**20 for memory in memories]
+            print(f"  {fmt:<7} sheet requests {requests}")
+            for key in ('rss', 'anonymous', 'pss'):
+                values = mb(key)
+                print(f"    {key:<10} per worker {sum(values) / len(values):>8.1f} MB  (min {min(values):.1f}, max {max(values):.1f})"
+                      f"  all workers {sum(values):>8.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from bench_utils import write_sample_deck, bench_env, summarize, percentile, Timer, SheetServer
+from bench_click_latency import BrowserSession, start_streamlit, wait_for_streamlit, HERE
+from deck_snapshots import DeckSource
+from quiz_core import read_deck
+
+# How often the sheet is downloaded when many sessions use the app at once. A local stand-in
+# for the Google Sheet counts the requests it gets:
+#   1. in-process: --sessions threads share one DeckSource, start together on a cold process
+#      (no snapshot) and then keep asking for the deck for --duration seconds with a short
+#      --ttl, compared with the old pattern of clearing the shared cache on every "Next!"
+#   2. end to end: --sessions browser sessions against a real `streamlit run`, each logging
+#      in and clicking through --rounds questions at the same time
+#
+# Run with: python bench_single_flight.py [--sessions 100] [--sheet-delay 0.5] [--script other_app.py]
+
+
+class ClearOnNextLoader:
+    """The old loader: one shared cache entry (computed once under a lock, like st.cache_data) that every Next click clears."""
+    def __init__(self, url):
+        self.url = url
+        self.df = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            if self.df is None:
+                self.df = read_deck(self.url)
+            return self.df
+
+    def next_clicked(self):
+        self.df = None
+
+
+def run_sessions(n_sessions, session):
+    """Runs session(i) in n_sessions threads released at the same moment."""
+    start = threading.Barrier(n_sessions)
+    def run(i):
+        start.wait()
+        session(i)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n_sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def in_process(sheet, snapshot_dir, n_sessions, duration, ttl, think):
+    """{scenario: (sheet requests, current() latencies)} for DeckSource and the clear-on-Next loader."""
+    results = {}
+
+    source = DeckSource(sheet.url, read_deck, snapshot_dir=snapshot_dir, ttl=ttl)
+    latencies, before = [], sheet.requests
+    run_sessions(n_sessions, lambda i: _timed(source.current, latencies))
+    results['DeckSource, cold start'] = (sheet.requests - before, latencies)
+
+    latencies, before = [], sheet.requests
+    def revalidating(i):
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            _timed(source.current, latencies)
+            time.sleep(think)
+    run_sessions(n_sessions, revalidating)
+    results[f'DeckSource, {duration:.0f} s at ttl {ttl:g} s'] = (sheet.requests - before, latencies)
+
+    loader = ClearOnNextLoader(sheet.url)
+    latencies, before = [], sheet.requests
+    def clicking(i):
+        deadline = time.monotonic() + duration
+        _timed(loader.current, latencies)
+        while time.monotonic() < deadline:
+            time.sleep(think)
+            loader.next_clicked()
+            _timed(loader.current, latencies)
+    run_sessions(n_sessions, clicking)
+    results[f'Clear on Next, {duration:.0f} s'] = (sheet.requests - before, latencies)
+    return results
+
+def _timed(call, latencies):
+    with Timer(latencies):
+        call()
+
+async def browser_session(port, user, rounds, latencies):
+    import websockets
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                                  max_size=None, open_timeout=60) as websocket:
+        session = BrowserSession(websocket)
+        await session.rerun()
+        with Timer(latencies):
+            await session.click(label=user)
+        for _ in range(rounds):
+            await session.click(key="choice_0")
+            with Timer(latencies):
+                await session.click(label="Next!")
+
+async def end_to_end(port, n_sessions, user, rounds):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(browser_session(port, user, rounds, latencies) for _ in range(n_sessions)))
+    return latencies, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="How often the sheet is downloaded when many sessions use the app at once.")
+    parser.add_argument('--items', type=int, default=2000, help="Rows in the synthetic deck")
+    parser.add_argument('--sessions', type=int, default=100, help="Concurrent sessions")
+    parser.add_argument('--sheet-delay', type=float, default=0.5, help="Seconds the sheet stand-in waits before answering")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds each in-process session keeps asking for the deck")
+    parser.add_argument('--ttl', type=float, default=1.0, help="DeckSource ttl for the in-process run")
+    parser.add_argument('--think', type=float, default=0.05, help="Seconds between two Next clicks in-process")
+    parser.add_argument('--rounds', type=int, default=3, help="Answer + Next clicks per browser session")
+    parser.add_argument('--user', default="Guest")
+    parser.add_argument('--script', default=os.path.join(HERE, 'app_20250713_pop.py'), help="App to run end to end")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck_path = write_sample_deck(os.path.join(tmp, 'deck.csv'), n_items=args.items)
+        with SheetServer(deck_path, delay=args.sheet_delay) as sheet:
+            results = in_process(sheet, os.path.join(tmp, 'in_process_snapshots'), args.sessions,
+                                 args.duration, args.ttl, args.think)
+            print(f"In-process, {args.sessions} sessions, sheet answers after {args.sheet_delay:.1f} s:")
+            for name, (requests, latencies) in results.items():
+                print(f"  {name:<28} sheet requests {requests:>6}  deck p50 {percentile(latencies, 50) * 1000:>8.2f} ms"
+                      f"  p99 {percentile(latencies, 99) * 1000:>8.2f} ms")
+
+            before = sheet.requests
+            env = dict(os.environ, **bench_env(sheet.url, os.path.join(tmp, 'user_data.json')))
+            server, port = start_streamlit(args.script, env, tmp)
+            try:
+                wait_for_streamlit(port)
+                latencies, elapsed = asyncio.run(end_to_end(port, args.sessions, args.user, args.rounds))
+            finally:
+                server.terminate()
+                server.wait()
+            print(f"End to end, {args.sessions} browser sessions x (login + {args.rounds} questions), cold server:")
+            print(f"  sheet requests {sheet.requests - before}")
+            print(f"  {summarize('Login / Next click', latencies, elapsed)}")
+
+if __name__ == "__main__":
+    main()
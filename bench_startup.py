@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import write_sample_deck, bench_env, SheetServer
+from bench_click_latency import BrowserSession, start_streamlit, wait_for_streamlit, HERE
+
+# Cold-start profile of the app:
+#   1. import-time breakdown (python -X importtime) of streamlit and the engine modules
+#   2. time to first paint on a cold server: a fresh `streamlit run` with no deck snapshot and a
+#      local stand-in for the sheet that answers after --sheet-delay seconds like a cold Google
+#      fetch. Reports when the first element and the complete login screen arrive, and how long
+#      the quiz takes to appear after the login click.
+#
+# Run with: python bench_startup.py [--sheet-delay 2] [--think 1] [--script other_app.py]
+
+ENGINE_MODULES = ('quiz_core', 'deck_validation', 'deck_snapshots', 'answer_log', 'answer_stats',
+                  'confusion_tracker', 'word_index', 'search_index', 'progress_reconcile', 'shuffle_bag',
+                  'frame_memo', 'progress_store', 'deck_ingest')
+
+
+def import_profile(modules, top=15):
+    """[(cumulative seconds, module)] of the heaviest top-level and second-level imports, in a fresh interpreter."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', "import " + ", ".join(modules)],
+                            cwd=HERE, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        if depth <= 1:
+            rows.append((int(cumulative_us) / 1e6, "  " * depth + name.strip()))
+    total = sum(seconds for seconds, name in rows if not name.startswith(" "))
+    return total, sorted(rows, reverse=True)[:top]
+
+async def cold_start(port, spawned_at, user, think):
+    import websockets
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                                  max_size=None) as websocket:
+        session = BrowserSession(websocket)
+        connected = time.perf_counter()
+        await session.rerun()
+        timings = {
+            'server ready': connected - spawned_at,
+            'first element': session.first_delta_at - connected,
+            'login screen': time.perf_counter() - connected,
+        }
+        await asyncio.sleep(think)
+        clicked = time.perf_counter()
+        await session.click(label=user)
+        timings['quiz after login click'] = time.perf_counter() - clicked
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start profile of the app: import times and time to first paint.")
+    parser.add_argument('--items', type=int, default=2000, help="Rows in the synthetic deck")
+    parser.add_argument('--sheet-delay', type=float, default=2.0, help="Seconds the sheet stand-in waits before answering")
+    parser.add_argument('--think', type=float, default=0.0, help="Seconds between the login screen and the click")
+    parser.add_argument('--user', default="Guest")
+    parser.add_argument('--script', default=os.path.join(HERE, 'app_20250713_pop.py'), help="App to run")
+    args = parser.parse_args()
+
+    total, rows = import_profile(('streamlit',) + ENGINE_MODULES)
+    print(f"Import time, streamlit + engine modules: {total * 1000:.0f} ms")
+    for seconds, name in rows:
+        print(f"  {seconds * 1000:>8.0f} ms  {name}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck_path = write_sample_deck(os.path.join(tmp, 'deck.csv'), n_items=args.items)
+        with SheetServer(deck_path, delay=args.sheet_delay) as sheet:
+            env = dict(os.environ, **bench_env(sheet.url, os.path.join(tmp, 'user_data.json')))
+            spawned_at = time.perf_counter()
+            server, port = start_streamlit(args.script, env, tmp)
+            try:
+                wait_for_streamlit(port)
+                timings = asyncio.run(cold_start(port, spawned_at, args.user, args.think))
+            finally:
+                server.terminate()
+                server.wait()
+
+    print(f"Cold start (sheet answers after {args.sheet_delay:.1f} s, click after {args.think:.1f} s):")
+    for name, seconds in timings.items():
+        print(f"  {name:<24} {seconds * 1000:>8.0f} ms")
+
+if __name__ == "__main__":
+    main()
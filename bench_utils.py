@@ -0,0 +1,111 @@
+import os
+import csv
+import random
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Helpers shared by the bench_*.py scripts (synthetic decks, latency summaries)
+
+def write_sample_deck(path, n_items=2000, n_lektions=12, seed=0):
+    """Write a synthetic deck CSV with the same columns as the Google Sheet."""
+    rng = random.Random(seed)
+    syllables = ["ge", "ver", "be", "ent", "an", "auf", "halt", "steh", "nehm", "fahr", "spiel", "lauf", "ung", "keit", "en", "lich"]
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Lektion', 'Quiz', 'Word', 'Answer'])
+        for i in range(n_items):
+            word = "".join(rng.choice(syllables) for _ in range(3)) + str(i)
+            lektion = f"Lektion {i % n_lektions + 1}"
+            quiz = f"Satz {i}: Ich habe gestern ___ gesagt, dass es {rng.randint(1, 99)} Uhr ist."
+            answer = quiz.replace("___", word)
+            writer.writerow([lektion, quiz, word, answer])
+    return path
+
+def bench_env(deck_path, user_data_path):
+    """Environment that points the app at a local deck and keeps all of its files next to it."""
+    work_dir = os.path.dirname(os.path.abspath(user_data_path))
+    return {
+        'B2_SHEET_URL': deck_path,
+        'B2_USER_DATA_FILE': user_data_path,
+        'B2_SNAPSHOT_DIR': os.path.join(work_dir, 'deck_snapshots'),
+        'B2_ANSWER_LOG_DIR': os.path.join(work_dir, 'answer_log'),
+    }
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+def summarize(name, latencies, elapsed):
+    """One report line: requests/second and p50/p99 latency in milliseconds."""
+    rps = len(latencies) / elapsed if elapsed else 0.0
+    return (f"{name:<28} {len(latencies):>7} req  {rps:>9.1f} req/s  "
+            f"p50 {percentile(latencies, 50) * 1000:>8.2f} ms  p99 {percentile(latencies, 99) * 1000:>8.2f} ms")
+
+class Timer:
+    """Context manager that appends the elapsed wall time to a list."""
+    def __init__(self, sink):
+        self.sink = sink
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.sink.append(time.perf_counter() - self.start)
+        return False
+
+
+class SheetServer:
+    """
+    Local stand-in for the Google Sheet CSV export: serves one file over HTTP, counts the
+    requests and can answer slowly (delay seconds) like a cold Google fetch, and send the body
+    at rate bytes per second like a slow link (None: as fast as possible).
+    """
+    def __init__(self, path, delay=0.0, rate=None):
+        self.path = path
+        self.delay = delay
+        self.rate = rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        sheet = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with sheet._lock:
+                    sheet.requests += 1
+                time.sleep(sheet.delay)
+                with open(sheet.path, 'rb') as f:
+                    body = f.read()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if not sheet.rate:
+                    self.wfile.write(body)
+                    return
+                piece = max(1, int(sheet.rate / 20))
+                for start in range(0, len(body), piece):
+                    self.wfile.write(body[start:start + piece])
+                    time.sleep(piece / sheet.rate)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/export?format=csv"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="sheet-server", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
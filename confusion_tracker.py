@@ -0,0 +1,90 @@
+import os
+import json
+
+from quiz_core import FileLock, atomic_write
+
+# Which wrong words a learner picks for each correct word, used to choose distractors.
+# Every correct word keeps at most TOP_K wrong words (Space-Saving: when a new wrong word
+# arrives and the slot list is full, it replaces the least-picked one and inherits its count),
+# so memory stays bounded by deck size * TOP_K and an update costs O(TOP_K) = O(1).
+# Several sessions (browser tabs, the API) can hold a tracker for the same user: a save replays
+# the picks recorded since the last save onto what is stored, under a lock file, so none of
+# them overwrites the others' counts.
+
+CONFUSION_FILE = os.environ.get("B2_CONFUSION_FILE", 'confusion_data.json')
+TOP_K = 8
+
+
+class ConfusionTracker:
+    """
+    Sparse correct word -> {chosen wrong word: count} map with top-k entries per word. With
+    saved=True it also keeps the picks recorded since the last save_confusions.
+    """
+    def __init__(self, counts=None, top_k=TOP_K, saved=False):
+        self.top_k = top_k
+        self.counts = {word: dict(wrong) for word, wrong in (counts or {}).items()}
+        self._unsaved = [] if saved else None
+
+    def record(self, correct_word, chosen_word):
+        """Count one wrong pick of chosen_word when correct_word was the answer."""
+        if chosen_word is None or chosen_word == correct_word:
+            return
+        if self._unsaved is not None:
+            self._unsaved.append((correct_word, chosen_word))
+        wrong = self.counts.setdefault(correct_word, {})
+        if chosen_word in wrong:
+            wrong[chosen_word] += 1
+        elif len(wrong) < self.top_k:
+            wrong[chosen_word] = 1
+        else:
+            evicted = min(wrong, key=wrong.get)
+            wrong[chosen_word] = wrong.pop(evicted) + 1
+
+    def top(self, correct_word, n):
+        """The n words most often picked instead of correct_word, most confused first."""
+        wrong = self.counts.get(correct_word)
+        if not wrong:
+            return []
+        return sorted(wrong, key=wrong.get, reverse=True)[:n]
+
+    def to_dict(self):
+        return self.counts
+
+
+def load_confusions(username, path=CONFUSION_FILE):
+    """The saved tracker for one user (empty if there is none)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return ConfusionTracker(json.load(f).get(username), saved=True)
+    except (OSError, ValueError):
+        return ConfusionTracker(saved=True)
+
+def save_confusions(username, tracker, path=CONFUSION_FILE):
+    """
+    Add the picks tracker (from load_confusions) recorded since its last save to the user's
+    stored counts, and give tracker the merged counts, so other sessions' picks show up too.
+    Written atomically under <path>.lock. A file that exists but can't be parsed is left alone
+    and the picks stay unsaved; returns False then.
+    """
+    pending = len(tracker._unsaved) # Picks recorded while this runs are left for the next save
+    with FileLock(path + ".lock"):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except (OSError, ValueError):
+            return False
+        stored = ConfusionTracker(data.get(username), tracker.top_k)
+        for correct_word, chosen_word in tracker._unsaved[:pending]:
+            stored.record(correct_word, chosen_word)
+        data[username] = stored.to_dict()
+        def write(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        atomic_write(path, write)
+    for correct_word, chosen_word in tracker._unsaved[pending:]:
+        stored.record(correct_word, chosen_word)
+    tracker.counts = stored.counts
+    del tracker._unsaved[:pending]
+    return True
@@ -0,0 +1,164 @@
+import os
+import time
+
+import pandas as pd
+
+from deck_validation import REQUIRED_COLUMNS, validate_deck
+from quiz_core import SheetStream, add_progress_columns, open_sheet
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError: # Chunks come from pandas' C parser instead
+    pa = pa_csv = None
+ARROW_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError) if pa is not None else ()
+
+# Streaming ingestion for very large decks (community decks with hundreds of thousands of
+# sentences), an alternative to quiz_core.read_deck chosen with B2_DECK_INGEST=stream:
+#   - the sheet is parsed while it downloads, CHUNK_BYTES at a time, by pyarrow's multithreaded
+#     CSV reader (pandas' read_csv(chunksize=CHUNK_ROWS) without pyarrow); every column is
+#     read as text, so no chunk can disagree with another about a column's type
+#   - the CSV bytes are hashed as they are read, like read_deck does, so both paths give the
+#     same deck_version for the same sheet and replicas on either setting agree
+#   - with on_partial, each chunk gets its Unique_IDs and loses its blank and duplicate rows as
+#     it arrives, and the deck so far is published after PARTIAL_ROWS rows, then whenever it
+#     has doubled, so quizzing can start before the load finishes (deck_snapshots.DeckSource
+#     serves it on a cold start)
+#   - columns are read as text, then typed the way pd.read_csv would have typed them
+#     (read_csv_types: Lektion 3 rather than "3"), so a deck_version always names the same frame
+#   - the complete deck goes through the same validation as read_deck
+
+DECK_INGEST = os.environ.get("B2_DECK_INGEST", "whole") # whole: quiz_core.read_deck, stream: read_deck_streaming
+CHUNK_BYTES = 1 << 20   # CSV bytes pyarrow parses per block
+CHUNK_ROWS = 20000      # Rows per chunk with the pandas fallback
+PARTIAL_ROWS = 20000    # Rows in the first partial deck
+
+
+def _arrow_chunks(stream):
+    text = {column: pa.string() for column in stream.header()}
+    reader = pa_csv.open_csv(
+        stream,
+        read_options=pa_csv.ReadOptions(block_size=CHUNK_BYTES, use_threads=True),
+        convert_options=pa_csv.ConvertOptions(column_types=text, strings_can_be_null=True),
+    )
+    start = 0
+    for batch in reader:
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+def _pandas_chunks(stream):
+    with pd.read_csv(stream, chunksize=CHUNK_ROWS, dtype='str') as reader:
+        yield from reader
+
+def iter_raw_chunks(stream, engine=None):
+    """The sheet in a SheetStream as DataFrames of consecutive rows, all text; the index continues from chunk to chunk."""
+    engine = engine or ('pyarrow' if pa_csv is not None else 'pandas')
+    chunks = _arrow_chunks(stream) if engine == 'pyarrow' else _pandas_chunks(stream)
+    for chunk in chunks:
+        if len(chunk):
+            yield chunk
+
+def read_csv_types(df):
+    """
+    df with its text columns typed as pd.read_csv (read_deck) would have parsed them: all-numeric
+    columns int64 (float64 if some are missing), all-boolean ones bool. A shallow copy; columns
+    left as text are shared.
+    """
+    typed = df.copy(deep=False)
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values): # Already typed (e.g. the progress columns)
+            continue
+        try:
+            typed[column] = pd.to_numeric(values) # Raises at the first value that isn't a number
+            continue
+        except (ValueError, TypeError):
+            pass
+        if values.notna().all() and str(values.iat[0]).lower() in ('true', 'false'):
+            lowered = values.str.lower()
+            if lowered.isin(['true', 'false']).all():
+                typed[column] = lowered.eq('true')
+    return typed
+
+def _clean_chunk(raw, ids, seen_ids):
+    """Rows of raw that validate_deck would keep (not blank, first of their Quiz::Word pair)."""
+    text = raw[REQUIRED_COLUMNS]
+    blank = (text.isna() | text.apply(lambda column: column.str.strip().eq(''))).any(axis=1)
+    duplicated = []
+    for unique_id in ids.tolist(): # One pass; isin() would copy the whole seen set per chunk
+        duplicated.append(unique_id in seen_ids)
+        seen_ids.add(unique_id)
+    keep = ~(blank | pd.Series(duplicated, index=ids.index))
+    clean = raw[keep].copy()
+    clean['Unique_ID'] = ids[keep]
+    return add_progress_columns(clean)
+
+def _partial_deck(text, digest, started):
+    df = read_csv_types(text) # Typed from the rows so far
+    df.attrs['partial'] = True
+    df.attrs['deck_version'] = "partial-" + digest.hexdigest()[:8] # Sheet content so far
+    df.attrs['load_metrics'] = {'rows': len(df), 'fetch_seconds': time.perf_counter() - started}
+    return df
+
+def read_deck_streaming(url, on_partial=None, engine=None, partial_rows=PARTIAL_ROWS):
+    """
+    Like quiz_core.read_deck (same columns, attrs and validation), parsed chunk by chunk.
+    on_partial(df) gets the clean deck so far as it grows; those frames have attrs['partial']
+    and a deck_version of their own. Falls back to the pandas engine if pyarrow can't parse the
+    sheet; partial decks published before that only ever grow. Raises on failure.
+    """
+    started = time.perf_counter()
+    engine = engine or ('pyarrow' if pa_csv is not None else 'pandas')
+    raw_chunks, clean_chunks = [], []
+    seen_ids = set()
+    next_partial = partial_rows
+    first_partial_seconds = None
+    try:
+        with SheetStream(open_sheet(url)) as stream:
+            digest = stream.digest
+            for raw in iter_raw_chunks(stream, engine):
+                if not raw_chunks:
+                    missing = [column for column in REQUIRED_COLUMNS if column not in raw.columns]
+                    if missing:
+                        raise ValueError(f"The sheet has no {', '.join(missing)} column")
+                raw_chunks.append(raw)
+                if on_partial is not None:
+                    clean_chunks.append(_clean_chunk(raw, raw['Quiz'] + "::" + raw['Word'], seen_ids))
+                    if raw.index[-1] + 1 >= next_partial:
+                        clean_chunks = [pd.concat(clean_chunks)] # Still text; don't hold the pieces twice
+                        on_partial(_partial_deck(clean_chunks[0], digest, started))
+                        if first_partial_seconds is None:
+                            first_partial_seconds = time.perf_counter() - started
+                        next_partial = 2 * (raw.index[-1] + 1)
+            stream.read() # Whatever the parser left (normally nothing), so the hash covers the whole file
+    except ARROW_ERRORS:
+        if engine != 'pyarrow':
+            raise
+        # Re-read with pandas; only publish partials bigger than the ones already served
+        return read_deck_streaming(url, on_partial, 'pandas', next_partial)
+    if not raw_chunks:
+        raise ValueError("The sheet is empty")
+    fetched = time.perf_counter()
+
+    chunks = len(raw_chunks)
+    raw = read_csv_types(pd.concat(raw_chunks) if chunks > 1 else raw_chunks[0])
+    del raw_chunks[:], clean_chunks # Only raw holds the sheet from here on
+    df, validation, validation_cached = validate_deck(raw, key=digest.hexdigest())
+    validated = time.perf_counter()
+    df['Unique_ID'] = df['Quiz'] + "::" + df['Word']
+    add_progress_columns(df)
+    df.attrs['deck_version'] = validation['sheet_hash'][:16]
+    df.attrs['validation'] = validation
+    df.attrs['load_metrics'] = {
+        'rows': len(df),
+        'fetch_seconds': fetched - started,
+        'validation_seconds': validated - fetched,
+        'validation_cached': validation_cached,
+        'process_seconds': time.perf_counter() - validated,
+        'first_partial_seconds': first_partial_seconds,
+        'chunks': chunks,
+        'engine': engine,
+    }
+    return df
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+import pandas as pd
+
+from quiz_core import FileLock, atomic_write
+from metrics import DECK_REQUESTS, DECK_LOADS, DECK_FETCH_ERRORS, observe_deck_load
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError: # Snapshots fall back to pickle
+    pa = ipc = None
+ARROW_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) if pa is not None else ()
+
+# Offline-first deck loading. Every processed deck is stored under its content hash
+# (df.attrs['deck_version'] from read_deck):
+#
+#   deck_snapshots/<hash of sheet URL>/<deck version>.arrow  (or .pkl without pyarrow)
+#   deck_snapshots/<hash of sheet URL>/LATEST                -> {"version": ..., "saved_at": ...}
+#   deck_snapshots/<hash of sheet URL>/fetch.lock
+#
+# DeckSource serves the newest snapshot right away and swaps in the sheet's current version
+# when a background fetch finishes. Progress is keyed by Unique_ID, so it carries over
+# between versions.
+#
+# Several server processes can share one snapshot directory. Arrow snapshots are memory-mapped
+# read-only and converted to pandas without copying the string columns, so every worker serves
+# the same page-cache copy of the deck. Only one process at a time fetches the sheet (fetch.lock);
+# the others adopt what it published when LATEST (replaced atomically) changes.
+#
+# With partial_decks, a cold start (no deck, no snapshot) doesn't wait for the whole sheet:
+# fetch gets an on_partial callback (deck_ingest.read_deck_streaming) and current() returns the
+# first partial deck it publishes. Partial decks are never reconciled or saved as snapshots.
+
+SNAPSHOT_DIR = os.environ.get("B2_SNAPSHOT_DIR", 'deck_snapshots')
+SNAPSHOT_FORMAT = os.environ.get("B2_SNAPSHOT_FORMAT", 'arrow' if pa is not None else 'pickle')
+KEEP_SNAPSHOTS = 5 # Older versions of the same sheet are deleted
+DECK_TTL = int(os.environ.get("B2_DECK_TTL", 600)) # Seconds before a loaded deck is revalidated
+POINTER_CHECK_SECONDS = 5 # How often DeckSource looks for a deck another process published
+ATTRS_KEY = b'b2_attrs' # Arrow schema metadata holding df.attrs as JSON
+EXTENSIONS = {'arrow': '.arrow', 'pickle': '.pkl'}
+
+
+def _sheet_dir(url, snapshot_dir):
+    return os.path.join(snapshot_dir, hashlib.sha1(url.encode('utf-8')).hexdigest()[:16])
+
+def _json_default(value):
+    return value.item() if hasattr(value, 'item') else str(value)
+
+def _write_arrow(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    metadata = dict(table.schema.metadata or {})
+    metadata[ATTRS_KEY] = json.dumps(df.attrs, default=_json_default).encode('utf-8')
+    table = table.replace_schema_metadata(metadata)
+    with ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table)
+
+def read_arrow_snapshot(path):
+    """A deck from an Arrow snapshot, memory-mapped: string columns stay in the (shared) page cache."""
+    table = ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    attrs = json.loads(table.schema.metadata.get(ATTRS_KEY, b'{}'))
+    df = table.to_pandas()
+    df.attrs.update(attrs)
+    return df
+
+def save_snapshot(df, url, snapshot_dir=SNAPSHOT_DIR, fmt=SNAPSHOT_FORMAT):
+    """Store the deck under its version (if not already there) and point LATEST at it."""
+    version = df.attrs['deck_version']
+    sheet_dir = _sheet_dir(url, snapshot_dir)
+    os.makedirs(sheet_dir, exist_ok=True)
+    if fmt == 'arrow' and pa is None:
+        fmt = 'pickle'
+    path = os.path.join(sheet_dir, version + EXTENSIONS[fmt])
+    if fmt == 'arrow' and not os.path.exists(path):
+        try:
+            atomic_write(path, lambda tmp_path: _write_arrow(df, tmp_path))
+        except ARROW_ERRORS: # A column Arrow can't represent (e.g. mixed types): keep a pickle
+            fmt = 'pickle'
+            path = os.path.join(sheet_dir, version + EXTENSIONS[fmt])
+    if fmt == 'pickle' and not os.path.exists(path):
+        atomic_write(path, df.to_pickle)
+
+    def write_pointer(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'format': fmt, 'url': url, 'saved_at': time.time()}, f)
+    atomic_write(os.path.join(sheet_dir, 'LATEST'), write_pointer)
+
+    prune_snapshots(url, snapshot_dir, keep_version=version)
+    return version
+
+def read_pointer(url, snapshot_dir=SNAPSHOT_DIR):
+    """The LATEST pointer of this sheet ({"version", "format", "saved_at", ...}), or None."""
+    try:
+        with open(os.path.join(_sheet_dir(url, snapshot_dir), 'LATEST'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_snapshot(url, pointer, snapshot_dir=SNAPSHOT_DIR):
+    """The deck a pointer refers to, or None if it can't be read."""
+    try:
+        fmt = pointer.get('format', 'pickle') # Pointers written before Arrow snapshots have no format
+        path = os.path.join(_sheet_dir(url, snapshot_dir), pointer['version'] + EXTENSIONS[fmt])
+        if fmt == 'arrow':
+            return read_arrow_snapshot(path) if pa is not None else None
+        return pd.read_pickle(path)
+    except (OSError, ValueError, KeyError, EOFError, TypeError, AttributeError):
+        return None
+
+def load_latest_snapshot(url, snapshot_dir=SNAPSHOT_DIR):
+    """The deck LATEST points to, or None if there is no usable snapshot."""
+    pointer = read_pointer(url, snapshot_dir)
+    return load_snapshot(url, pointer, snapshot_dir) if pointer else None
+
+def prune_snapshots(url, snapshot_dir=SNAPSHOT_DIR, keep_version=None, keep=KEEP_SNAPSHOTS):
+    """Delete all but the newest `keep` snapshots of this sheet (never keep_version)."""
+    sheet_dir = _sheet_dir(url, snapshot_dir)
+    snapshots = sorted(
+        (entry for entry in os.scandir(sheet_dir) if entry.name.endswith(tuple(EXTENSIONS.values()))),
+        key=lambda entry: entry.stat().st_mtime, reverse=True,
+    )
+    for entry in snapshots[keep:]:
+        if os.path.splitext(entry.name)[0] != keep_version:
+            try:
+                os.remove(entry.path) # Processes that still map it keep their copy until they let go
+            except OSError:
+                pass
+
+
+class _Flight:
+    """One fetch in progress; callers that arrive while it runs wait for its result."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.ready = threading.Event() # Set by the first partial deck, or when done
+        self.updated = False
+
+
+class DeckSource:
+    """
+    Process-wide source of one sheet's deck. current() answers from memory (starting from
+    the newest snapshot) and starts a background fetch when the deck is older than ttl
+    (stale-while-revalidate). Only blocks when there is neither a loaded deck nor a snapshot.
+    Fetches are single-flight: however many sessions ask at once, the sheet is downloaded
+    once and everyone waiting gets that result; across processes sharing snapshot_dir, a deck
+    another process published less than ttl ago is adopted instead of fetched. reconcile(new_df,
+    previous_df) is called before a new deck version is swapped in (e.g. to migrate progress of renamed rows).
+    With partial_decks, fetch is called as fetch(url, on_partial=...) and a cold start serves
+    the deck loaded so far (df.attrs['partial']) until the whole sheet is in.
+    """
+    def __init__(self, url, fetch, snapshot_dir=SNAPSHOT_DIR, ttl=DECK_TTL, retry_after=30, reconcile=None,
+                 partial_decks=False):
+        self.url = url
+        self.fetch = fetch
+        self.partial_decks = partial_decks
+        self.reconcile = reconcile
+        self.last_reconcile = None
+        self.snapshot_dir = snapshot_dir
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.last_error = None
+        self.fetch_count = 0 # Sheet downloads made by this source
+        self._lock = threading.Lock()
+        self._flight = None # _Flight of the fetch in progress
+        self._next_fetch_at = 0.0 # time.monotonic() after which current() refreshes again
+        self._next_pointer_check = 0.0
+        self._pointer_mtime = self._stat_pointer()
+        self._df = load_latest_snapshot(url, snapshot_dir)
+        self.from_snapshot = self._df is not None
+
+    def current(self):
+        """The newest deck available right now (None only if nothing could be loaded)."""
+        if self._df is None:
+            DECK_REQUESTS.labels('miss').inc()
+            if self.partial_decks:
+                self.refresh_in_background().ready.wait()
+            else:
+                self.refresh()
+        elif time.monotonic() >= self._next_fetch_at or self._pointer_moved():
+            DECK_REQUESTS.labels('stale').inc()
+            self.refresh_in_background()
+        else:
+            DECK_REQUESTS.labels('hit').inc()
+        return self._df
+
+    def version(self):
+        """deck_version of the deck current() returns."""
+        return self._df.attrs.get('deck_version') if self._df is not None else None
+
+    def refresh(self):
+        """
+        Fetch the sheet now, or wait for the fetch already in progress; keeps the current deck
+        if the fetch fails. Returns True if the deck was updated.
+        """
+        flight, leader = self._join_flight()
+        if leader:
+            self._fly(flight)
+        else:
+            flight.done.wait()
+        return flight.updated
+
+    def refresh_in_background(self):
+        """Start a fetch in a daemon thread unless one is already in progress; returns its _Flight."""
+        flight, leader = self._join_flight()
+        if leader:
+            threading.Thread(target=self._fly, args=(flight,), name="deck-refresh", daemon=True).start()
+        return flight
+
+    def _join_flight(self):
+        """(the fetch in progress, False), or (a new one, True) if the caller has to run it."""
+        with self._lock:
+            if self._flight is not None:
+                return self._flight, False
+            self._flight = _Flight()
+            return self._flight, True
+
+    def _fly(self, flight):
+        try:
+            flight.updated = self._fetch()
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.ready.set()
+            flight.done.set()
+
+    def _stat_pointer(self):
+        try:
+            return os.stat(os.path.join(_sheet_dir(self.url, self.snapshot_dir), 'LATEST')).st_mtime_ns
+        except OSError:
+            return None
+
+    def _pointer_moved(self):
+        """True if LATEST changed since this source last looked (checked every POINTER_CHECK_SECONDS)."""
+        now = time.monotonic()
+        if now < self._next_pointer_check:
+            return False
+        self._next_pointer_check = now + POINTER_CHECK_SECONDS
+        return self._stat_pointer() != self._pointer_mtime
+
+    def _fetch(self):
+        with FileLock(os.path.join(_sheet_dir(self.url, self.snapshot_dir), 'fetch.lock')): # Another process may be fetching right now
+            self._pointer_mtime = self._stat_pointer()
+            pointer = read_pointer(self.url, self.snapshot_dir)
+            age = time.time() - pointer.get('saved_at', 0) if pointer else None
+            if age is not None and age < self.ttl: # Published by another process (or a restart) within ttl
+                if pointer['version'] == self.version():
+                    with self._lock:
+                        self._next_fetch_at = time.monotonic() + self.ttl - age
+                        self.from_snapshot = False
+                    return False
+                df = load_snapshot(self.url, pointer, self.snapshot_dir)
+                if df is not None:
+                    DECK_LOADS.labels('snapshot').inc()
+                    self._serve(df, self.ttl - age, self._reconcile(df))
+                    return True
+
+            self.fetch_count += 1
+            try:
+                if self.partial_decks:
+                    df = self.fetch(self.url, on_partial=self._publish_partial)
+                else:
+                    df = self.fetch(self.url)
+            except Exception as e:
+                DECK_FETCH_ERRORS.inc()
+                self.last_error = e
+                self._next_fetch_at = time.monotonic() + self.retry_after
+                return False
+            DECK_LOADS.labels('sheet').inc()
+            observe_deck_load(df)
+            reconcile_error = self._reconcile(df) # Before publishing, so adopters find the file migrated
+            try:
+                save_snapshot(df, self.url, self.snapshot_dir)
+                self._pointer_mtime = self._stat_pointer()
+                pointer = read_pointer(self.url, self.snapshot_dir)
+                if pointer and pointer.get('format') == 'arrow': # Serve the mapped copy every other process maps too
+                    mapped = load_snapshot(self.url, pointer, self.snapshot_dir)
+                    if mapped is not None:
+                        df = mapped
+            except OSError as e: # A read-only disk shouldn't stop the app
+                reconcile_error = reconcile_error or e
+            self._serve(df, self.ttl, reconcile_error)
+            return True
+
+    def _reconcile(self, df):
+        """Calls the reconcile hook if df is a new version; returns its error, if any."""
+        previous = self._df
+        if previous is not None and previous.attrs.get('partial'): # Rows still missing from it aren't gone
+            previous = None
+        if self.reconcile is not None and (previous is None or previous.attrs.get('deck_version') != df.attrs.get('deck_version')):
+            try:
+                self.last_reconcile = self.reconcile(df, previous)
+            except Exception as e: # Progress stays as it was; the new deck is still served
+                return e
+        return None
+
+    def _serve(self, df, fresh_for, error=None):
+        with self._lock:
+            self._df = df
+            self._next_fetch_at = time.monotonic() + fresh_for
+            self.from_snapshot = False
+            self.last_error = error
+
+    def _publish_partial(self, df):
+        """Serves a deck that is still loading, unless a complete one is already being served."""
+        with self._lock:
+            if self._df is None or self._df.attrs.get('partial'):
+                self._df = df
+            if self._flight is not None:
+                self._flight.ready.set()
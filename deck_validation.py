@@ -0,0 +1,127 @@
+import re
+import hashlib
+import difflib
+from collections import OrderedDict
+
+import pandas as pd
+
+# One-pass checks on the raw sheet, run at load time (never per request):
+#   blank rows      - Quiz / Word / Answer / Lektion missing or whitespace-only (dropped)
+#   duplicates      - repeated Quiz::Word pairs, which would share one Unique_ID (later copies dropped)
+#   word_not_in_quiz - Word missing from its Quiz sentence (or from Answer when Quiz has a ___ gap)
+#   lektion_typos   - Lektion spellings that look like a variant of another Lektion
+# Results are cached per sheet content hash, so reloading an unchanged sheet skips the checks.
+
+REQUIRED_COLUMNS = ['Quiz', 'Word', 'Answer', 'Lektion']
+MAX_EXAMPLES = 50    # Examples kept per issue type (counts are always complete)
+CACHE_SIZE = 8       # Sheet versions whose validation results are kept
+
+GAP_PATTERN = re.compile(r"_{2,}|\.{3}|…")
+
+_validation_cache = OrderedDict() # content hash -> (keep mask, report)
+
+
+def content_hash(df):
+    """Hash of the raw sheet (columns, index and values)."""
+    digest = hashlib.sha1("\x1f".join(map(str, df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def _sheet_row(index_label):
+    # Row number as shown in Google Sheets (row 1 is the header)
+    return int(index_label) + 2
+
+def _lektion_typos(lektion):
+    """Lektion values that are a spelling variant of a more frequent one."""
+    counts = lektion.astype(str).value_counts()
+    typos = []
+    canonical = {} # normalized spelling -> most frequent raw spelling
+    for value, count in counts.items():
+        key = re.sub(r"[\s\W_]+", "", value).casefold()
+        if key in canonical:
+            typos.append({'value': value, 'suggestion': canonical[key], 'count': int(count)})
+        else:
+            canonical[key] = value
+
+    # Same number, near-identical wording (e.g. "Lekiton 3" vs "Lektion 3")
+    seen = {}
+    for key, value in canonical.items():
+        digits = re.sub(r"\D", "", key)
+        letters = re.sub(r"\d", "", key)
+        for other_letters, other_value in seen.get(digits, []):
+            if letters != other_letters and difflib.SequenceMatcher(None, letters, other_letters).ratio() >= 0.8:
+                typos.append({'value': value, 'suggestion': other_value, 'count': int(counts[value])})
+                break
+        else:
+            seen.setdefault(digits, []).append((letters, value))
+    return typos
+
+def _run_checks(df, key):
+    as_text = df[REQUIRED_COLUMNS].astype('string')
+    blank = as_text.isna() | as_text.apply(lambda column: column.str.strip().eq(''))
+    blank_rows = blank.any(axis=1)
+
+    duplicated = df.duplicated(subset=['Quiz', 'Word'], keep='first') & ~blank_rows
+    keep = ~(blank_rows | duplicated)
+
+    kept = as_text[keep]
+    quiz = kept['Quiz'].str.casefold()
+    answer = kept['Answer'].str.casefold()
+    word = kept['Word'].str.strip().str.casefold()
+    has_gap = kept['Quiz'].str.contains(GAP_PATTERN)
+    word_found = [(w in a) if gap else (w in q)
+                  for w, q, a, gap in zip(word.tolist(), quiz.tolist(), answer.tolist(), has_gap.tolist())]
+    word_missing = ~pd.Series(word_found, index=kept.index, dtype=bool)
+
+    first_row = None
+    if duplicated.any():
+        # Index label of the first row of each Quiz::Word pair
+        first_row = df.index.to_series().groupby([df['Quiz'], df['Word']], sort=False).transform('first')
+
+    report = {
+        'sheet_hash': key,
+        'rows_read': int(len(df)),
+        'rows_kept': int(keep.sum()),
+        'blank_rows': [
+            {'row': _sheet_row(i), 'columns': [c for c in REQUIRED_COLUMNS if blank.at[i, c]]}
+            for i in blank.index[blank_rows][:MAX_EXAMPLES]
+        ],
+        'blank_count': int(blank_rows.sum()),
+        'duplicates': [
+            {'row': _sheet_row(i), 'first_row': _sheet_row(first_row.at[i]),
+             'Unique_ID': f"{df.at[i, 'Quiz']}::{df.at[i, 'Word']}"}
+            for i in df.index[duplicated][:MAX_EXAMPLES]
+        ],
+        'duplicate_count': int(duplicated.sum()),
+        'word_not_in_quiz': [
+            {'row': _sheet_row(i), 'Word': kept.at[i, 'Word']}
+            for i in kept.index[word_missing.to_numpy()][:MAX_EXAMPLES]
+        ],
+        'word_not_in_quiz_count': int(word_missing.sum()),
+        'lektion_typos': _lektion_typos(kept['Lektion']),
+    }
+    return keep.to_numpy(), report
+
+def validate_deck(df, key=None):
+    """
+    Validates the raw sheet and drops blank and duplicate rows.
+    Returns (clean_df, report, cached) where cached tells whether the checks were skipped
+    because this exact sheet content was validated before. key identifies the sheet content
+    (read_deck passes the hash of the CSV bytes); content_hash(df) if not given.
+    """
+    key = key or content_hash(df)
+    cached = key in _validation_cache
+    if cached:
+        _validation_cache.move_to_end(key)
+        keep, report = _validation_cache[key]
+    else:
+        keep, report = _run_checks(df, key)
+        _validation_cache[key] = (keep, report)
+        while len(_validation_cache) > CACHE_SIZE:
+            _validation_cache.popitem(last=False)
+    return df[keep].copy(), report, cached
+
+def issue_count(report):
+    """Total number of problems in a validation report."""
+    return (report['blank_count'] + report['duplicate_count'] + report['word_not_in_quiz_count']
+            + len(report['lektion_typos']))
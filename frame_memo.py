@@ -0,0 +1,133 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Process-wide LRU memo of the merged deck + progress frames (merge_progress output) the app
+# builds for each user. An entry is keyed by (user, deck version, progress version); the
+# progress version is a per-user counter bumped on every progress write this process makes and
+# whenever the progress file changes under it (the API, an import or a reconcile). A rerun
+# where neither the deck nor the user's progress changed gets the frame without re-reading
+# user_data.json or merging. Only the newest progress version of a (user, deck) is kept;
+# entries beyond max_entries (least recently used first) or idle for max_idle seconds are dropped.
+
+MAX_ENTRIES = 32
+MAX_IDLE_SECONDS = 30 * 60
+
+
+def frame_bytes(value):
+    """Memory of a memoized value: the DataFrame itself, or the first DataFrame of a tuple."""
+    frame = value[0] if isinstance(value, tuple) else value
+    return int(frame.memory_usage(deep=True, index=True).sum())
+
+
+class FrameMemo:
+    """Bounded LRU memo with per-user progress versions, idle eviction and hit counters."""
+    def __init__(self, max_entries=MAX_ENTRIES, max_idle=MAX_IDLE_SECONDS):
+        self.max_entries = max_entries
+        self.max_idle = max_idle
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # (user, deck version, progress version) -> entry dict, oldest first
+        self._versions = {}           # user -> (progress version, last seen source signature)
+        self._lock = threading.Lock()
+
+    # --- Progress versions ---
+
+    def progress_version(self, user, signature=None):
+        """
+        The user's current progress version. signature identifies the stored progress (e.g. the
+        progress file's mtime and size); a signature different from the last one seen bumps the version.
+        """
+        with self._lock:
+            version, seen = self._versions.get(user, (0, signature))
+            if signature != seen:
+                version += 1
+            self._versions[user] = (version, signature)
+            return version
+
+    def bump(self, user):
+        """Progress of user changed: entries for the old version won't be served again."""
+        with self._lock:
+            version, seen = self._versions.get(user, (0, None))
+            self._versions[user] = (version + 1, seen)
+
+    def acknowledge(self, user, signature):
+        """Record a write whose result the current version's entry already reflects (no bump)."""
+        with self._lock:
+            version, _ = self._versions.get(user, (0, signature))
+            self._versions[user] = (version, signature)
+
+    # --- Memo ---
+
+    def get(self, key, build):
+        """Memoized value for key = (user, deck version, progress version); build() makes it on a miss."""
+        value = self.lookup(key)
+        return value if value is not None else self.put(key, build())
+
+    def lookup(self, key):
+        """The memoized value for key, counted as a hit, or None, counted as a miss (put() the built value)."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry['last_used'] = now
+            entry['hits'] += 1
+            self.hits += 1
+            return entry['value']
+
+    def put(self, key, value):
+        """Stores value for key, replacing older progress versions of the same user and deck; returns value."""
+        now = time.monotonic()
+        nbytes = frame_bytes(value)
+        with self._lock:
+            for stale in [k for k in self._entries if k[:2] == key[:2] and k != key]:
+                del self._entries[stale] # An older progress version of the same user and deck
+            self._entries[key] = {'value': value, 'bytes': nbytes, 'hits': 0,
+                                  'created': now, 'last_used': now}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def peek(self, key):
+        """The memoized value for key, or None; not counted as a lookup (e.g. to update it in place)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry['value'] if entry is not None else None
+
+    def _evict_idle(self, now):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry['last_used'] < self.max_idle:
+                break
+            del self._entries[key]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit rate, evictions and memory, in total and per entry (most recently used first)."""
+        now = time.monotonic()
+        with self._lock:
+            entries = [{
+                'user': user, 'deck_version': deck_ver, 'progress_version': progress_ver,
+                'bytes': entry['bytes'], 'hits': entry['hits'], 'idle_seconds': now - entry['last_used'],
+            } for (user, deck_ver, progress_ver), entry in reversed(self._entries.items())]
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(entries),
+                'bytes': sum(entry['bytes'] for entry in entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'per_entry': entries,
+            }
@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import threading
+
+# Pure-Python stand-in for the Redis subset the "kv" progress store (progress_store.KvProgressStore)
+# uses, so several app / API replicas can share progress without installing Redis. Speaks RESP
+# on asyncio streams: commands from one connection run in order and nothing runs between two
+# of them, so every command is atomic and MULTI ... EXEC runs its queue in one go (or not at
+# all, replying nil, if a key WATCHed on that connection was written since). Data lives
+# in memory only; point B2_PROGRESS_STORE at a real Redis for anything that must survive a restart.
+#
+# Run with: python kv_server.py [--port 6379]   then   B2_PROGRESS_STORE=kv:127.0.0.1:6379
+
+
+class KvCommandError(Exception):
+    pass
+
+
+WRONGTYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+WRITES = {'set', 'incr', 'del', 'hset', 'hsetnx', 'hincrby', 'hdel', 'sadd'} # Commands that bump their keys' versions
+
+
+class KvState:
+    """The keyspace: str keys holding bytes (strings), dicts (hashes) or sets, and the commands on it."""
+    def __init__(self):
+        self.data = {}
+        self.commands = 0
+        self.versions = {} # key -> writes so far, for WATCH
+        self.flushes = 0
+
+    def _typed(self, key, kind):
+        value = self.data.get(key)
+        if value is not None and not isinstance(value, kind):
+            raise KvCommandError(WRONGTYPE)
+        return value
+
+    def _hash(self, key, create=False):
+        value = self._typed(key, dict)
+        if value is None:
+            value = {}
+            if create:
+                self.data[key] = value
+        return value
+
+    def execute(self, name, args):
+        """Reply to one command: bytes, int, str (status), list, None or a KvCommandError."""
+        self.commands += 1
+        handler = getattr(self, 'cmd_' + name.lower(), None)
+        if handler is None:
+            return KvCommandError(f"ERR unknown command '{name}'")
+        try:
+            reply = handler(*args)
+        except TypeError:
+            return KvCommandError(f"ERR wrong number of arguments for '{name.lower()}' command")
+        except ValueError:
+            return KvCommandError("ERR value is not an integer or out of range")
+        except KvCommandError as e:
+            return e
+        if name.lower() in WRITES:
+            for key in (args if name.lower() == 'del' else args[:1]):
+                self.versions[key.decode()] = self.versions.get(key.decode(), 0) + 1
+        return reply
+
+    def version(self, key):
+        """Changes whenever key is written (or the keyspace flushed)."""
+        return self.flushes, self.versions.get(key, 0)
+
+    def cmd_ping(self, message=None):
+        return 'PONG' if message is None else message
+
+    def cmd_flushdb(self):
+        self.data.clear()
+        self.flushes += 1
+        return 'OK'
+
+    def cmd_get(self, key):
+        return self._typed(key.decode(), bytes)
+
+    def cmd_set(self, key, value):
+        self.data[key.decode()] = value
+        return 'OK'
+
+    def cmd_incr(self, key):
+        key = key.decode()
+        value = int(self._typed(key, bytes) or b'0') + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    def cmd_del(self, *keys):
+        if not keys:
+            raise TypeError
+        return sum(self.data.pop(key.decode(), None) is not None for key in keys)
+
+    def cmd_hget(self, key, field):
+        return self._hash(key.decode()).get(field)
+
+    def cmd_hmget(self, key, *fields):
+        if not fields:
+            raise TypeError
+        fields_of = self._hash(key.decode())
+        return [fields_of.get(field) for field in fields]
+
+    def cmd_hgetall(self, key):
+        return [item for pair in self._hash(key.decode()).items() for item in pair]
+
+    def cmd_hset(self, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise TypeError
+        fields_of = self._hash(key.decode(), create=True)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in fields_of
+            fields_of[field] = value
+        return added
+
+    def cmd_hdel(self, key, *fields):
+        if not fields:
+            raise TypeError
+        key = key.decode()
+        fields_of = self._hash(key)
+        removed = sum(fields_of.pop(field, None) is not None for field in fields)
+        if not fields_of:
+            self.data.pop(key, None)
+        return removed
+
+    def cmd_hsetnx(self, key, field, value):
+        fields_of = self._hash(key.decode(), create=True)
+        if field in fields_of:
+            return 0
+        fields_of[field] = value
+        return 1
+
+    def cmd_hincrby(self, key, field, amount):
+        fields_of = self._hash(key.decode(), create=True)
+        value = int(fields_of.get(field, b'0')) + int(amount)
+        fields_of[field] = str(value).encode()
+        return value
+
+    def cmd_sadd(self, key, *members):
+        if not members:
+            raise TypeError
+        key = key.decode()
+        value = self._typed(key, set)
+        if value is None:
+            value = self.data[key] = set()
+        before = len(value)
+        value.update(members)
+        return len(value) - before
+
+    def cmd_smembers(self, key):
+        return sorted(self._typed(key.decode(), set) or ())
+
+
+def encode_reply(reply):
+    if isinstance(reply, KvCommandError):
+        return b"-" + str(reply).encode() + b"\r\n"
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, str):
+        return b"+" + reply.encode() + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(encode_reply(item) for item in reply)
+
+
+async def read_command(reader):
+    """[name, arg bytes, ...] of the next RESP command, or None at end of stream."""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.decode().split() # Inline command, e.g. typed into telnet
+    command = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        command.append((await reader.readexactly(length + 2))[:-2])
+    return command
+
+
+class KvServer:
+    """The stand-in server; serve() runs it on the current event loop, start() on a background thread."""
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.state = KvState()
+        self.connections = 0
+        self._writers = set()
+        self._loop = None
+        self._server = None
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        queued = None # Commands between MULTI and EXEC
+        watched = {} # key -> its version at WATCH
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                if not command:
+                    continue
+                name = command[0].decode() if isinstance(command[0], bytes) else command[0]
+                args = [arg if isinstance(arg, bytes) else arg.encode() for arg in command[1:]]
+                upper = name.upper()
+                if upper == 'MULTI':
+                    reply = KvCommandError("ERR MULTI calls can not be nested") if queued is not None else 'OK'
+                    queued = [] if queued is None else queued
+                elif upper == 'EXEC':
+                    if queued is None:
+                        reply = KvCommandError("ERR EXEC without MULTI")
+                    elif any(self.state.version(key) != version for key, version in watched.items()):
+                        reply = None
+                    else:
+                        reply = [self.state.execute(n, a) for n, a in queued]
+                    queued = None
+                    watched = {}
+                elif upper == 'DISCARD':
+                    reply = 'OK' if queued is not None else KvCommandError("ERR DISCARD without MULTI")
+                    queued = None
+                    watched = {}
+                elif upper == 'WATCH' and queued is None:
+                    watched.update((key.decode(), self.state.version(key.decode())) for key in args)
+                    reply = 'OK' if args else KvCommandError("ERR wrong number of arguments for 'watch' command")
+                elif upper == 'UNWATCH':
+                    watched = {}
+                    reply = 'OK'
+                elif queued is not None:
+                    queued.append((name, args))
+                    reply = 'QUEUED'
+                else:
+                    reply = self.state.execute(name, args)
+                writer.write(encode_reply(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def serve(self, ready=None):
+        self._server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self):
+        """Serves on a daemon thread; returns once the port is bound."""
+        ready = threading.Event()
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self.serve(ready))
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._loop.close()
+        self._thread = threading.Thread(target=run, name="kv-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def _close(self):
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+
+    def stop(self):
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._close)
+            self._thread.join(timeout=5)
+
+    @property
+    def location(self):
+        return f"{self.host}:{self.port}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory stand-in for the Redis subset the kv progress store uses.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379, help="0 picks a free port")
+    args = parser.parse_args()
+    server = KvServer(args.host, args.port)
+    async def run():
+        ready = asyncio.Event()
+        serving = asyncio.ensure_future(server.serve(ready))
+        await ready.wait()
+        print(f"KV stand-in listening on {server.location}", flush=True)
+        await serving
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import os
+import time
+import bisect
+import threading
+
+# Process-wide operational metrics, exported in the Prometheus text format by a sidecar HTTP
+# thread (GET /metrics on B2_METRICS_PORT; off when unset) so slowness can be pinned on the sheet
+# fetch, progress I/O or pandas work. Recording is a dict lookup and a locked add (about a
+# microsecond); everything expensive (rendering, memo stats) happens when the endpoint is scraped.
+# Stdlib only, so the app can import it before the engine modules.
+#
+#   b2_deck_load_seconds{stage}                 fetch (download + CSV parse), validate, process
+#   b2_deck_loads_total{source}                 decks loaded from the sheet or adopted from a snapshot
+#   b2_deck_fetch_errors_total                  failed sheet fetches
+#   b2_deck_requests_total{result}              deck lookups: hit, stale (served while revalidating), miss (waited)
+#   b2_progress_read_seconds{backend}           loading a user's progress from the progress store
+#   b2_progress_write_seconds{backend}          update_quiz_progress / batch writes to the progress store
+#   b2_frame_build_seconds{source}              merging deck and progress (pandas) on a frame cache miss
+#   b2_question_select_seconds{source,mode}     picking the next question
+#   b2_answers_total{source,correct}            answers; rate() of it is answers per second
+#   b2_active_sessions{source}                  sessions / users seen in the last ACTIVE_SESSION_SECONDS
+#   b2_frame_memo_*                             FrameMemo hits, misses, evictions, entries and bytes
+#
+# Run with: B2_METRICS_PORT=9108 streamlit run app_20250713_pop.py   then   curl localhost:9108/metrics
+
+METRICS_PORT = int(os.environ.get("B2_METRICS_PORT") or 0)
+METRICS_HOST = os.environ.get("B2_METRICS_HOST", "127.0.0.1")
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ACTIVE_SESSION_SECONDS = 5 * 60
+
+
+def _label_value(value):
+    return ('true' if value else 'false') if isinstance(value, bool) else str(value)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# --- Metric types ---
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # The last one is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager observing the seconds its block took."""
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.target.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Metric:
+    """A named metric family; labels(*values) is the series for those label values."""
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _new(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                series = self._series.setdefault(tuple(_label_value(value) for value in values), self._new())
+                self._series[values] = series # Also under the caller's own key (e.g. a bool), for the fast path
+        return series
+
+    def _unique_series(self):
+        seen = {}
+        for values, series in list(self._series.items()):
+            seen.setdefault(id(series), (tuple(_label_value(value) for value in values), series))
+        return sorted(seen.values(), key=lambda item: item[0])
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += self._samples()
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _samples(self):
+        return [f"{self.name}{_labels_text(self.labelnames, values)} {_number(series.value)}"
+                for values, series in self._unique_series()]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _samples(self):
+        lines = []
+        for values, series in self._unique_series():
+            with series._lock:
+                counts, total = list(series.counts), series.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, values, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labelnames, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels_text(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """
+    A gauge or counter whose value is read when scraped: callback() returns a number, or
+    {label values tuple: number} for a metric with labels. Nothing is recorded on the hot path.
+    """
+    def __init__(self, name, help, callback, kind='gauge', labels=()):
+        super().__init__(name, help, labels)
+        self.callback = callback
+        self.kind = kind
+
+    def _samples(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_labels_text(self.labelnames, key)} {_number(value)}"
+                for key, value in sorted(values.items()) if value is not None]
+
+
+class Registry:
+    """The metrics a /metrics scrape renders, by name."""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Adds metric, or returns the one already registered under its name (callbacks are replaced)."""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None or isinstance(metric, CallbackMetric):
+                self._metrics[metric.name] = metric
+                return metric
+            return existing
+
+    def render(self):
+        """The Prometheus text exposition (format 0.0.4) of every metric."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines += metric.render()
+            except Exception as e: # A broken callback shouldn't take the whole scrape down
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+def counter(name, help, labels=()):
+    return REGISTRY.register(Counter(name, help, labels))
+
+def histogram(name, help, labels=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+def callback_metric(name, help, callback, kind='gauge', labels=()):
+    return REGISTRY.register(CallbackMetric(name, help, callback, kind, labels))
+
+
+# --- Active sessions ---
+
+class ActiveSessions:
+    """Last-seen times of sessions (or API users); count() is how many were seen recently."""
+    def __init__(self, window=ACTIVE_SESSION_SECONDS):
+        self.window = window
+        self._seen = {} # (source, key) -> time.monotonic() of the last request
+        self._lock = threading.Lock()
+
+    def touch(self, source, key):
+        self._seen[(source, key)] = time.monotonic()
+
+    def counts(self):
+        """{(source,): sessions seen within window}; forgets older ones."""
+        cutoff = time.monotonic() - self.window
+        counts = {}
+        with self._lock:
+            for entry, seen in list(self._seen.items()):
+                if seen < cutoff:
+                    if self._seen.get(entry, cutoff) < cutoff: # Not touched again meanwhile
+                        del self._seen[entry]
+                else:
+                    counts[(entry[0],)] = counts.get((entry[0],), 0) + 1
+        return counts
+
+
+ACTIVE_SESSIONS = ActiveSessions()
+
+# --- The quiz's metrics ---
+
+DECK_LOAD_SECONDS = histogram('b2_deck_load_seconds', "Deck load time by stage: fetch (download + CSV parse), validate, process, first_partial (streamed decks).", ('stage',))
+DECK_LOADS = counter('b2_deck_loads_total', "Decks loaded, from the sheet or adopted from another process's snapshot.", ('source',))
+DECK_FETCH_ERRORS = counter('b2_deck_fetch_errors_total', "Sheet fetches that failed.")
+DECK_REQUESTS = counter('b2_deck_requests_total', "Deck lookups: hit (fresh), stale (served while revalidating), miss (waited for a load).", ('result',))
+PROGRESS_READ_SECONDS = histogram('b2_progress_read_seconds', "Loading a user's progress from the progress store.", ('backend',))
+PROGRESS_WRITE_SECONDS = histogram('b2_progress_write_seconds', "Writing answers to the progress store.", ('backend',))
+FRAME_BUILD_SECONDS = histogram('b2_frame_build_seconds', "Merging deck and progress into a user's frame on a cache miss.", ('source',))
+QUESTION_SELECT_SECONDS = histogram('b2_question_select_seconds', "Picking the next question.", ('source', 'mode'))
+ANSWERS = counter('b2_answers_total', "Answers counted; rate() of it is answers per second.", ('source', 'correct'))
+callback_metric('b2_active_sessions', f"Sessions (app) or users (api) seen in the last {ACTIVE_SESSION_SECONDS} seconds.",
+                ACTIVE_SESSIONS.counts, labels=('source',))
+
+def observe_deck_load(df):
+    """Records the stage timings quiz_core.read_deck (or deck_ingest.read_deck_streaming) keeps in df.attrs['load_metrics']."""
+    load_metrics = df.attrs.get('load_metrics') or {}
+    for stage in ('fetch', 'validation', 'process', 'first_partial'):
+        seconds = load_metrics.get(f'{stage}_seconds')
+        if seconds is not None:
+            DECK_LOAD_SECONDS.labels('validate' if stage == 'validation' else stage).observe(seconds)
+
+def watch_frame_memo(memo):
+    """Exports a FrameMemo's counters; read from memo.stats() only when scraped."""
+    def stat(name):
+        return lambda: memo.stats()[name]
+    callback_metric('b2_frame_memo_hits_total', "Frame memo lookups served from memory.", stat('hits'), 'counter')
+    callback_metric('b2_frame_memo_misses_total', "Frame memo lookups that built the frame.", stat('misses'), 'counter')
+    callback_metric('b2_frame_memo_evictions_total', "Frames dropped for size or idleness.", stat('evictions'), 'counter')
+    callback_metric('b2_frame_memo_entries', "Frames held.", stat('entries'))
+    callback_metric('b2_frame_memo_bytes', "Memory of the frames held.", stat('bytes'))
+
+
+# --- Sidecar endpoint ---
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST, registry=REGISTRY):
+    """
+    Serves GET /metrics on a daemon thread and returns the server, or None if port is 0 or
+    taken (e.g. by another worker on the same host; give each one its own B2_METRICS_PORT).
+    """
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer # Only when enabled: ~30 ms of imports
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError as e:
+        print(f"Metrics endpoint not started on {host}:{port}: {e}", flush=True)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
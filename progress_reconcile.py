@@ -0,0 +1,127 @@
+import json
+import difflib
+
+from quiz_core import combine_progress
+from word_index import normalize
+
+# Keeps user_data.json in step with the sheet. Unique_ID is Quiz + "::" + Word, so fixing a
+# typo in either creates a new ID and orphans the progress stored under the old one. When a
+# new deck version arrives, reconcile_user_data:
+#   1. matches orphaned IDs to new IDs that share the (folded) Quiz or the (folded) Word and
+#      are similar enough in the other part, so no all-pairs comparison is needed,
+#   2. moves the progress to the new ID (combined with any progress already there),
+#   3. drops the remaining orphans.
+# reconcile_store applies only those moves and deletions, through the store's migrate(), which
+# each backend runs in one lock / transaction, so answers given meanwhile are not overwritten.
+# Untouched orphans (defaults only) go right away. Answered orphans are only dropped once they
+# are also missing from the previous deck version, i.e. from two versions in a row, so one
+# truncated fetch can't delete answers. If an unusually large share of answered items
+# disappears at once (e.g. a Lektion was cut from the sheet by accident), they are kept anyway.
+
+QUIZ_SIMILARITY = 0.85  # Same Word: the sentences must be at least this similar
+WORD_SIMILARITY = 0.7   # Same sentence: the words must be at least this similar
+MAX_GC_FRACTION = 0.25  # Keep answered orphans if more than this share of answered IDs would go
+
+
+def split_id(unique_id):
+    """(Quiz, Word) of a Unique_ID."""
+    quiz, _, word = unique_id.rpartition("::")
+    return quiz, word
+
+def is_untouched(progress):
+    """True for entries that hold no answers (the defaults initialize_quiz_data adds)."""
+    return not int(progress.get('Richtig Count', 0)) and not int(progress.get('False Count', 0))
+
+def _similarity(a, b):
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+def match_renamed(orphan_ids, candidate_ids):
+    """
+    {orphaned ID: new ID} for orphans that look like an edited version of a candidate.
+    Candidates are looked up by exact folded Quiz and by exact folded Word; every new ID
+    takes at most one orphan, best matches first.
+    """
+    by_quiz, by_word = {}, {}
+    for unique_id in candidate_ids:
+        quiz, word = (normalize(part) for part in split_id(unique_id))
+        by_quiz.setdefault(quiz, []).append((unique_id, word))
+        by_word.setdefault(word, []).append((unique_id, quiz))
+
+    scored = []
+    for old_id in orphan_ids:
+        quiz, word = (normalize(part) for part in split_id(old_id))
+        for new_id, new_word in by_quiz.get(quiz, ()):
+            score = _similarity(word, new_word)
+            if score >= WORD_SIMILARITY:
+                scored.append((score, old_id, new_id))
+        for new_id, new_quiz in by_word.get(word, ()):
+            score = _similarity(quiz, new_quiz)
+            if score >= QUIZ_SIMILARITY:
+                scored.append((score, old_id, new_id))
+
+    matches, taken = {}, set()
+    for _, old_id, new_id in sorted(scored, reverse=True):
+        if old_id not in matches and new_id not in taken:
+            matches[old_id] = new_id
+            taken.add(new_id)
+    return matches
+
+def reconcile_user_data(user_data, deck_ids, previous_ids=None):
+    """
+    Migrates renamed items and removes orphans in user_data ({user: {Unique_ID: progress}}),
+    in place. previous_ids are the IDs of the deck version before this one, if known: only
+    IDs new in this version can be the target of a rename. Without them, any deck ID no user
+    has answered yet can be. Answered orphans are removed only if previous_ids is known and
+    lacks them too. Returns a report dict; its 'changes' ({user: {old ID: new ID or None}})
+    are what was done, for ProgressStore.migrate.
+    """
+    deck_ids = set(deck_ids)
+    known_ids = {unique_id for progress in user_data.values() for unique_id in progress}
+    orphan_ids = known_ids - deck_ids
+    report = {'renamed': {}, 'migrated': 0, 'removed': 0, 'kept_orphans': 0, 'gc_skipped': False, 'changes': {}}
+    if not orphan_ids:
+        return report
+
+    answered = {unique_id for progress in user_data.values()
+                for unique_id, entry in progress.items() if not is_untouched(entry)}
+    previous_ids = set(previous_ids) if previous_ids is not None else None
+    candidate_ids = deck_ids - previous_ids if previous_ids is not None else deck_ids - answered
+    renamed = match_renamed(orphan_ids, candidate_ids)
+
+    answered_orphans = (orphan_ids & answered) - set(renamed)
+    gc_skipped = len(answered_orphans) > MAX_GC_FRACTION * len(answered)
+
+    for user, progress in user_data.items():
+        for old_id in [unique_id for unique_id in progress if unique_id in orphan_ids]:
+            new_id = renamed.get(old_id)
+            if new_id is not None:
+                entry = progress.pop(old_id)
+                progress[new_id] = combine_progress(progress[new_id], entry) if new_id in progress else entry
+                report['migrated'] += 1
+            elif not is_untouched(progress[old_id]) and (gc_skipped or previous_ids is None or old_id in previous_ids):
+                report['kept_orphans'] += 1 # Missing from this version only (or too many at once)
+                continue
+            else:
+                del progress[old_id]
+                report['removed'] += 1
+            report['changes'].setdefault(user, {})[old_id] = new_id
+
+    report.update(renamed=renamed, gc_skipped=gc_skipped)
+    return report
+
+def reconcile_store(store, df, previous_df=None):
+    """
+    Reconciles a progress store (progress_store.ProgressStore) with a newly loaded deck
+    (DeckSource's reconcile hook): plans on a snapshot of the store, then migrates only the
+    entries that move or go; leaves a corrupt JSON file alone.
+    """
+    try:
+        user_data = store.load_all()
+    except json.JSONDecodeError:
+        return None
+    previous_ids = previous_df['Unique_ID'].tolist() if previous_df is not None else None
+    report = reconcile_user_data(user_data, df['Unique_ID'].tolist(), previous_ids)
+    changes = report.pop('changes')
+    if changes:
+        store.migrate(changes)
+    return report
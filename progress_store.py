@@ -0,0 +1,791 @@
+import os
+import json
+import socket
+import sqlite3
+import threading
+
+from quiz_core import (USER_DATA_FILE, STATUS_ORDER, FileLock, read_user_data, write_user_data, new_progress, apply_answer,
+                       combine_progress, status_rank)
+
+# Where learner progress is stored, behind one small interface so the quiz logic doesn't care:
+#
+#   get(user, unique_id)              -> progress dict or None
+#   get_many(user, unique_ids=None)   -> {unique_id: progress} (all of the user's if None)
+#   increment(user, unique_id, ok)    -> progress after counting one answer (apply_answer)
+#   increment_many(user, results)     -> {unique_id: progress} after a batch of (unique_id, ok)
+#   scan_status(user, status)         -> [unique_id] with that Status
+#   ensure(user, unique_ids)          -> adds default progress for missing items, returns how many
+#   load_all() / replace_all(data)    -> the whole {user: {unique_id: progress}} (bulk tools)
+#   iter_all()                        -> yields every (user, unique_id, progress), a part at a time (export)
+#   merge(entries)                    -> combines (user, unique_id, progress) entries into the stored
+#                                        progress (combine_progress), atomically (import)
+#   migrate(changes)                  -> applies {user: {old_id: new_id or None}} atomically (reconcile):
+#                                        old progress is moved onto new_id (combined) or deleted
+#   signature()                       -> changes whenever the stored progress changes
+#
+# Backends, chosen with B2_PROGRESS_STORE ("<backend>:<location>"):
+#   json:user_data.json    the original file, read-modify-written whole under a lock file shared
+#                          by every process (the default)
+#   sqlite:progress.db     one row per (user, item), answers are single-row upserts
+#   memory:                a dict, for tests, guests and benchmarks
+#   kv:host:port[/prefix]  a Redis-protocol server shared by every replica (kv_server.py is a
+#                          pure-Python stand-in); batches are pipelined over pooled connections
+# bench_progress_store.py checks every backend against the same conformance suite.
+
+PROGRESS_STORE = os.environ.get("B2_PROGRESS_STORE", "json:" + USER_DATA_FILE)
+
+
+def merge_progress(user_data, entries):
+    """Combines (user, unique_id, progress) entries into user_data ({user: {unique_id: progress}}), in place."""
+    for user, unique_id, entry in entries:
+        progress = user_data.setdefault(user, {})
+        progress[unique_id] = combine_progress(progress[unique_id], entry) if unique_id in progress else dict(entry)
+
+def migrate_progress(progress, changes):
+    """Applies {old_id: new_id or None} to one user's {unique_id: progress}, in place."""
+    for old_id, new_id in changes.items():
+        entry = progress.pop(old_id, None)
+        if entry is not None and new_id is not None:
+            progress[new_id] = combine_progress(progress[new_id], entry) if new_id in progress else entry
+
+
+class ProgressStore:
+    """Interface of a progress backend. Batch methods default to loops over the single ones."""
+    backend = 'none' # Name in B2_PROGRESS_STORE and in metrics
+
+    def get(self, user, unique_id):
+        raise NotImplementedError
+
+    def get_many(self, user, unique_ids=None):
+        raise NotImplementedError
+
+    def increment(self, user, unique_id, is_correct):
+        raise NotImplementedError
+
+    def increment_many(self, user, results):
+        updated = {}
+        for unique_id, is_correct in results:
+            updated[unique_id] = self.increment(user, unique_id, is_correct)
+        return updated
+
+    def scan_status(self, user, status):
+        return [unique_id for unique_id, progress in self.get_many(user).items()
+                if progress.get('Status', 'not started yet') == status]
+
+    def ensure(self, user, unique_ids):
+        raise NotImplementedError
+
+    def load_all(self):
+        raise NotImplementedError
+
+    def replace_all(self, user_data):
+        raise NotImplementedError
+
+    def migrate(self, changes):
+        raise NotImplementedError
+
+    def iter_all(self):
+        for user, progress in self.load_all().items():
+            for unique_id, entry in progress.items():
+                yield user, unique_id, entry
+
+    def merge(self, entries):
+        raise NotImplementedError
+
+    def signature(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class MemoryProgressStore(ProgressStore):
+    """Progress in a dict; gone when the process ends."""
+    backend = 'memory'
+
+    def __init__(self, location=None):
+        self._data = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, user, unique_id):
+        with self._lock:
+            progress = self._data.get(user, {}).get(unique_id)
+            return dict(progress) if progress is not None else None
+
+    def get_many(self, user, unique_ids=None):
+        with self._lock:
+            progress = self._data.get(user, {})
+            if unique_ids is None:
+                return {unique_id: dict(entry) for unique_id, entry in progress.items()}
+            return {unique_id: dict(progress[unique_id]) for unique_id in unique_ids if unique_id in progress}
+
+    def increment(self, user, unique_id, is_correct):
+        with self._lock:
+            progress = self._data.setdefault(user, {}).setdefault(unique_id, new_progress())
+            self._writes += 1
+            return dict(apply_answer(progress, is_correct))
+
+    def increment_many(self, user, results):
+        with self._lock:
+            user_progress = self._data.setdefault(user, {})
+            updated = {}
+            for unique_id, is_correct in results:
+                updated[unique_id] = apply_answer(user_progress.setdefault(unique_id, new_progress()), is_correct)
+            self._writes += 1
+            return {unique_id: dict(progress) for unique_id, progress in updated.items()}
+
+    def ensure(self, user, unique_ids):
+        with self._lock:
+            user_progress = self._data.setdefault(user, {})
+            missing = [unique_id for unique_id in unique_ids if unique_id not in user_progress]
+            for unique_id in missing:
+                user_progress[unique_id] = new_progress()
+            self._writes += bool(missing)
+            return len(missing)
+
+    def load_all(self):
+        with self._lock:
+            return {user: {unique_id: dict(entry) for unique_id, entry in progress.items()}
+                    for user, progress in self._data.items()}
+
+    def replace_all(self, user_data):
+        with self._lock:
+            self._data = {user: {unique_id: dict(entry) for unique_id, entry in progress.items()}
+                          for user, progress in user_data.items()}
+            self._writes += 1
+
+    def migrate(self, changes):
+        with self._lock:
+            for user, user_changes in changes.items():
+                migrate_progress(self._data.get(user, {}), user_changes)
+            self._writes += 1
+
+    def merge(self, entries):
+        with self._lock:
+            merge_progress(self._data, entries)
+            self._writes += 1
+
+    def signature(self):
+        return self._writes
+
+
+class JsonProgressStore(ProgressStore):
+    """
+    The original user_data.json ({user: {unique_id: progress}}), same layout as before. Reads
+    are served from the last parse while the file is unchanged. Writes hold <file>.lock (flock)
+    while they re-read the file and replace it atomically, so several processes can answer into
+    the same file without losing each other's answers. A corrupt file reads as empty (last_error is set) except in load_all, which
+    raises; answers and ensure() are then kept in memory only, so the file is never overwritten
+    with what little was read from it (replace_all still writes).
+    """
+    backend = 'json'
+
+    def __init__(self, location=USER_DATA_FILE):
+        self.path = location or USER_DATA_FILE
+        self.last_error = None
+        self._cache = None # (file signature, parsed data)
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(self.path + ".lock")
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read(self, strict=False, fresh=False):
+        signature = self._stat()
+        if not fresh and self._cache is not None and self._cache[0] == signature:
+            return self._cache[1]
+        try:
+            data = read_user_data(self.path)
+            self.last_error = None
+        except json.JSONDecodeError as e:
+            if strict:
+                raise
+            self.last_error = e
+            data = {}
+        self._cache = (signature, data)
+        return data
+
+    def _write(self, data):
+        if self.last_error is not None: # data came from a file we couldn't parse
+            return
+        try:
+            write_user_data(data, self.path)
+        except BaseException:
+            self._cache = None
+            raise
+        self._cache = (self._stat(), data)
+
+    def get(self, user, unique_id):
+        with self._lock:
+            progress = self._read().get(user, {}).get(unique_id)
+            return dict(progress) if progress is not None else None
+
+    def get_many(self, user, unique_ids=None):
+        with self._lock:
+            progress = self._read().get(user, {})
+            if unique_ids is None:
+                return {unique_id: dict(entry) for unique_id, entry in progress.items()}
+            return {unique_id: dict(progress[unique_id]) for unique_id in unique_ids if unique_id in progress}
+
+    def increment(self, user, unique_id, is_correct):
+        return self.increment_many(user, [(unique_id, is_correct)])[unique_id]
+
+    def increment_many(self, user, results):
+        with self._lock, self._file_lock:
+            data = self._read(fresh=True) # Another process may have written it a moment ago
+            user_progress = data.setdefault(user, {})
+            updated = {}
+            for unique_id, is_correct in results:
+                updated[unique_id] = apply_answer(user_progress.setdefault(unique_id, new_progress()), is_correct)
+            self._write(data)
+            return {unique_id: dict(progress) for unique_id, progress in updated.items()}
+
+    def scan_status(self, user, status):
+        with self._lock:
+            return [unique_id for unique_id, progress in self._read().get(user, {}).items()
+                    if progress.get('Status', 'not started yet') == status]
+
+    def ensure(self, user, unique_ids):
+        with self._lock, self._file_lock:
+            data = self._read(fresh=True)
+            user_progress = data.setdefault(user, {})
+            missing = [unique_id for unique_id in unique_ids if unique_id not in user_progress]
+            for unique_id in missing:
+                user_progress[unique_id] = new_progress()
+            if missing:
+                self._write(data)
+            return len(missing)
+
+    def load_all(self):
+        with self._lock:
+            return json.loads(json.dumps(self._read(strict=True))) # A copy the caller may change
+
+    def replace_all(self, user_data):
+        with self._lock, self._file_lock:
+            self.last_error = None # Replaces whatever the file held
+            self._write(json.loads(json.dumps(user_data)))
+
+    def migrate(self, changes):
+        with self._lock, self._file_lock:
+            data = self._read(fresh=True)
+            for user, user_changes in changes.items():
+                migrate_progress(data.get(user, {}), user_changes)
+            self._write(data)
+
+    def merge(self, entries):
+        with self._lock, self._file_lock:
+            data = self._read(fresh=True)
+            merge_progress(data, entries)
+            self._write(data)
+
+    def signature(self):
+        return self._stat()
+
+
+class SqliteProgressStore(ProgressStore):
+    """One row per (user, item) in a WAL-mode sqlite file; an answer is a single-row upsert."""
+    backend = 'sqlite'
+
+    def __init__(self, location='progress.db'):
+        self.path = location or 'progress.db'
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.execute("PRAGMA busy_timeout = 5000")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS progress (
+                user TEXT NOT NULL, unique_id TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'not started yet',
+                richtig_count INTEGER NOT NULL DEFAULT 0, false_count INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (user, unique_id))
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS progress_status ON progress (user, status)")
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _progress(status, richtig, false):
+        return {'Status': status, 'Richtig Count': richtig, 'False Count': false}
+
+    def get(self, user, unique_id):
+        with self._lock:
+            row = self._db.execute("SELECT status, richtig_count, false_count FROM progress WHERE user = ? AND unique_id = ?",
+                                   (user, unique_id)).fetchone()
+        return self._progress(*row) if row else None
+
+    def get_many(self, user, unique_ids=None):
+        with self._lock:
+            if unique_ids is None:
+                rows = self._db.execute("SELECT unique_id, status, richtig_count, false_count FROM progress "
+                                        "WHERE user = ? ORDER BY rowid", (user,)).fetchall()
+            else:
+                self._db.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (unique_id TEXT PRIMARY KEY)")
+                self._db.execute("DELETE FROM wanted")
+                self._db.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", ((unique_id,) for unique_id in unique_ids))
+                rows = self._db.execute("SELECT p.unique_id, status, richtig_count, false_count FROM progress p "
+                                        "JOIN wanted w ON p.unique_id = w.unique_id WHERE user = ?", (user,)).fetchall()
+        return {unique_id: self._progress(*rest) for unique_id, *rest in rows}
+
+    def _upsert(self, user, results):
+        return [self._db.execute("""
+            INSERT INTO progress (user, unique_id, status, richtig_count, false_count) VALUES (?, ?, 'done', ?, ?)
+            ON CONFLICT (user, unique_id) DO UPDATE SET
+                status = 'done',
+                richtig_count = richtig_count + excluded.richtig_count,
+                false_count = false_count + excluded.false_count
+            RETURNING unique_id, status, richtig_count, false_count
+        """, (user, unique_id, int(bool(is_correct)), int(not is_correct))).fetchone() for unique_id, is_correct in results]
+
+    def increment(self, user, unique_id, is_correct):
+        return self.increment_many(user, [(unique_id, is_correct)])[unique_id]
+
+    def increment_many(self, user, results):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._upsert(user, results)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._writes += 1
+        return {unique_id: self._progress(*rest) for unique_id, *rest in rows}
+
+    def scan_status(self, user, status):
+        with self._lock:
+            rows = self._db.execute("SELECT unique_id FROM progress WHERE user = ? AND status = ? ORDER BY rowid",
+                                    (user, status)).fetchall()
+        return [unique_id for unique_id, in rows]
+
+    def ensure(self, user, unique_ids):
+        with self._lock:
+            before = self._db.total_changes
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany("INSERT OR IGNORE INTO progress (user, unique_id) VALUES (?, ?)",
+                                     ((user, unique_id) for unique_id in unique_ids))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            added = self._db.total_changes - before
+            self._writes += bool(added)
+        return added
+
+    def load_all(self):
+        user_data = {}
+        with self._lock:
+            rows = self._db.execute("SELECT user, unique_id, status, richtig_count, false_count FROM progress ORDER BY rowid")
+            for user, unique_id, *rest in rows:
+                user_data.setdefault(user, {})[unique_id] = self._progress(*rest)
+        return user_data
+
+    def replace_all(self, user_data):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM progress")
+                self._db.executemany(
+                    "INSERT INTO progress (user, unique_id, status, richtig_count, false_count) VALUES (?, ?, ?, ?, ?)",
+                    ((user, unique_id, entry.get('Status', 'not started yet'), int(entry.get('Richtig Count', 0)),
+                      int(entry.get('False Count', 0))) for user, progress in user_data.items() for unique_id, entry in progress.items()))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._writes += 1
+
+    def _row(self, user, unique_id):
+        return self._db.execute("SELECT status, richtig_count, false_count FROM progress WHERE user = ? AND unique_id = ?",
+                                (user, unique_id)).fetchone()
+
+    def _put(self, user, unique_id, entry):
+        self._db.execute(
+            "INSERT INTO progress (user, unique_id, status, richtig_count, false_count) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (user, unique_id) DO UPDATE SET status = excluded.status, "
+            "richtig_count = excluded.richtig_count, false_count = excluded.false_count",
+            (user, unique_id, entry['Status'], entry['Richtig Count'], entry['False Count']))
+
+    def migrate(self, changes):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE") # Answers from other connections wait until the moves are done
+            try:
+                for user, user_changes in changes.items():
+                    for old_id, new_id in user_changes.items():
+                        old = self._row(user, old_id)
+                        if old is None:
+                            continue
+                        self._db.execute("DELETE FROM progress WHERE user = ? AND unique_id = ?", (user, old_id))
+                        if new_id is None:
+                            continue
+                        new = self._row(user, new_id)
+                        self._put(user, new_id, combine_progress(self._progress(*new), self._progress(*old))
+                                  if new else self._progress(*old))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._writes += 1
+
+    def iter_all(self, batch_rows=10000):
+        last = 0
+        while True:
+            with self._lock: # Released between batches, so answers aren't held up by a long export
+                rows = self._db.execute("SELECT rowid, user, unique_id, status, richtig_count, false_count FROM progress "
+                                        "WHERE rowid > ? ORDER BY rowid LIMIT ?", (last, batch_rows)).fetchall()
+            if not rows:
+                return
+            for rowid, user, unique_id, *rest in rows:
+                yield user, unique_id, self._progress(*rest)
+            last = rows[-1][0]
+
+    def merge(self, entries):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for user, unique_id, entry in entries:
+                    old = self._row(user, unique_id)
+                    self._put(user, unique_id, combine_progress(self._progress(*old), entry) if old
+                              else self._progress(entry.get('Status', 'not started yet'), int(entry.get('Richtig Count', 0)),
+                                                  int(entry.get('False Count', 0))))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._writes += 1
+
+    def signature(self):
+        with self._lock: # data_version moves on commits by other connections, _writes on ours
+            return self._db.execute("PRAGMA data_version").fetchone()[0], self._writes
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class KvError(Exception):
+    """Error reply from the key-value server."""
+
+
+def _encode_command(command):
+    parts = [b"*%d\r\n" % len(command)]
+    for arg in command:
+        data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class _KvConnection:
+    """One RESP connection; execute() pipelines commands: all are sent, then all replies are read."""
+    def __init__(self, host, port, timeout):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile('rb')
+
+    def _reply(self):
+        line = self._file.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection to the progress server closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode('utf-8')
+        if kind == b"-":
+            return KvError(body.decode('utf-8'))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            return None if length < 0 else self._file.read(length + 2)[:-2].decode('utf-8')
+        if kind == b"*":
+            length = int(body)
+            return None if length < 0 else [self._reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply from the progress server: {line[:40]!r}")
+
+    def execute(self, commands):
+        self._sock.sendall(b"".join(_encode_command(command) for command in commands))
+        replies = [self._reply() for _ in commands] # Read every reply so the stream stays in step
+        for reply in replies:
+            if isinstance(reply, KvError):
+                raise reply
+        return replies
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+class KvProgressStore(ProgressStore):
+    """
+    Progress on a Redis-protocol server, so replicas behind a load balancer share it. A user is
+    one hash (<prefix>:progress:<user>) with fields <unique_id>|s, |r and |f; answers are atomic
+    HINCRBYs, a batch goes out as one pipeline, and <prefix>:version counts writes for signature().
+    Connections are pooled (up to max_connections, callers wait for a free one beyond that); a
+    connection that fails is dropped, never retried, so an answer is not counted twice.
+    """
+    backend = 'kv'
+
+    def __init__(self, location=None, max_connections=8, timeout=5.0):
+        address, _, prefix = (location or '127.0.0.1:6379').partition('/')
+        host, _, port = address.rpartition(':')
+        self.host = host or '127.0.0.1'
+        self.port = int(port or 6379)
+        self.prefix = prefix or 'b2'
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._pool = threading.Condition()
+
+    # --- Connection pool ---
+
+    def _acquire(self):
+        with self._pool:
+            while not self._idle and self._open >= self.max_connections:
+                self._pool.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+        try:
+            return _KvConnection(self.host, self.port, self.timeout)
+        except BaseException:
+            self._release(None)
+            raise
+
+    def _release(self, connection):
+        with self._pool:
+            if connection is None:
+                self._open -= 1
+            else:
+                self._idle.append(connection)
+            self._pool.notify()
+
+    def pipeline(self, commands):
+        """Replies to commands, sent in one round trip on a pooled connection."""
+        if not commands:
+            return []
+        connection = self._acquire()
+        try:
+            replies = connection.execute(commands)
+        except KvError:
+            self._release(connection)
+            raise
+        except BaseException:
+            connection.close()
+            self._release(None)
+            raise
+        self._release(connection)
+        return replies
+
+    def transaction(self, key, reads, write):
+        """
+        Sends reads under WATCH key, then the commands write(replies to reads) returns in one
+        MULTI ... EXEC on the same connection, starting over whenever another client changed key
+        in between. Returns the EXEC replies ([] if write returned no commands).
+        """
+        connection = self._acquire()
+        try:
+            while True:
+                replies = connection.execute([('WATCH', key)] + reads)[1:]
+                commands = write(replies)
+                if not commands:
+                    connection.execute([('UNWATCH',)])
+                    result = []
+                    break
+                result = connection.execute([('MULTI',)] + commands + [('EXEC',)])[-1]
+                if result is not None: # None: key changed since WATCH and nothing ran
+                    break
+        except BaseException:
+            connection.close()
+            self._release(None)
+            raise
+        self._release(connection)
+        for reply in result:
+            if isinstance(reply, KvError):
+                raise reply
+        return result
+
+    # --- Layout ---
+
+    def _key(self, user):
+        return f"{self.prefix}:progress:{user}"
+
+    @staticmethod
+    def _fields(unique_id):
+        return f"{unique_id}|s", f"{unique_id}|r", f"{unique_id}|f"
+
+    @staticmethod
+    def _progress(status, richtig, false):
+        return {'Status': status or 'not started yet', 'Richtig Count': int(richtig or 0), 'False Count': int(false or 0)}
+
+    def _parse_hash(self, flat):
+        progress = {}
+        for field, value in zip(flat[::2], flat[1::2]):
+            unique_id, _, part = field.rpartition('|')
+            entry = progress.setdefault(unique_id, self._progress(None, 0, 0))
+            if part == 's':
+                entry['Status'] = value
+            elif part == 'r':
+                entry['Richtig Count'] = int(value)
+            elif part == 'f':
+                entry['False Count'] = int(value)
+        return progress
+
+    def _written(self, user):
+        return [('SADD', f"{self.prefix}:users", user), ('INCR', f"{self.prefix}:version")]
+
+    # --- Interface ---
+
+    def get(self, user, unique_id):
+        status, richtig, false = self.pipeline([('HMGET', self._key(user)) + self._fields(unique_id)])[0]
+        if status is None and richtig is None and false is None:
+            return None
+        return self._progress(status, richtig, false)
+
+    def get_many(self, user, unique_ids=None):
+        if unique_ids is None:
+            return self._parse_hash(self.pipeline([('HGETALL', self._key(user))])[0])
+        unique_ids = list(dict.fromkeys(unique_ids))
+        if not unique_ids:
+            return {}
+        values = self.pipeline([('HMGET', self._key(user)) + tuple(field for unique_id in unique_ids
+                                                                    for field in self._fields(unique_id))])[0]
+        progress = {}
+        for i, unique_id in enumerate(unique_ids):
+            status, richtig, false = values[3 * i:3 * i + 3]
+            if status is not None or richtig is not None or false is not None:
+                progress[unique_id] = self._progress(status, richtig, false)
+        return progress
+
+    def increment(self, user, unique_id, is_correct):
+        return self.increment_many(user, [(unique_id, is_correct)])[unique_id]
+
+    def increment_many(self, user, results):
+        counts = {} # unique_id -> [right, wrong]; repeats in a batch become one HINCRBY each
+        for unique_id, is_correct in results:
+            counts.setdefault(unique_id, [0, 0])[0 if is_correct else 1] += 1
+        if not counts:
+            return {}
+        key = self._key(user)
+        commands = []
+        for unique_id, (right, wrong) in counts.items():
+            status, richtig, false = self._fields(unique_id)
+            commands += [('HSET', key, status, 'done'), ('HINCRBY', key, richtig, right), ('HINCRBY', key, false, wrong)]
+        replies = self.pipeline(commands + self._written(user))
+        return {unique_id: self._progress('done', replies[3 * i + 1], replies[3 * i + 2])
+                for i, unique_id in enumerate(counts)}
+
+    def ensure(self, user, unique_ids):
+        unique_ids = list(dict.fromkeys(unique_ids))
+        if not unique_ids:
+            return 0
+        key = self._key(user)
+        commands = []
+        for unique_id in unique_ids:
+            status, richtig, false = self._fields(unique_id)
+            commands += [('HSETNX', key, status, 'not started yet'), ('HSETNX', key, richtig, 0), ('HSETNX', key, false, 0)]
+        added = sum(self.pipeline(commands)[::3])
+        if added:
+            self.pipeline(self._written(user))
+        return added
+
+    def load_all(self):
+        users = self.pipeline([('SMEMBERS', f"{self.prefix}:users")])[0]
+        hashes = self.pipeline([('HGETALL', self._key(user)) for user in users])
+        return {user: self._parse_hash(flat) for user, flat in zip(users, hashes)}
+
+    def replace_all(self, user_data):
+        users = self.pipeline([('SMEMBERS', f"{self.prefix}:users")])[0]
+        commands = [('MULTI',)]
+        commands += [('DEL', self._key(user)) for user in users]
+        commands.append(('DEL', f"{self.prefix}:users"))
+        for user, progress in user_data.items():
+            pairs = []
+            for unique_id, entry in progress.items():
+                status, richtig, false = self._fields(unique_id)
+                pairs += [status, entry.get('Status', 'not started yet'), richtig, int(entry.get('Richtig Count', 0)),
+                          false, int(entry.get('False Count', 0))]
+            if pairs:
+                commands.append(('HSET', self._key(user)) + tuple(pairs))
+            commands.append(('SADD', f"{self.prefix}:users", user))
+        commands += [('INCR', f"{self.prefix}:version"), ('EXEC',)]
+        replies = self.pipeline(commands)
+        for reply in replies[-1] or ():
+            if isinstance(reply, KvError):
+                raise reply
+
+    def migrate(self, changes):
+        for user, user_changes in changes.items():
+            key = self._key(user)
+            unique_ids = list(dict.fromkeys([unique_id for pair in user_changes.items() for unique_id in pair
+                                             if unique_id is not None]))
+            if not unique_ids:
+                continue
+            def write(replies, user_changes=user_changes, unique_ids=unique_ids, key=key):
+                values = replies[0]
+                before = {}
+                for i, unique_id in enumerate(unique_ids):
+                    status, richtig, false = values[3 * i:3 * i + 3]
+                    if status is not None or richtig is not None or false is not None:
+                        before[unique_id] = self._progress(status, richtig, false)
+                after = {unique_id: dict(entry) for unique_id, entry in before.items()}
+                migrate_progress(after, user_changes)
+                commands = []
+                gone = tuple(field for unique_id in before if unique_id not in after for field in self._fields(unique_id))
+                if gone:
+                    commands.append(('HDEL', key) + gone)
+                for unique_id, entry in after.items():
+                    if entry != before.get(unique_id):
+                        status, richtig, false = self._fields(unique_id)
+                        commands.append(('HSET', key, status, entry['Status'], richtig, entry['Richtig Count'],
+                                         false, entry['False Count']))
+                return commands + [('INCR', f"{self.prefix}:version")] if commands else []
+            # Per user hash: an answer landing between the read and the write makes it start over
+            self.transaction(key, [('HMGET', key) + tuple(field for unique_id in unique_ids
+                                                          for field in self._fields(unique_id))], write)
+
+    def iter_all(self):
+        for user in self.pipeline([('SMEMBERS', f"{self.prefix}:users")])[0]:
+            for unique_id, entry in self.get_many(user).items():
+                yield user, unique_id, entry
+
+    def merge(self, entries):
+        commands, users = [], set()
+        top_rank = max(STATUS_ORDER.values())
+        for user, unique_id, entry in entries:
+            key = self._key(user)
+            status, richtig, false = self._fields(unique_id)
+            entry_status = entry.get('Status', 'not started yet')
+            # combine_progress keeps the later status, the entry's on a tie: only the top rank can overwrite
+            commands += [('HSET' if status_rank(entry_status) >= top_rank else 'HSETNX', key, status, entry_status),
+                         ('HINCRBY', key, richtig, int(entry.get('Richtig Count', 0))),
+                         ('HINCRBY', key, false, int(entry.get('False Count', 0)))]
+            users.add(user)
+        for user in users:
+            commands += self._written(user)
+        self.pipeline(commands)
+
+    def signature(self):
+        return self.pipeline([('GET', f"{self.prefix}:version")])[0]
+
+    def close(self):
+        with self._pool:
+            for connection in self._idle:
+                connection.close()
+            self._open -= len(self._idle)
+            self._idle = []
+
+
+BACKENDS = {'json': JsonProgressStore, 'sqlite': SqliteProgressStore, 'memory': MemoryProgressStore,
+            'kv': KvProgressStore}
+
+def open_progress_store(spec=PROGRESS_STORE):
+    """Progress store for a "<backend>:<location>" spec, e.g. "sqlite:progress.db"."""
+    backend, _, location = spec.partition(':')
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown progress store '{backend}', expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[backend](location or None)
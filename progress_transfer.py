@@ -0,0 +1,355 @@
+import os
+import re
+import csv
+import json
+import sqlite3
+import argparse
+import tempfile
+
+from quiz_core import USER_DATA_FILE, FileLock, atomic_write, status_rank
+from progress_store import PROGRESS_STORE, open_progress_store
+
+# Bulk export / import of learner progress (the progress store, B2_PROGRESS_STORE) as CSV,
+# Parquet or JSONL, one row per (user, item):
+#
+#   user, unique_id, status, richtig_count, false_count
+#
+# Both directions stream. With the json backend, user_data.json is read entry by entry (no
+# json.load of the whole file), and an import is merged in an on-disk sqlite table before the
+# new user_data.json is written out entry by entry, all under the store's lock file so answers
+# given meanwhile aren't lost. Other backends are read with iter_all() and merged into with
+# merge(), BATCH_ROWS rows at a time. Merging sums the counts and keeps the latest status,
+# where 'done' is later than 'not started yet' and, between equal statuses, the imported row wins.
+#
+#   python progress_transfer.py export backup.parquet [--store sqlite:progress.db]
+#   python progress_transfer.py import backup.csv [--store json:user_data.json]
+
+EXPORT_COLUMNS = ['user', 'unique_id', 'status', 'richtig_count', 'false_count']
+FORMATS = ('csv', 'parquet', 'jsonl', 'json')
+BATCH_ROWS = 65536            # Rows per Parquet row group / sqlite transaction
+CHUNK_CHARS = 1 << 16         # Characters read from user_data.json at a time
+MAX_VALUE_CHARS = 1 << 20     # A single key or progress entry larger than this means the file is corrupt
+WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    SCHEMA = pa.schema([
+        ('user', pa.string()),
+        ('unique_id', pa.string()),
+        ('status', pa.string()),
+        ('richtig_count', pa.int64()),
+        ('false_count', pa.int64()),
+    ])
+except ImportError: # CSV and JSONL work without pyarrow
+    pa = pq = SCHEMA = None
+
+
+def format_of(path):
+    """File format from the extension: csv, parquet, jsonl or json (a user_data.json file)."""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown progress file format '{extension}', expected one of {', '.join(FORMATS)}")
+    return extension
+
+# --- Streaming user_data.json reader ---
+
+class _JsonStream:
+    """Reads JSON values one at a time from a file, refilling the buffer as needed."""
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        data = self.f.read(CHUNK_CHARS)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or None at the end of the file."""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return None
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Corrupt progress file: expected '{char}', found {found!r}")
+        self.pos += 1
+
+    def skip_comma(self):
+        if self.peek() == ',':
+            self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if len(self.buf) - self.pos <= MAX_VALUE_CHARS and self._fill():
+                    continue
+                raise
+            if end == len(self.buf) and not self.eof and self._fill(): # A number may go on in the next chunk
+                continue
+            self.pos = end
+            return value
+
+def iter_user_data(path=USER_DATA_FILE):
+    """
+    Yields (user, unique_id, progress) from a user_data.json file ({user: {unique_id: progress}})
+    without loading it whole. Yields nothing if the file doesn't exist; raises ValueError if it is corrupt.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f)
+        stream.expect('{')
+        while stream.peek() != '}':
+            user = stream.value()
+            stream.expect(':')
+            stream.expect('{')
+            while stream.peek() != '}':
+                unique_id = stream.value()
+                stream.expect(':')
+                yield user, unique_id, stream.value()
+                stream.skip_comma()
+            stream.expect('}')
+            stream.skip_comma()
+        stream.expect('}')
+
+def progress_rows(entries):
+    """Export rows from (user, unique_id, progress) entries."""
+    for user, unique_id, progress in entries:
+        yield {
+            'user': user,
+            'unique_id': unique_id,
+            'status': progress.get('Status', 'not started yet'),
+            'richtig_count': int(progress.get('Richtig Count', 0)),
+            'false_count': int(progress.get('False Count', 0)),
+        }
+
+# --- Row readers and writers per format ---
+
+def _batches(rows, size=BATCH_ROWS):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Parquet needs pyarrow; use CSV or JSONL instead")
+
+def _write_csv(rows, path):
+    n = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            n += 1
+    return n
+
+def _write_jsonl(rows, path):
+    n = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+def _write_parquet(rows, path):
+    _require_pyarrow()
+    n = 0
+    with pq.ParquetWriter(path, SCHEMA) as writer:
+        for batch in _batches(rows):
+            writer.write_table(pa.Table.from_pylist(batch, schema=SCHEMA))
+            n += len(batch)
+    if n == 0: # ParquetWriter writes no file for zero batches on some versions
+        pq.write_table(SCHEMA.empty_table(), path)
+    return n
+
+def _write_json(rows, path):
+    return write_user_data_stream(((row['user'], row['unique_id'], row) for row in rows), path)
+
+def _read_csv(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            yield _clean_row(row)
+
+def _read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield _clean_row(json.loads(line))
+
+def _read_parquet(path):
+    _require_pyarrow()
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=BATCH_ROWS, columns=EXPORT_COLUMNS):
+        for row in batch.to_pylist():
+            yield _clean_row(row)
+
+def _read_json(path):
+    return progress_rows(iter_user_data(path))
+
+def _clean_row(row):
+    def count(value):
+        return int(float(value)) if value not in (None, "") else 0
+    return {
+        'user': str(row['user']),
+        'unique_id': str(row['unique_id']),
+        'status': row.get('status') or 'not started yet',
+        'richtig_count': count(row.get('richtig_count')),
+        'false_count': count(row.get('false_count')),
+    }
+
+WRITERS = {'csv': _write_csv, 'parquet': _write_parquet, 'jsonl': _write_jsonl, 'json': _write_json}
+READERS = {'csv': _read_csv, 'parquet': _read_parquet, 'jsonl': _read_jsonl, 'json': _read_json}
+
+def read_progress_rows(path, fmt=None):
+    """Streams rows from an exported progress file."""
+    return READERS[fmt or format_of(path)](path)
+
+# --- Streaming user_data.json writer ---
+
+def write_user_data_stream(entries, path=USER_DATA_FILE):
+    """
+    Writes (user, unique_id, progress-or-row) entries, grouped by user, as user_data.json in the
+    same layout as quiz_core.write_user_data, atomically. Returns the number of entries written.
+    """
+    n = 0
+    def write(tmp_path):
+        nonlocal n
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("{")
+            current_user = None
+            for user, unique_id, entry in entries:
+                if 'richtig_count' in entry:
+                    entry = {'Status': entry['status'], 'Richtig Count': entry['richtig_count'], 'False Count': entry['false_count']}
+                if user != current_user:
+                    if current_user is not None:
+                        f.write("\n    },")
+                    f.write(f"\n    {json.dumps(user, ensure_ascii=False)}: {{")
+                    current_user = user
+                else:
+                    f.write(",")
+                body = json.dumps(entry, indent=4, ensure_ascii=False).replace("\n", "\n        ")
+                f.write(f"\n        {json.dumps(unique_id, ensure_ascii=False)}: {body}")
+                n += 1
+            f.write("\n    }\n}" if current_user is not None else "}")
+    atomic_write(path, write)
+    return n
+
+# --- Export / import ---
+
+def _open_store(store):
+    """(store, whether we opened it) for a ProgressStore or a "<backend>:<location>" spec."""
+    if isinstance(store, str):
+        return open_progress_store(store), True
+    return store, False
+
+def export_progress(out_path, fmt=None, store=PROGRESS_STORE):
+    """Writes every user's progress from store (a ProgressStore or spec) to out_path. Returns the number of rows."""
+    store, opened = _open_store(store)
+    try:
+        entries = iter_user_data(store.path) if store.backend == 'json' else store.iter_all()
+        return WRITERS[fmt or format_of(out_path)](progress_rows(entries), out_path)
+    finally:
+        if opened:
+            store.close()
+
+def _merge_rows(db, rows):
+    n = 0
+    for batch in _batches(rows):
+        db.executemany("""
+            INSERT INTO progress (user, unique_id, status, status_rank, richtig_count, false_count)
+            VALUES (:user, :unique_id, :status, :status_rank, :richtig_count, :false_count)
+            ON CONFLICT (user, unique_id) DO UPDATE SET
+                richtig_count = richtig_count + excluded.richtig_count,
+                false_count = false_count + excluded.false_count,
+                status = CASE WHEN excluded.status_rank >= status_rank THEN excluded.status ELSE status END,
+                status_rank = MAX(status_rank, excluded.status_rank)
+        """, [dict(row, status_rank=status_rank(row['status'])) for row in batch])
+        db.commit()
+        n += len(batch)
+    return n
+
+def import_progress(in_path, fmt=None, store=PROGRESS_STORE):
+    """
+    Merges an exported progress file into store (a ProgressStore or spec): summed counts,
+    latest status. Importing the same file twice counts its answers twice. Returns the rows imported.
+    """
+    store, opened = _open_store(store)
+    try:
+        if store.backend == 'json':
+            with FileLock(store.path + ".lock"): # The lock JsonProgressStore writes under
+                return _import_user_data(in_path, fmt, store.path)
+        n = 0
+        for batch in _batches(read_progress_rows(in_path, fmt)):
+            store.merge([(row['user'], row['unique_id'], {'Status': row['status'], 'Richtig Count': row['richtig_count'],
+                                                         'False Count': row['false_count']}) for row in batch])
+            n += len(batch)
+        return n
+    finally:
+        if opened:
+            store.close()
+
+def _import_user_data(in_path, fmt, target):
+    """Merges an exported progress file into the user_data.json at target, streaming."""
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(target))) as tmp:
+        db = sqlite3.connect(os.path.join(tmp, 'merge.sqlite'))
+        db.execute("PRAGMA journal_mode = OFF") # Scratch table, thrown away afterwards
+        db.execute("PRAGMA synchronous = OFF")
+        try:
+            db.execute("""
+                CREATE TABLE progress (
+                    seq INTEGER PRIMARY KEY,
+                    user TEXT NOT NULL, unique_id TEXT NOT NULL, status TEXT NOT NULL,
+                    status_rank INTEGER NOT NULL, richtig_count INTEGER NOT NULL, false_count INTEGER NOT NULL,
+                    UNIQUE (user, unique_id))
+            """)
+            _merge_rows(db, progress_rows(iter_user_data(target)))
+            n = _merge_rows(db, read_progress_rows(in_path, fmt))
+            db.execute("CREATE INDEX progress_order ON progress (user, seq)")
+            merged = db.execute("SELECT user, unique_id, status, richtig_count, false_count FROM progress ORDER BY user, seq")
+            write_user_data_stream(((user, unique_id, {'Status': status, 'Richtig Count': richtig, 'False Count': false})
+                                    for user, unique_id, status, richtig, false in merged), target)
+        finally:
+            db.close()
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import learner progress in bulk.")
+    parser.add_argument('command', choices=('export', 'import'))
+    parser.add_argument('path', help="Progress file (.csv, .parquet, .jsonl or a user_data .json)")
+    parser.add_argument('--format', choices=FORMATS, help="Override the format from the extension")
+    parser.add_argument('--store', default=PROGRESS_STORE, help="Progress store to read from / merge into (B2_PROGRESS_STORE)")
+    parser.add_argument('--target', help="Shorthand for --store json:TARGET")
+    args = parser.parse_args()
+    store = "json:" + args.target if args.target else args.store
+
+    if args.command == 'export':
+        n = export_progress(args.path, args.format, store)
+        print(f"Exported {n} rows to {args.path}")
+    else:
+        n = import_progress(args.path, args.format, store)
+        print(f"Merged {n} rows from {args.path} into {store}")
+
+if __name__ == "__main__":
+    main()
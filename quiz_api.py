@@ -0,0 +1,470 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+
+import quiz_core
+from answer_log import AnswerLogWriter
+from confusion_tracker import ConfusionTracker, load_confusions, save_confusions
+from progress_reconcile import reconcile_store, reconcile_user_data
+from progress_store import JsonProgressStore, open_progress_store
+from deck_snapshots import DECK_TTL
+from deck_ingest import DECK_INGEST, read_deck_streaming
+from metrics import (
+    ACTIVE_SESSIONS, ANSWERS, DECK_FETCH_ERRORS, DECK_LOADS, DECK_REQUESTS, FRAME_BUILD_SECONDS,
+    PROGRESS_READ_SECONDS, PROGRESS_WRITE_SECONDS, QUESTION_SELECT_SECONDS, observe_deck_load, start_metrics_server,
+)
+from shuffle_bag import ShuffleBag
+from frame_memo import FrameMemo, MAX_IDLE_SECONDS
+
+# Headless HTTP/JSON API over the quiz engine, for clients that don't need the Streamlit UI.
+#
+#   GET  /next?user=Guest&deck=b2&lektion=All&mode=Random   -> {"id", "quiz", "lektion", "choices"}
+#   POST /answer {"user", "deck", "id", "choice"}            -> {"correct", "word", "answer", "progress"}
+#   GET  /health
+#
+# Prometheus metrics (metrics.py) are served by a sidecar on B2_METRICS_PORT, if set.
+#
+# Run with: python quiz_api.py --port 8502
+
+DECK_RETRY_AFTER = 30 # Seconds before a failed background reload is tried again
+MAX_USERS = 10000     # Users whose state (progress, bags, samplers, ...) is kept; least recently seen go first
+MAX_FRAMES = 32       # Merged deck + progress frames kept (frame_memo.FrameMemo)
+SHARED_FRAME = None   # Frame memo "user" of the frame shared by everyone who hasn't answered anything
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+log = logging.getLogger("quiz_api")
+
+
+def _timed(series, call, *args):
+    """call(*args), observing its duration in a histogram series (run in the executor, so lock waits don't count)."""
+    with series.time():
+        return call(*args)
+
+def _json_default(value):
+    """numpy scalars from the deck (e.g. a numeric Lektion column) -> plain Python values."""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class ApiError(Exception):
+    """Raised by handlers to answer with an HTTP error status."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class UserState:
+    """What the engine keeps for one user."""
+    def __init__(self):
+        self.progress = None   # {Unique_ID: progress}, loaded on first use
+        self.confusions = None # ConfusionTracker, loaded on first use
+        self.issued = None     # (Unique_ID, time.monotonic()) of the last question /next served
+        self.samplers = {}     # (deck, lektion) -> (df_base, sampler, {Unique_ID: index label})
+        self.bags = {}         # (deck, lektion, mode) -> (df_base, ShuffleBag of index labels, {Unique_ID: index label})
+        self.lock = asyncio.Lock() # Frame, sampler and bag builds (in the executor) vs. answers updating them in place
+        self.last_used = 0.0
+
+
+class UserStates:
+    """
+    UserState per user name, LRU-bounded (max_users) with idle eviction (max_idle seconds), so
+    clients sending ever new user names can't grow the engine without limit. An evicted
+    persistent user is re-read from the progress store; an evicted guest starts over.
+    """
+    def __init__(self, max_users=MAX_USERS, max_idle=MAX_IDLE_SECONDS):
+        self.max_users = max_users
+        self.max_idle = max_idle
+        self.evictions = 0
+        self._states = OrderedDict() # user -> UserState, least recently used first
+
+    def get(self, username):
+        now = time.monotonic()
+        while self._states:
+            oldest = next(iter(self._states.values()))
+            if now - oldest.last_used < self.max_idle:
+                break
+            self._states.popitem(last=False)
+            self.evictions += 1
+        state = self._states.get(username)
+        if state is None:
+            state = self._states[username] = UserState()
+            while len(self._states) > self.max_users:
+                self._states.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._states.move_to_end(username)
+        state.last_used = now
+        return state
+
+    def items(self):
+        return list(self._states.items())
+
+    def __len__(self):
+        return len(self._states)
+
+
+class QuizEngine:
+    """
+    Deck and progress state behind the API. Decks are loaded with quiz_core.read_deck (or
+    deck_ingest.read_deck_streaming with B2_DECK_INGEST=stream) and reloaded in the background after DECK_TTL seconds; progress follows update_quiz_progress:
+    persistent users are written to the progress store (B2_PROGRESS_STORE, or a JSON store on
+    user_data_file if given), everyone else only lives in memory. Per-user state is bounded by
+    max_users and the merged frames by max_frames; users who haven't answered anything share one frame.
+    """
+    def __init__(self, decks=None, user_data_file=None, seed=None, answer_log=None, progress_store=None,
+                 max_users=MAX_USERS, max_frames=MAX_FRAMES):
+        self.decks = dict(decks or quiz_core.DECKS)
+        self.answer_log = answer_log
+        if progress_store is None:
+            progress_store = JsonProgressStore(user_data_file) if user_data_file else open_progress_store()
+        self.store = progress_store
+        self.rng = random.Random(seed)
+        self._decks = {}       # deck -> (loaded_at, df, {Unique_ID: index label})
+        self._deck_locks = {}  # deck -> asyncio.Lock, so one load per deck at a time
+        self._deck_refreshes = {} # deck -> asyncio.Task reloading a stale deck
+        self._users = UserStates(max_users)
+        self._frames = FrameMemo(max_frames) # (user or SHARED_FRAME, deck version, 0) -> df_with_progress, updated in place
+        self._frame_builds = {} # frame memo key -> executor future merging it, shared by concurrent requests
+        self._partitions = {}  # deck -> (df_base, LektionPartition)
+        self._file_lock = asyncio.Lock()
+
+    async def get_deck(self, deck):
+        """
+        (loaded_at, df, {Unique_ID: index label}) of a deck. A deck older than DECK_TTL is still
+        served while one background task per deck reloads it (stale-while-revalidate); only the
+        very first load is waited for, and concurrent first requests share it.
+        """
+        if deck not in self.decks:
+            raise ApiError(404, f"Unknown deck '{deck}'")
+        cached = self._decks.get(deck)
+        if cached is None:
+            DECK_REQUESTS.labels('miss').inc()
+            return await self._load_deck(deck)
+        if time.monotonic() - cached[0] < DECK_TTL:
+            DECK_REQUESTS.labels('hit').inc()
+            return cached
+        DECK_REQUESTS.labels('stale').inc()
+        if deck not in self._deck_refreshes:
+            task = asyncio.get_running_loop().create_task(self._load_deck(deck))
+            self._deck_refreshes[deck] = task
+            task.add_done_callback(lambda task: self._deck_refreshed(deck, task))
+        return cached
+
+    def _deck_refreshed(self, deck, task):
+        del self._deck_refreshes[deck]
+        if not task.cancelled() and task.exception() is not None: # e.g. reconcile failed; the old deck stays
+            log.warning("Background reload of deck '%s' failed: %s", deck, task.exception())
+            self._retry_later(deck)
+
+    def _retry_later(self, deck):
+        """Keep serving the cached deck; the next reload starts DECK_RETRY_AFTER seconds from now."""
+        loaded_at, df, labels = self._decks[deck]
+        self._decks[deck] = (time.monotonic() - DECK_TTL + DECK_RETRY_AFTER, df, labels)
+        return self._decks[deck]
+
+    async def _load_deck(self, deck):
+        lock = self._deck_locks.setdefault(deck, asyncio.Lock())
+        async with lock:
+            cached = self._decks.get(deck)
+            if cached and time.monotonic() - cached[0] < DECK_TTL:
+                return cached
+            loop = asyncio.get_running_loop()
+            try:
+                read = read_deck_streaming if DECK_INGEST == 'stream' else quiz_core.read_deck
+                df = await loop.run_in_executor(None, read, self.decks[deck])
+            except Exception as e:
+                DECK_FETCH_ERRORS.inc()
+                if cached: # Keep serving the old deck if the refresh fails
+                    return self._retry_later(deck)
+                raise ApiError(503, f"Cannot load deck '{deck}': {e}")
+            DECK_LOADS.labels('sheet').inc()
+            observe_deck_load(df)
+            previous_df = cached[1] if cached else None
+            if previous_df is None or quiz_core.deck_version(previous_df) != quiz_core.deck_version(df):
+                await self.reconcile_progress(df, previous_df)
+            cached = (time.monotonic(), df, dict(zip(df['Unique_ID'], df.index)))
+            self._decks[deck] = cached
+            return cached
+
+    async def reconcile_progress(self, df, previous_df):
+        """
+        Carries progress of renamed rows over to a new deck version and drops orphans, in the
+        file and in memory. Progress is shared by all decks, so this only runs with a single deck.
+        """
+        if len(self.decks) != 1:
+            return
+        loop = asyncio.get_running_loop()
+        async with self._file_lock:
+            await loop.run_in_executor(None, reconcile_store, self.store, df, previous_df)
+        guests = {}
+        for username, state in self._users.items():
+            if quiz_core.is_persistent_user(username):
+                state.progress = None # Re-read from the reconciled file on next use
+            elif state.progress:
+                guests[username] = state.progress
+        previous_ids = previous_df['Unique_ID'].tolist() if previous_df is not None else None
+        reconcile_user_data(guests, df['Unique_ID'].tolist(), previous_ids)
+
+    async def get_user_progress(self, username):
+        state = self._users.get(username)
+        if state.progress is None:
+            progress = {}
+            if quiz_core.is_persistent_user(username):
+                loop = asyncio.get_running_loop()
+                async with self._file_lock:
+                    progress = await loop.run_in_executor(None, _timed, PROGRESS_READ_SECONDS.labels(self.store.backend),
+                                                          self.store.get_many, username)
+            state.progress = progress
+        return state.progress
+
+    async def get_confusions(self, username):
+        state = self._users.get(username)
+        if state.confusions is None:
+            tracker = ConfusionTracker()
+            if quiz_core.is_persistent_user(username):
+                tracker = await asyncio.get_running_loop().run_in_executor(None, load_confusions, username)
+            state.confusions = tracker
+        return state.confusions
+
+    def _frame_key(self, username, df_base, progress):
+        owner = username if progress or quiz_core.is_persistent_user(username) else SHARED_FRAME
+        return (owner, quiz_core.deck_version(df_base), 0)
+
+    async def get_frame(self, username, deck):
+        """
+        The user's merged frame. A memo hit is served on the event loop; a miss runs merge_progress
+        in the executor, once however many requests wait for the same frame.
+        """
+        _, df_base, _ = await self.get_deck(deck)
+        progress = await self.get_user_progress(username)
+        key = self._frame_key(username, df_base, progress)
+        frame = self._frames.lookup(key)
+        if frame is not None:
+            return frame
+        build = self._frame_builds.get(key)
+        if build is None:
+            snapshot = dict(progress) # A guest reconcile may change progress on the loop meanwhile
+            def merge():
+                with FRAME_BUILD_SECONDS.labels('api').time():
+                    return self._frames.put(key, quiz_core.merge_progress(df_base, snapshot))
+            build = self._frame_builds[key] = asyncio.get_running_loop().run_in_executor(None, merge)
+            build.add_done_callback(lambda _: self._frame_builds.pop(key, None))
+        return await asyncio.shield(build)
+
+    async def get_partition(self, deck, df_base):
+        cached = self._partitions.get(deck)
+        if cached is None or cached[0] is not df_base:
+            partition = await asyncio.get_running_loop().run_in_executor(None, quiz_core.LektionPartition, df_base)
+            cached = (df_base, partition)
+            self._partitions[deck] = cached
+        return cached[1]
+
+    def _build_bag(self, frame, lektion, mode, partition):
+        """(ShuffleBag of the candidates' index labels in their tiers, {Unique_ID: index label}); runs in the executor."""
+        candidates = partition.take(frame, lektion)
+        tiers = quiz_core.question_tiers(candidates, mode).tolist()
+        return (ShuffleBag(dict(zip(candidates.index, tiers)), rng=self.rng),
+                dict(zip(candidates['Unique_ID'], candidates.index)))
+
+    async def next_question(self, username, deck, lektion, mode):
+        if mode not in quiz_core.SORT_OPTIONS:
+            raise ApiError(400, f"Unknown mode '{mode}'. Use one of: {', '.join(quiz_core.SORT_OPTIONS)}")
+        ACTIVE_SESSIONS.touch('api', username)
+        _, df_base, _ = await self.get_deck(deck)
+        state = self._users.get(username)
+        loop = asyncio.get_running_loop()
+        async with state.lock:
+            # Builds run in the executor; a cached sampler or bag draws on the loop in O(1).
+            frame = await self.get_frame(username, deck)
+            with QUESTION_SELECT_SECONDS.labels('api', mode).time():
+                partition = await self.get_partition(deck, df_base)
+                if mode == quiz_core.WEIGHTED_MODE:
+                    cached = state.samplers.get((deck, lektion))
+                    if cached is None or cached[0] is not df_base:
+                        cached = (df_base, *await loop.run_in_executor(None, quiz_core.build_weighted_sampler,
+                                                                       frame, lektion, partition))
+                        state.samplers[(deck, lektion)] = cached
+                    _, sampler, labels = cached
+                    unique_id = sampler.sample(self.rng)
+                    if unique_id is None:
+                        raise ApiError(404, "No questions match your current filters.")
+                    question_row = df_base.loc[labels[unique_id]]
+                else:
+                    cached = state.bags.get((deck, lektion, mode))
+                    if cached is None or cached[0] is not df_base:
+                        cached = (df_base, *await loop.run_in_executor(None, self._build_bag, frame, lektion, mode, partition))
+                        state.bags[(deck, lektion, mode)] = cached
+                    label = cached[1].next()
+                    if label is None:
+                        raise ApiError(404, "No questions match your current filters.")
+                    question_row = df_base.loc[label]
+        confusions = await self.get_confusions(username)
+        self._users.get(username).issued = (question_row['Unique_ID'], time.monotonic())
+        return {
+            'id': question_row['Unique_ID'],
+            'quiz': question_row['Quiz'],
+            'lektion': question_row['Lektion'],
+            'choices': quiz_core.pick_choices(df_base, question_row['Word'], self.rng, confusions.top(question_row['Word'], 3)),
+        }
+
+    async def answer(self, username, deck, unique_id, choice):
+        _, df_base, labels = await self.get_deck(deck)
+        if unique_id not in labels:
+            raise ApiError(404, f"Unknown question id '{unique_id}'")
+        label = labels[unique_id]
+        word = df_base.at[label, 'Word']
+        is_correct = choice == word
+        ACTIVE_SESSIONS.touch('api', username)
+        ANSWERS.labels('api', is_correct).inc()
+
+        state = self._users.get(username)
+        async with state.lock: # Not while a build reads this user's progress or frame
+            progress = await self.get_user_progress(username)
+            frame_key = self._frame_key(username, df_base, progress) # Before this answer: maybe the shared frame
+            if quiz_core.is_persistent_user(username):
+                loop = asyncio.get_running_loop()
+                async with self._file_lock:
+                    current = await loop.run_in_executor(None, _timed, PROGRESS_WRITE_SECONDS.labels(self.store.backend),
+                                                         self.store.increment, username, unique_id, is_correct)
+                progress[unique_id] = current
+            else:
+                current = quiz_core.apply_answer(progress.setdefault(unique_id, quiz_core.new_progress()), is_correct)
+
+            if not is_correct:
+                confusions = await self.get_confusions(username)
+                confusions.record(word, choice)
+                if quiz_core.is_persistent_user(username):
+                    loop = asyncio.get_running_loop()
+                    async with self._file_lock:
+                        await loop.run_in_executor(None, save_confusions, username, confusions)
+
+            frame = self._frames.peek(frame_key) if frame_key[0] is not SHARED_FRAME else None
+            if frame is not None: # The shared frame stays as it is; this user gets a frame of their own next time
+                frame.at[label, 'Status'] = current['Status']
+                frame.at[label, 'Richtig Count'] = current['Richtig Count']
+                frame.at[label, 'False Count'] = current['False Count']
+            for (sampler_deck, _), (sampler_base, sampler, _) in state.samplers.items():
+                if sampler_deck == deck and sampler_base is df_base:
+                    sampler.record_answer(unique_id, is_correct)
+            for (bag_deck, _, mode), (bag_base, bag, bag_labels) in state.bags.items():
+                if bag_deck == deck and bag_base is df_base and unique_id in bag_labels:
+                    bag.update(bag_labels[unique_id], quiz_core.question_tier(current, mode))
+
+        if self.answer_log is not None:
+            issued_id, issued_at = state.issued or (None, None)
+            if issued_id != unique_id:
+                issued_at = None
+            self.answer_log.log(
+                username, unique_id, df_base.at[label, 'Lektion'], word, choice, is_correct,
+                response_ms=(time.monotonic() - issued_at) * 1000 if issued_at else None,
+                deck_version=quiz_core.deck_version(df_base), mode='api',
+            )
+
+        return {'correct': is_correct, 'word': word, 'answer': df_base.at[label, 'Answer'], 'progress': dict(current)}
+
+
+class QuizApiServer:
+    """Minimal keep-alive HTTP/1.1 server on asyncio streams; routes to a QuizEngine."""
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def dispatch(self, method, target, body):
+        parts = urlsplit(target)
+        if parts.path == '/health':
+            return 200, {'status': 'ok'}
+        if parts.path == '/next':
+            if method != 'GET':
+                raise ApiError(405, "Use GET /next")
+            query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+            return 200, await self.engine.next_question(
+                query.get('user', 'Guest'),
+                query.get('deck', quiz_core.DEFAULT_DECK),
+                query.get('lektion', 'All'),
+                query.get('mode', 'Random'),
+            )
+        if parts.path == '/answer':
+            if method != 'POST':
+                raise ApiError(405, "Use POST /answer")
+            try:
+                payload = json.loads(body or b'{}')
+            except json.JSONDecodeError:
+                raise ApiError(400, "Body must be JSON")
+            if not isinstance(payload, dict) or 'id' not in payload or 'choice' not in payload:
+                raise ApiError(400, "Body needs 'id' and 'choice'")
+            for field in ('id', 'choice', 'user', 'deck'):
+                if field in payload and not isinstance(payload[field], str):
+                    raise ApiError(400, f"'{field}' must be a string")
+            return 200, await self.engine.answer(
+                payload.get('user', 'Guest'),
+                payload.get('deck', quiz_core.DEFAULT_DECK),
+                payload['id'],
+                payload['choice'],
+            )
+        raise ApiError(404, f"No route for {parts.path}")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length') or 0))
+
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except ApiError as e:
+                    status, payload = e.status, {'error': e.message}
+                except Exception: # e.g. the progress store is unreachable; the connection stays usable
+                    log.exception("%s %s failed", method, target)
+                    status, payload = 500, {'error': "Internal error"}
+
+                data = json.dumps(payload, ensure_ascii=False, default=_json_default).encode('utf-8')
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                        f"Content-Type: application/json; charset=utf-8\r\n"
+                        f"Content-Length: {len(data)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+                writer.write(head.encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless HTTP/JSON API for the B2 Goethe quiz.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    print(f"Quiz API listening on http://{args.host}:{args.port} (deck: {quiz_core.SHEET_URL})", flush=True)
+    start_metrics_server()
+    asyncio.run(QuizApiServer(QuizEngine(answer_log=AnswerLogWriter())).serve(args.host, args.port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+import os
+import csv
+import json
+import time
+import hashlib
+import urllib.request
+import random
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError: # Windows: FileLock only serializes threads of one process
+    fcntl = None
+
+from weighted_sampler import ErrorWeightedSampler
+from deck_validation import validate_deck
+
+# Quiz engine shared by the Streamlit app and the HTTP API (no Streamlit imports here)
+
+# URL ของ Google Sheet ของคุณ (override with B2_SHEET_URL, e.g. a local CSV for load tests)
+SHEET_URL = os.environ.get(
+    "B2_SHEET_URL",
+    "https://docs.google.com/spreadsheets/d/1nvX2mTrJO49VykgzNtpdpcTmtbIrXmYOjoFD7ro1T54/export?format=csv",
+)
+
+# Named decks served by the API; the Streamlit app uses the default one
+DECKS = {"b2": SHEET_URL}
+DEFAULT_DECK = "b2"
+
+# ไฟล์สำหรับเก็บสถานะผู้ใช้และคำถาม
+USER_DATA_FILE = os.environ.get("B2_USER_DATA_FILE", 'user_data.json')
+
+# Only these users get their progress written to USER_DATA_FILE
+PERSISTENT_USERS = ("Faeng",)
+
+# Progress statuses in the order an item goes through them (used when two entries are combined)
+STATUS_ORDER = {'not started yet': 0, 'done': 1}
+
+# At most this many of the three distractors come from the learner's confusion history
+MAX_CONFUSED_DISTRACTORS = 2
+
+WEIGHTED_MODE = "Weighted by Errors"
+SORT_OPTIONS = ("Random", "Not Started Yet", "False Count > 0", "By Lektion", WEIGHTED_MODE)
+FALLBACK_TIER = 2 # question_tier of "False Count > 0" items with no wrong answers (served only if nothing else is)
+
+# The process umask (only readable by setting it), for files atomic_write creates
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+
+
+def is_persistent_user(username):
+    """Whether this user's progress is saved to USER_DATA_FILE."""
+    return username in PERSISTENT_USERS
+
+def open_sheet(url):
+    """The sheet CSV as a binary file object (url may also be a local path)."""
+    if url.startswith(('http://', 'https://')):
+        return urllib.request.urlopen(url, timeout=60)
+    return open(url, 'rb')
+
+class SheetStream:
+    """Binary file wrapper that hashes every byte read from it (the deck version) and can peek at the header row."""
+    def __init__(self, source):
+        self.source = source
+        self.digest = hashlib.sha1()
+        self._buffer = b''
+
+    def header(self):
+        """Column names from the first line, without consuming it."""
+        while b'\n' not in self._buffer:
+            more = self.source.read(1 << 16)
+            if not more:
+                break
+            self._buffer += more
+        first_line = self._buffer.split(b'\n', 1)[0].decode('utf-8-sig')
+        return next(csv.reader([first_line]), [])
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data, self._buffer = self._buffer + self.source.read(), b''
+        elif self._buffer:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+            if len(data) < size:
+                data += self.source.read(size - len(data))
+        else:
+            data = self.source.read(size)
+        self.digest.update(data)
+        return data
+
+    def readable(self):
+        return True
+
+    @property
+    def closed(self):
+        return self.source.closed
+
+    def close(self):
+        self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def read_deck(url):
+    """
+    Read the sheet CSV, validate it and add the Unique_ID and default progress columns.
+    The validation report and load timings are kept in df.attrs. Raises on failure.
+    """
+    started = time.perf_counter()
+    with SheetStream(open_sheet(url)) as stream:
+        df = pd.read_csv(stream)
+        stream.read() # Whatever the parser left, so the hash covers the whole file
+    fetched = time.perf_counter()
+    # Drop rows where 'Quiz' or 'Word' or 'Answer' or 'Lektion' is empty, and duplicate Quiz::Word pairs
+    # Keyed by the CSV bytes, so deck_ingest.read_deck_streaming gets the same version for the same sheet
+    df, validation, validation_cached = validate_deck(df, key=stream.digest.hexdigest())
+    validated = time.perf_counter()
+    # Create a unique ID for each row based on Quiz and Word for persistent tracking
+    df['Unique_ID'] = df['Quiz'] + "::" + df['Word']
+    add_progress_columns(df)
+    # Content-addressed: the same sheet content always gets the same version
+    df.attrs['deck_version'] = validation['sheet_hash'][:16]
+    df.attrs['validation'] = validation
+    df.attrs['load_metrics'] = {
+        'rows': len(df),
+        'fetch_seconds': fetched - started,
+        'validation_seconds': validated - fetched,
+        'validation_cached': validation_cached,
+        'process_seconds': time.perf_counter() - validated,
+    }
+    return df
+
+def add_progress_columns(df):
+    """Default progress columns for a deck nobody has answered yet (in place; returns df)."""
+    df['Status'] = 'not started yet'
+    df['Richtig Count'] = 0
+    df['False Count'] = 0
+    return df
+
+def compute_deck_version(df):
+    """Fingerprint of the deck's Unique_IDs, for frames that didn't come from read_deck."""
+    return format(int(pd.util.hash_pandas_object(df['Unique_ID'], index=False).sum()) & 0xFFFFFFFFFFFFFFFF, '016x')
+
+def deck_version(df):
+    """The deck version stored by read_deck (computed if the frame doesn't carry one)."""
+    return df.attrs.get('deck_version') or compute_deck_version(df)
+
+def read_user_data(path=USER_DATA_FILE):
+    """Read the progress file. Raises json.JSONDecodeError if it is corrupt."""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def atomic_write(path, write):
+    """
+    Calls write(tmp_path) on a fresh temporary file next to path, then renames it over path, so
+    readers see the old file or the new one, never half of it. The temporary file is removed if
+    write fails.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        os.chmod(tmp_path, 0o666 & ~UMASK) # mkstemp makes it 0600; give it the mode open() would
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class FileLock:
+    """
+    Exclusive lock on a sidecar lock file, across processes (flock) and threads of this one.
+    Degrades to the thread lock without fcntl or on a read-only disk.
+    """
+    _thread_locks = {}
+    _thread_locks_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+        with FileLock._thread_locks_lock: # flock is per open file, so threads need their own lock
+            self._thread_lock = FileLock._thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self.f = open(self.path, 'a')
+                fcntl.flock(self.f, fcntl.LOCK_EX)
+            except OSError:
+                if self.f is not None:
+                    self.f.close()
+                self.f = None
+        return self
+
+    def __exit__(self, *exc):
+        if self.f is not None:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+            self.f.close()
+            self.f = None
+        self._thread_lock.release()
+        return False
+
+def write_user_data(data, path=USER_DATA_FILE):
+    """Write the progress file atomically, so a concurrent reader never sees it half-written."""
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+    atomic_write(path, write)
+
+def new_progress():
+    """Progress entry for a quiz item the user has not answered yet."""
+    return {'Status': 'not started yet', 'Richtig Count': 0, 'False Count': 0}
+
+def status_rank(status):
+    """Order of progress statuses: 'done' is later than 'not started yet' (unknown ones rank with 'done')."""
+    return STATUS_ORDER.get(status, max(STATUS_ORDER.values()))
+
+def combine_progress(first, second):
+    """One entry from two entries for the same item: counts summed, the later status (second's on a tie)."""
+    first_status = first.get('Status', 'not started yet')
+    second_status = second.get('Status', 'not started yet')
+    return {
+        'Status': second_status if status_rank(second_status) >= status_rank(first_status) else first_status,
+        'Richtig Count': int(first.get('Richtig Count', 0)) + int(second.get('Richtig Count', 0)),
+        'False Count': int(first.get('False Count', 0)) + int(second.get('False Count', 0)),
+    }
+
+def apply_answer(progress, is_correct):
+    """Count one answer into a progress entry (in place) and return it."""
+    if is_correct:
+        progress['Richtig Count'] = int(progress.get('Richtig Count', 0)) + 1
+    else:
+        progress['False Count'] = int(progress.get('False Count', 0)) + 1
+    progress['Status'] = 'done'
+    return progress
+
+def merge_progress(df_base, user_progress):
+    """
+    Returns a copy of the deck with Status / Richtig Count / False Count taken from
+    user_progress ({Unique_ID: progress}). Items without progress keep the defaults.
+    """
+    df_copy = df_base.copy()
+    ids = df_copy['Unique_ID']
+    if user_progress:
+        known = ids.map(lambda uid: user_progress.get(uid))
+        has_progress = known.notna()
+        if has_progress.any():
+            entries = known[has_progress]
+            df_copy.loc[has_progress, 'Status'] = entries.map(lambda p: p.get('Status', 'not started yet'))
+            df_copy.loc[has_progress, 'Richtig Count'] = entries.map(lambda p: int(p.get('Richtig Count', 0)))
+            df_copy.loc[has_progress, 'False Count'] = entries.map(lambda p: int(p.get('False Count', 0)))
+    df_copy['Richtig Count'] = pd.to_numeric(df_copy['Richtig Count'], errors='coerce').fillna(0).astype(int)
+    df_copy['False Count'] = pd.to_numeric(df_copy['False Count'], errors='coerce').fillna(0).astype(int)
+    return df_copy
+
+class LektionPartition:
+    """
+    Row positions of every Lektion of one deck, computed once when the deck is loaded, so a
+    Lektion filter is a dict lookup plus an iloc take instead of a full-column comparison.
+    """
+    def __init__(self, df_base):
+        codes, uniques = pd.factorize(df_base['Lektion'], sort=True)
+        order = np.argsort(codes, kind='stable') # Positions grouped by Lektion, deck order within each
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        self.n_rows = len(df_base)
+        self.lektions = uniques.tolist() # Sorted, for the Lektion selectbox
+        self.positions = {lektion: order[bounds[i]:bounds[i + 1]] for i, lektion in enumerate(self.lektions)}
+
+    def take(self, df, lektion_filter):
+        """
+        Rows of df in lektion_filter ("All" or None: all of df). df must have the deck's rows in
+        the deck's order (the deck itself or merge_progress of it); anything else is filtered by value.
+        """
+        if not lektion_filter or lektion_filter == "All":
+            return df
+        if len(df) != self.n_rows:
+            return df[df['Lektion'] == lektion_filter]
+        positions = self.positions.get(lektion_filter)
+        return df.iloc[positions] if positions is not None else df.iloc[:0]
+
+def select_questions(df_with_progress, sort_option, lektion_filter, partition=None):
+    """
+    Filters and sorts the DataFrame based on the selected options.
+    Returns (filtered_df, used_fallback); used_fallback is True when "False Count > 0"
+    found nothing and the whole Lektion filter is returned instead.
+    WEIGHTED_MODE only applies the Lektion filter; the draw is done by ErrorWeightedSampler.
+    The review subsets are not sorted: a question is sampled from them, so order doesn't matter.
+    partition is the deck's LektionPartition, if the caller has one.
+    """
+    if df_with_progress.empty:
+        return pd.DataFrame(), False
+
+    filtered_df = df_with_progress
+
+    if lektion_filter and lektion_filter != "All":
+        if partition is not None:
+            filtered_df = partition.take(filtered_df, lektion_filter)
+        else:
+            filtered_df = filtered_df[filtered_df['Lektion'] == lektion_filter]
+
+    if sort_option == "Not Started Yet":
+        not_started = filtered_df[filtered_df['Status'] == 'not started yet']
+        if not not_started.empty:
+            filtered_df = not_started
+        else:
+            questions_to_review = filtered_df[filtered_df['False Count'] > 0]
+            if not questions_to_review.empty:
+                filtered_df = questions_to_review
+
+    elif sort_option == "False Count > 0":
+        questions_to_review_specific = filtered_df[(filtered_df['False Count'] > 0) & (filtered_df['Richtig Count'] == 0)]
+
+        if not questions_to_review_specific.empty:
+            filtered_df = questions_to_review_specific
+        else:
+            questions_with_any_false = filtered_df[filtered_df['False Count'] > 0]
+            if not questions_with_any_false.empty:
+                filtered_df = questions_with_any_false
+            else:
+                return filtered_df, True
+
+    elif sort_option == "By Lektion":
+        filtered_df = filtered_df.sort_values(by='Lektion')
+
+    return filtered_df, False
+
+def question_tier(progress, sort_option):
+    """
+    Tier of one item's progress for a non-weighted mode; select_questions keeps the items of
+    the lowest tier present. "Not Started Yet": 0 not started, 1 answered wrong before, 2 the
+    rest; "False Count > 0": 0 only wrong so far, 1 wrong at least once, 2 (FALLBACK_TIER) the
+    rest; other modes: 0.
+    """
+    progress = progress or {}
+    false_count = int(progress.get('False Count', 0))
+    if sort_option == "Not Started Yet":
+        return 0 if progress.get('Status', 'not started yet') == 'not started yet' else 1 if false_count > 0 else 2
+    if sort_option == "False Count > 0":
+        return (0 if not int(progress.get('Richtig Count', 0)) else 1) if false_count > 0 else FALLBACK_TIER
+    return 0
+
+def question_tiers(df_with_progress, sort_option):
+    """question_tier of every row, as an array (one vectorized pass)."""
+    false = df_with_progress['False Count'].to_numpy() > 0
+    if sort_option == "Not Started Yet":
+        return np.where(df_with_progress['Status'].to_numpy() == 'not started yet', 0, np.where(false, 1, 2))
+    if sort_option == "False Count > 0":
+        return np.where(false, np.where(df_with_progress['Richtig Count'].to_numpy() == 0, 0, 1), FALLBACK_TIER)
+    return np.zeros(len(df_with_progress), dtype=int)
+
+def build_weighted_sampler(df_with_progress, lektion_filter, partition=None):
+    """ErrorWeightedSampler over the Lektion-filtered deck, plus a {Unique_ID: index label} map."""
+    candidates, _ = select_questions(df_with_progress, WEIGHTED_MODE, lektion_filter, partition)
+    if candidates.empty:
+        return ErrorWeightedSampler([], [], []), {}
+    sampler = ErrorWeightedSampler(candidates['Unique_ID'], candidates['False Count'], candidates['Richtig Count'])
+    return sampler, dict(zip(candidates['Unique_ID'], candidates.index))
+
+def pick_choices(df_base, correct_answer, rng=random, confused=()):
+    """
+    Three distractor words from the deck plus the correct one, shuffled. Up to
+    MAX_CONFUSED_DISTRACTORS of them are taken from confused (words the learner has picked
+    instead of this one before, most confused first); the rest are random.
+    """
+    incorrect_words_pool = df_base[df_base['Word'] != correct_answer]['Word'].unique().tolist()
+
+    distractors = []
+    if confused:
+        pool = set(incorrect_words_pool)
+        distractors = [word for word in confused if word in pool][:MAX_CONFUSED_DISTRACTORS]
+
+    n_random = min(3, len(incorrect_words_pool)) - len(distractors)
+    if n_random > 0:
+        extra = rng.sample(incorrect_words_pool, min(len(incorrect_words_pool), n_random + len(distractors)))
+        distractors += [word for word in extra if word not in distractors][:n_random]
+
+    choices = distractors + [correct_answer]
+    rng.shuffle(choices)
+    return choices
+
+def apply_answers(user_progress, results):
+    """Count a batch of (unique_id, is_correct) answers into {Unique_ID: progress} (in place)."""
+    for unique_id, is_correct in results:
+        apply_answer(user_progress.setdefault(unique_id, new_progress()), is_correct)
+    return user_progress
+
+def draw_exam(candidates, df_base, n, rng=None, n_distractors=3):
+    """
+    Draws n distinct questions from candidates plus their distractors in one vectorized pass.
+    Returns a list of dicts (Unique_ID, Quiz, Word, Answer, Lektion, choices) that can be kept
+    in session state and served without touching the deck again.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    n = min(int(n), len(candidates))
+    if n <= 0:
+        return []
+
+    picks = rng.choice(len(candidates), size=n, replace=False)
+    rows = candidates.iloc[picks]
+
+    vocab = np.asarray(pd.unique(df_base['Word']), dtype=object)
+    correct_idx = pd.Index(vocab).get_indexer(rows['Word'])
+    k = min(n_distractors, len(vocab) - 1)
+
+    if k > 0:
+        # Draw from the vocabulary minus the correct word, then redraw the (rare) rows with repeats
+        distractor_idx = np.empty((n, k), dtype=np.int64)
+        todo = np.arange(n)
+        while todo.size:
+            draw = rng.integers(0, len(vocab) - 1, size=(todo.size, k))
+            draw += draw >= correct_idx[todo, None]
+            ordered = np.sort(draw, axis=1)
+            ok = (ordered[:, 1:] != ordered[:, :-1]).all(axis=1)
+            distractor_idx[todo[ok]] = draw[ok]
+            todo = todo[~ok]
+        choice_idx = np.concatenate([distractor_idx, correct_idx[:, None]], axis=1)
+    else:
+        choice_idx = correct_idx[:, None]
+
+    # Shuffle each row of choices independently
+    order = np.argsort(rng.random(choice_idx.shape), axis=1)
+    choices = vocab[np.take_along_axis(choice_idx, order, axis=1)]
+
+    exam = rows[['Unique_ID', 'Quiz', 'Word', 'Answer', 'Lektion']].to_dict('records')
+    for question, question_choices in zip(exam, choices.tolist()):
+        question['choices'] = question_choices
+    return exam
+
+def score_exam(exam, responses):
+    """
+    Scores all responses at once. responses is a list aligned with exam (None = unanswered).
+    Returns a boolean numpy array, True where the response matches the question's Word.
+    """
+    words = np.array([question['Word'] for question in exam], dtype=object)
+    return np.array(responses, dtype=object) == words
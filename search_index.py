@@ -0,0 +1,92 @@
+import re
+import math
+import heapq
+import bisect
+
+from word_index import normalize
+
+# Full-text search over the deck's Quiz, Word and Answer text. Tokens are folded like typed
+# answers (case, umlauts, ß, accents), so "grosse" finds "Größe". Built once per deck version:
+#   postings: token -> {row position: weighted term frequency}
+#   tokens:   sorted token list, so the last query word can match as a prefix while typing
+# Results are ranked with BM25-style scoring; a match in Word counts more than one in the sentences.
+
+FIELD_WEIGHTS = {'Word': 3.0, 'Quiz': 1.0, 'Answer': 1.0}
+TOKEN_SPLIT = re.compile(r"[^\w]+")
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text, folded=None):
+    """Folded tokens of a text (empty tokens dropped). folded is an optional raw -> folded memo."""
+    if folded is None:
+        return [token for token in (normalize(part) for part in TOKEN_SPLIT.split(str(text))) if token]
+    tokens = []
+    for part in TOKEN_SPLIT.split(str(text)):
+        token = folded.get(part)
+        if token is None:
+            token = folded[part] = normalize(part)
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+class SearchIndex:
+    """Inverted index over one deck. Results are row positions (for df.iloc)."""
+    def __init__(self, df):
+        self.postings = {}
+        self.lengths = []
+        columns = [df[field].astype(str).tolist() for field in FIELD_WEIGHTS]
+        weights = list(FIELD_WEIGHTS.values())
+        folded = {} # Deck sentences repeat most words, fold each spelling once
+        for position, texts in enumerate(zip(*columns)):
+            length = 0.0
+            for text, weight in zip(texts, weights):
+                for token in tokenize(text, folded):
+                    row_postings = self.postings.setdefault(token, {})
+                    row_postings[position] = row_postings.get(position, 0.0) + weight
+                    length += weight
+            self.lengths.append(length)
+        self.n_rows = len(self.lengths)
+        self.average_length = (sum(self.lengths) / self.n_rows) if self.n_rows else 0.0
+        self.tokens = sorted(self.postings)
+        # BM25 length normalisation per row, precomputed so a query only does lookups and adds
+        self.norms = [K1 * (1 - B + B * length / self.average_length) for length in self.lengths]
+
+    def _expand(self, token, prefix):
+        if not prefix:
+            return [token] if token in self.postings else []
+        start = bisect.bisect_left(self.tokens, token)
+        end = bisect.bisect_left(self.tokens, token + "\U0010ffff")
+        return self.tokens[start:end]
+
+    def search(self, query, limit=20):
+        """
+        Row positions matching every query word, best first, as [(position, score)].
+        The last word also matches longer tokens it is a prefix of.
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens or not self.n_rows:
+            return []
+
+        scores = None
+        for i, token in enumerate(query_tokens):
+            token_scores = {}
+            for match in self._expand(token, prefix=(i == len(query_tokens) - 1)):
+                row_postings = self.postings[match]
+                idf = math.log(1 + (self.n_rows - len(row_postings) + 0.5) / (len(row_postings) + 0.5))
+                norms = self.norms
+                for position, tf in row_postings.items():
+                    token_scores[position] = token_scores.get(position, 0.0) + idf * tf * (K1 + 1) / (tf + norms[position])
+            if scores is None:
+                scores = token_scores
+            else: # Every query word has to match
+                scores = {position: score + token_scores[position]
+                          for position, score in scores.items() if position in token_scores}
+            if not scores:
+                return []
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def match_positions(self, query):
+        """All matching row positions (unranked), e.g. to drill on every result."""
+        return [position for position, _ in self.search(query, limit=self.n_rows)]
@@ -0,0 +1,83 @@
+import random
+
+# Shuffle-bag question order for the non-weighted modes: every candidate comes up once, in
+# random order, before any of them comes up again. The bag is built once with its candidates
+# (deck index labels), each in a tier (quiz_core.question_tier: e.g. in "Not Started Yet",
+# 0 = not started, 1 = answered wrong before, 2 = the rest), and serves only the lowest tier
+# that has items, as select_questions would. A round is a precomputed permutation of that tier
+# consumed with a cursor, so a pick is O(1) instead of a DataFrame filter and .sample(n=1).
+# Answers move single items between tiers (update); items that left the tier being served are
+# skipped when the cursor reaches them, items that joined it are slipped into the part of the
+# round not served yet, and a new round starts lazily when the bag runs out or the served tier
+# changes.
+
+
+class ShuffleBag:
+    """Random order without repeats over items in tiers; only the lowest non-empty tier is served."""
+    def __init__(self, tiers=None, rng=random):
+        self.rng = rng
+        self.tier_of = {}
+        self.by_tier = {}
+        self.order = []
+        self.members = set()
+        self.cursor = 0 # order[:cursor] was served this round
+        self.round_tier = None
+        self.last = None
+        for item, tier in (tiers or {}).items():
+            self.update(item, tier)
+
+    def __len__(self):
+        return len(self.tier_of)
+
+    def tier(self):
+        """The tier being served (None if the bag is empty)."""
+        return min((tier for tier, items in self.by_tier.items() if items), default=None)
+
+    def update(self, item, tier):
+        """Put item in tier (new, or its progress changed); joining the tier being served adds it to this round."""
+        old = self.tier_of.get(item)
+        if old == tier:
+            return
+        if old is not None:
+            self.by_tier[old].discard(item)
+        self.tier_of[item] = tier
+        self.by_tier.setdefault(tier, set()).add(item)
+        if tier == self.round_tier:
+            self._add(item)
+
+    def _add(self, item):
+        """Put an item at a random place in the part of this round not served yet."""
+        if item in self.members:
+            return
+        self.members.add(item)
+        self.order.append(item)
+        j = self.rng.randint(self.cursor, len(self.order) - 1) # Inside-out Fisher-Yates keeps the order uniform
+        self.order[j], self.order[-1] = self.order[-1], self.order[j]
+
+    def next(self):
+        """The next item of the round in the tier being served, or None if the bag is empty."""
+        tier = self.tier()
+        if tier is None:
+            return None
+        if tier != self.round_tier:
+            self._reshuffle(tier)
+        for _ in range(2):
+            while self.cursor < len(self.order):
+                item = self.order[self.cursor]
+                self.cursor += 1
+                if self.tier_of[item] == tier:
+                    self.last = item
+                    return item
+            self._reshuffle(tier)
+        return None
+
+    def _reshuffle(self, tier):
+        """New round over the items of tier; never starts with the item served last."""
+        self.round_tier = tier
+        self.order = list(self.by_tier[tier])
+        self.members = set(self.order)
+        self.rng.shuffle(self.order)
+        if len(self.order) > 1 and self.order[0] == self.last:
+            j = self.rng.randrange(1, len(self.order))
+            self.order[0], self.order[j] = self.order[j], self.order[0]
+        self.cursor = 0
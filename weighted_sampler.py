@@ -0,0 +1,104 @@
+import random
+from collections import deque
+
+# Error-weighted question selection: items are drawn with probability proportional to a weight
+# built from False Count / Richtig Count, with recently answered items cooled down.
+# Weights live in a Fenwick (binary indexed) tree, so both an update and a draw are O(log n).
+
+COOLDOWN_SIZE = 5       # How many of the most recently answered items are cooled down
+COOLDOWN_FACTOR = 0.05  # Weight multiplier while an item is in the cooldown window
+
+
+class FenwickTree:
+    """Prefix sums over non-negative weights with O(log n) point updates and weighted search."""
+    def __init__(self, weights):
+        self.n = len(weights)
+        self.weights = [float(w) for w in weights]
+        self.tree = [0.0] * (self.n + 1)
+        for i in range(1, self.n + 1): # O(n) build
+            self.tree[i] += self.weights[i - 1]
+            parent = i + (i & -i)
+            if parent <= self.n:
+                self.tree[parent] += self.tree[i]
+        self.top_bit = 1 << (self.n.bit_length() - 1) if self.n else 0
+
+    def set(self, index, weight):
+        """Set the weight of item index (0-based)."""
+        delta = float(weight) - self.weights[index]
+        self.weights[index] = float(weight)
+        i = index + 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        """Sum of all weights."""
+        total, i = 0.0, self.n
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, target):
+        """Index of the first item whose running prefix sum exceeds target."""
+        pos, bit = 0, self.top_bit
+        while bit:
+            nxt = pos + bit
+            if nxt <= self.n and self.tree[nxt] <= target:
+                target -= self.tree[nxt]
+                pos = nxt
+            bit >>= 1
+        return min(pos, self.n - 1)
+
+
+def error_weight(false_count, richtig_count):
+    """Unseen items weigh 1; every wrong answer raises the weight, every right answer lowers it."""
+    return (1.0 + 2.0 * false_count) / (1.0 + richtig_count)
+
+
+class ErrorWeightedSampler:
+    """
+    Draws Unique_IDs by error weight. Built once from the user's progress for one filter,
+    then kept up to date with record_answer() instead of re-reading the DataFrame.
+    """
+    def __init__(self, unique_ids, false_counts, richtig_counts, cooldown_size=COOLDOWN_SIZE):
+        self.ids = list(unique_ids)
+        self.slot_of = {unique_id: slot for slot, unique_id in enumerate(self.ids)}
+        self.false_counts = [int(c) for c in false_counts]
+        self.richtig_counts = [int(c) for c in richtig_counts]
+        self.cooldown_size = min(cooldown_size, len(self.ids) // 2)
+        self.recent = deque()
+        self.tree = FenwickTree([error_weight(f, r) for f, r in zip(self.false_counts, self.richtig_counts)])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _refresh(self, slot):
+        weight = error_weight(self.false_counts[slot], self.richtig_counts[slot])
+        if slot in self.recent:
+            weight *= COOLDOWN_FACTOR
+        self.tree.set(slot, weight)
+
+    def sample(self, rng=random):
+        """Draw one Unique_ID (None if empty)."""
+        if not self.ids:
+            return None
+        return self.ids[self.tree.find(rng.random() * self.tree.total())]
+
+    def record_answer(self, unique_id, is_correct):
+        """Update the answered item's weight and move it into the cooldown window."""
+        slot = self.slot_of.get(unique_id)
+        if slot is None:
+            return
+        if is_correct:
+            self.richtig_counts[slot] += 1
+        else:
+            self.false_counts[slot] += 1
+
+        if self.cooldown_size:
+            if slot in self.recent:
+                self.recent.remove(slot)
+            self.recent.append(slot)
+            if len(self.recent) > self.cooldown_size:
+                self._refresh(self.recent.popleft())
+        self._refresh(slot)
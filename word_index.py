@@ -0,0 +1,100 @@
+import re
+import unicodedata
+
+# Typed-answer checking. Words are compared in a folded form (case, umlauts, ß, accents,
+# punctuation) and small typos are tolerated. WordIndex is built once per deck version:
+#   - exact: folded word -> deck words, an O(1) lookup
+#   - deletes: every folded word with one character removed -> folded words (symmetric-delete
+#     index), so "which deck words are one edit away?" is a handful of dict lookups instead
+#     of a scan or tree walk over the whole vocabulary.
+
+UMLAUTS = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss', 'ẞ': 'ss'})
+NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize(text):
+    """Folded form used for comparing answers: 'Größe ' -> 'groesse', 'Grösse' -> 'groesse'."""
+    text = str(text).casefold().translate(UMLAUTS)
+    text = unicodedata.normalize('NFKD', text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return NON_WORD.sub("", text)
+
+def tolerance(word):
+    """Edits allowed for a typed answer of this (folded) word: 0 up to 3 letters, 1 up to 7, else 2."""
+    if len(word) <= 3:
+        return 0
+    return 1 if len(word) <= 7 else 2
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance with adjacent transpositions; returns limit + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class WordIndex:
+    """Folded-word and one-edit neighbour index over the deck's Word column."""
+    def __init__(self, words):
+        self.exact = {}
+        for word in words:
+            self.exact.setdefault(normalize(word), []).append(word)
+        self.deletes = {}
+        for folded in self.exact:
+            for variant in _deletes(folded):
+                self.deletes.setdefault(variant, []).append(folded)
+
+    def __len__(self):
+        return len(self.exact)
+
+    def near(self, typed):
+        """Deck words whose folded form is at most one edit away from typed, exact matches first."""
+        folded = normalize(typed)
+        if not folded:
+            return []
+        matches = list(self.exact.get(folded, []))
+        candidates = set(self.deletes.get(folded, ()))  # typed has one letter missing
+        for variant in _deletes(folded):
+            candidates.update(self.deletes.get(variant, ()))  # substitution / transposition
+            if variant in self.exact:  # typed has one letter too many
+                candidates.add(variant)
+        candidates.discard(folded)
+        for candidate in sorted(candidates):
+            if edit_distance(folded, candidate, 1) <= 1:
+                matches.extend(self.exact[candidate])
+        return matches
+
+    def check(self, typed, expected):
+        """
+        Compares a typed answer with the expected word. Returns (verdict, hint):
+          'exact'   - identical after folding (case, umlauts, ß, punctuation)
+          'close'   - within the typo tolerance; counts as correct
+          'wrong'   - hint is another deck word the typed text is close to (or None)
+        """
+        typed_folded, expected_folded = normalize(typed), normalize(expected)
+        if typed_folded and typed_folded == expected_folded:
+            return 'exact', None
+        if typed_folded in self.exact: # A real deck word, just not this one
+            return 'wrong', self.exact[typed_folded][0]
+        limit = tolerance(expected_folded)
+        if typed_folded and edit_distance(typed_folded, expected_folded, limit) <= limit:
+            return 'close', None
+        others = [word for word in self.near(typed) if normalize(word) != expected_folded]
+        return 'wrong', (others[0] if others else None)